@@ -0,0 +1,211 @@
+# app/alert_engine.py
+import os
+import threading
+from typing import Iterable, NamedTuple, Optional, Sequence
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from . import crud, models, risk, schemas
+
+ALERT_ESCALATE_READINGS = int(os.getenv("ALERT_ESCALATE_READINGS", 1)) # Consecutive readings above the current level before it is raised
+ALERT_CLEAR_READINGS = int(os.getenv("ALERT_CLEAR_READINGS", 3)) # Consecutive readings below it before it is lowered or cleared
+ALERT_CLEAR_MARGIN_M = float(os.getenv("ALERT_CLEAR_MARGIN_M", 0.25)) # A reading only counts as below a threshold this far under it
+ALERT_UPDATE_DELTA_M = float(os.getenv("ALERT_UPDATE_DELTA_M", 0.1)) # Open alert is rewritten once the level moved this much
+
+
+class SensorAlertState:
+    __slots__ = ("level", "alert_id", "pending_level", "pending_count", "reported_level", "peak_level")
+
+    def __init__(self, level: int = 0, alert_id: Optional[int] = None):
+        self.level = level # Risk index the sensor is alerting at (0 = no alert)
+        self.alert_id = alert_id # Open alert for that level; None once cleared or resolved by hand
+        self.pending_level = level # Level the debounce is counting towards
+        self.pending_count = 0
+        self.reported_level: Optional[float] = None # Water level written in the open alert
+        self.peak_level: Optional[float] = None
+
+    def copy(self) -> "SensorAlertState":
+        clone = SensorAlertState(self.level, self.alert_id)
+        clone.pending_level, clone.pending_count = self.pending_level, self.pending_count
+        clone.reported_level, clone.peak_level = self.reported_level, self.peak_level
+        return clone
+
+
+class AlertEvents(NamedTuple):
+    new: list[schemas.AlertOut]
+    updated: list[schemas.AlertOut]
+    resolved: list[schemas.AlertOut]
+
+
+def build_threshold_alert(sensor_id: str, level: int, water_level: float) -> schemas.AlertCreate:
+    if risk.ALERT_LEVELS[level] == "critical":
+        return schemas.AlertCreate(
+            title=f"Critical Water Level at Sensor {sensor_id}",
+            description=f"Water level reached {water_level:.2f}m.",
+            level="critical", sensor_id=sensor_id
+        )
+    return schemas.AlertCreate(
+        title=f"Warning: High Water Level at Sensor {sensor_id}",
+        description=f"Water level at {water_level:.2f}m.",
+        level="warning", sensor_id=sensor_id
+    )
+
+def _updated_description(water_level: float, peak_level: float) -> str:
+    return f"Water level at {water_level:.2f}m (peak {peak_level:.2f}m)."
+
+
+class AlertEngine:
+    """Threshold alerts with one open alert per sensor, kept in memory.
+
+    Each reading is classified by the risk engine. A sensor only moves to a higher level
+    after ALERT_ESCALATE_READINGS consecutive readings there, and to a lower one after
+    ALERT_CLEAR_READINGS readings at least ALERT_CLEAR_MARGIN_M under its threshold.
+    Moving opens an alert for the new level and resolves the previous one; staying
+    rewrites the open alert's description when the water level moved by
+    ALERT_UPDATE_DELTA_M instead of inserting a new row. An alert resolved by hand
+    stays quiet until the sensor changes level.
+
+    State is warmed from the open alerts at startup and only advanced after the alert
+    changes are committed. The lock is only held to evaluate and to install the result,
+    never across database work: a pass claims its sensors while in flight, so a pass on
+    other sensors runs alongside it and one on the same sensors waits for it. Alerts
+    resolved by hand while their sensor is in flight are remembered and applied when the
+    pass installs its state.
+    """
+
+    def __init__(self):
+        self._states: dict[str, SensorAlertState] = {}
+        self._lock = threading.Condition()
+        self._in_flight: set[str] = set()
+        self._resolved_in_flight: dict[str, set[int]] = {}
+
+    def load(self, open_alerts: Iterable[models.Alert]):
+        """Rebuilds state from unresolved threshold alerts (oldest first; the newest per sensor wins)."""
+        states = {}
+        for alert in open_alerts:
+            if alert.sensor_id is None or alert.level not in risk.ALERT_LEVELS[1:]:
+                continue
+            level = risk.ALERT_LEVELS.index(alert.level)
+            current = states.get(alert.sensor_id)
+            if current is None or level >= current.level:
+                states[alert.sensor_id] = SensorAlertState(level, alert.id)
+        with self._lock:
+            self._states = states
+
+    def open_alert_count(self) -> int:
+        return sum(1 for state in self._states.values() if state.alert_id is not None)
+
+    def alert_resolved(self, alert_id: int, sensor_id: Optional[str]):
+        """Called when an alert is resolved outside the engine (e.g. /alerts/{id}/resolve)."""
+        with self._lock:
+            state = self._states.get(sensor_id)
+            if state is not None and state.alert_id == alert_id:
+                state.alert_id = None
+            if sensor_id in self._in_flight:
+                self._resolved_in_flight.setdefault(sensor_id, set()).add(alert_id)
+
+    def process(self, db: Session, readings: Sequence[schemas.SensorDataOut]) -> AlertEvents:
+        """Evaluates readings, writes the resulting alert changes and commits db."""
+        sensors = {reading.sensor_id for reading in readings}
+        with self._lock:
+            self._lock.wait_for(lambda: self._in_flight.isdisjoint(sensors))
+            states, inserts, updates, resolves = self._evaluate(readings)
+            self._in_flight |= sensors
+        try:
+            new_orm = crud.create_alerts_db_batch(db, [alert for _, alert in inserts])
+            ids = {placeholder: alert.id for (placeholder, _), alert in zip(inserts, new_orm)}
+            resolved_orm = crud.resolve_alerts_db_batch(db, [ids.get(a, a) for a in resolves])
+            updated_orm = crud.update_alert_descriptions(db, {ids.get(a, a): d for a, d in updates.items()})
+            events = AlertEvents(
+                new=[schemas.AlertOut.model_validate(a) for a in new_orm],
+                updated=[schemas.AlertOut.model_validate(a) for a in updated_orm],
+                resolved=[schemas.AlertOut.model_validate(a) for a in resolved_orm],
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            self._release(sensors)
+            raise
+        with self._lock:
+            for sensor_id, state in states.items():
+                state.alert_id = ids.get(state.alert_id, state.alert_id)
+                if state.alert_id in self._resolved_in_flight.get(sensor_id, ()):
+                    state.alert_id = None # Resolved by hand during the pass
+            self._states.update(states)
+            self._release(sensors)
+        return events
+
+    def _release(self, sensors: set[str]):
+        with self._lock:
+            self._in_flight -= sensors
+            for sensor_id in sensors:
+                self._resolved_in_flight.pop(sensor_id, None)
+            self._lock.notify_all()
+
+    def _evaluate(self, readings: Sequence[schemas.SensorDataOut]):
+        # Works on copies of the touched states; nothing is stored until process() committed
+        states: dict[str, SensorAlertState] = {}
+        inserts: list[tuple[int, schemas.AlertCreate]] = [] # (placeholder id, alert)
+        updates: dict[int, str] = {} # alert id or placeholder -> description
+        resolves: list[int] = []
+        if not readings:
+            return states, inserts, updates, resolves
+
+        water_levels = np.array([r.water_level for r in readings], dtype=np.float64)
+        warning, critical = risk.risk_engine.thresholds(
+            len(readings), [r.latitude for r in readings], [r.longitude for r in readings],
+            [r.sensor_id for r in readings]
+        )
+        raised = ((water_levels > warning).astype(np.int8) + (water_levels > critical)).tolist()
+        held = ((water_levels > warning - ALERT_CLEAR_MARGIN_M).astype(np.int8)
+                + (water_levels > critical - ALERT_CLEAR_MARGIN_M)).tolist()
+
+        for reading, raised_level, held_level in zip(readings, raised, held):
+            state = states.get(reading.sensor_id)
+            if state is None:
+                current = self._states.get(reading.sensor_id)
+                state = states[reading.sensor_id] = current.copy() if current is not None else SensorAlertState()
+            water_level = reading.water_level
+
+            if raised_level > state.level:
+                target = raised_level
+            elif held_level < state.level:
+                target = held_level
+            else:
+                target = state.level
+
+            if target != state.level:
+                state.pending_count = state.pending_count + 1 if target == state.pending_level else 1
+                state.pending_level = target
+                needed = ALERT_ESCALATE_READINGS if target > state.level else ALERT_CLEAR_READINGS
+                if state.pending_count >= needed:
+                    if state.alert_id is not None:
+                        resolves.append(state.alert_id)
+                        updates.pop(state.alert_id, None)
+                    state.level, state.alert_id = target, None
+                    state.pending_count = 0
+                    state.reported_level = state.peak_level = None
+                    if target > 0:
+                        placeholder = -(len(inserts) + 1) # Stands in for the id until the insert
+                        inserts.append((placeholder, build_threshold_alert(reading.sensor_id, target, water_level)))
+                        state.alert_id = placeholder
+                        state.reported_level = state.peak_level = water_level
+                    continue
+            else:
+                state.pending_level, state.pending_count = state.level, 0
+
+            if state.alert_id is not None:
+                state.peak_level = max(state.peak_level if state.peak_level is not None else water_level, water_level)
+                if state.reported_level is None or abs(water_level - state.reported_level) >= ALERT_UPDATE_DELTA_M:
+                    state.reported_level = water_level
+                    updates[state.alert_id] = _updated_description(water_level, state.peak_level)
+
+        # Alerts opened in this batch get their latest description at insert time
+        for placeholder, alert in inserts:
+            if placeholder in updates:
+                alert.description = updates.pop(placeholder)
+        return states, inserts, updates, resolves
+
+
+alert_engine = AlertEngine() # Global engine, warmed from open alerts in main.py startup
@@ -0,0 +1,62 @@
+# app/alert_summary.py
+import threading
+from collections import Counter
+from typing import Iterable, Optional
+
+from . import schemas
+
+
+class AlertSummary:
+    """Counts of open (unresolved) alerts by level and by sensor, kept in memory.
+
+    Rebuilt from the database at startup and then moved by every path that opens or
+    resolves alerts, after its commit, so /alerts/summary never scans the alerts table.
+    Alerts without a sensor only count towards their level.
+    """
+
+    def __init__(self):
+        self._by_level: Counter = Counter()
+        self._by_sensor: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def load(self, counts: Iterable[tuple[str, Optional[str], int]]):
+        """Replaces the counters with (level, sensor_id, open alert count) rows."""
+        by_level, by_sensor = Counter(), Counter()
+        for level, sensor_id, count in counts:
+            by_level[level] += count
+            if sensor_id is not None:
+                by_sensor[sensor_id] += count
+        with self._lock:
+            self._by_level, self._by_sensor = by_level, by_sensor
+
+    def alerts_opened(self, alerts: Iterable[schemas.AlertOut]):
+        self._apply(alerts, 1)
+
+    def alerts_resolved(self, alerts: Iterable[schemas.AlertOut]):
+        self._apply(alerts, -1)
+
+    def _apply(self, alerts: Iterable[schemas.AlertOut], step: int):
+        with self._lock:
+            for alert in alerts:
+                self._move(self._by_level, alert.level, step)
+                if alert.sensor_id is not None:
+                    self._move(self._by_sensor, alert.sensor_id, step)
+
+    @staticmethod
+    def _move(counter: Counter, key: str, step: int):
+        count = counter[key] + step
+        if count > 0:
+            counter[key] = count
+        else:
+            del counter[key] # Only keys with open alerts are reported
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "total_open": sum(self._by_level.values()),
+                "by_level": dict(self._by_level),
+                "by_sensor": dict(self._by_sensor),
+            }
+
+
+alert_summary = AlertSummary() # Global counters, rebuilt from open alerts in main.py startup
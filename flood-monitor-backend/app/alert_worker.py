@@ -0,0 +1,122 @@
+# app/alert_worker.py
+import asyncio
+import os
+import time
+import traceback
+from typing import Awaitable, Callable, List, Optional
+
+from . import schemas
+
+ALERT_WORKER_MAX_BATCH = int(os.getenv("ALERT_WORKER_MAX_BATCH", 1000))    # readings evaluated per pass
+ALERT_WORKER_CAPACITY = int(os.getenv("ALERT_WORKER_CAPACITY", 100000))    # queued readings before ingest waits
+
+AlertHandler = Callable[[List[schemas.SensorDataOut]], Awaitable[None]]
+
+
+class AlertWorker:
+    """Evaluates alerts for committed readings in a background task, off the ingest path.
+
+    Ingest routes hand their readings over with submit() once they are written; the worker
+    takes everything queued (up to max_batch_size) in one pass, so under load alert
+    evaluation is batched across requests. Readings stay in arrival order, which the
+    alert engine's debounce and the rate-of-rise buffers rely on.
+    """
+
+    def __init__(self, max_batch_size: int = ALERT_WORKER_MAX_BATCH, capacity: int = ALERT_WORKER_CAPACITY):
+        self.max_batch_size = max_batch_size
+        self.capacity = capacity
+        self._queue: Optional[asyncio.Queue] = None
+        self._handler: Optional[AlertHandler] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Optional[asyncio.Task] = None
+
+        # Counters exposed through stats()
+        self.evaluated_total = 0
+        self.failed_total = 0
+        self.pass_count = 0
+        self.last_pass_ms = 0.0
+        self.max_pass_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self, handler: AlertHandler):
+        if self.running:
+            return
+        self._handler = handler
+        self._queue = asyncio.Queue(maxsize=self.capacity)
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, readings: List[schemas.SensorDataOut]):
+        """Queues committed readings for evaluation; only waits if the queue is full."""
+        if self._queue is None:
+            print(f"WARNING: Alert worker not started, {len(readings)} readings not evaluated.")
+            return
+        for reading in readings:
+            try:
+                self._queue.put_nowait(reading)
+            except asyncio.QueueFull:
+                await self._queue.put(reading) # Backpressure instead of dropping alerts
+
+    async def stop(self):
+        """Stops the worker after evaluating everything still queued (call on shutdown)."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._inflight is not None:
+            await self._inflight
+            self._inflight = None
+        while not self._queue.empty():
+            await self._evaluate(self._take_batch([]))
+
+    def _take_batch(self, batch: List[schemas.SensorDataOut]) -> List[schemas.SensorDataOut]:
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = self._take_batch([await self._queue.get()])
+            # Shielded so a shutdown cancel never abandons a half-evaluated batch; stop() awaits it.
+            self._inflight = asyncio.ensure_future(self._evaluate(batch))
+            await asyncio.shield(self._inflight)
+            self._inflight = None
+
+    async def _evaluate(self, batch: List[schemas.SensorDataOut]):
+        started = time.perf_counter()
+        try:
+            await self._handler(batch)
+            self.evaluated_total += len(batch)
+        except Exception as e:
+            self.failed_total += len(batch)
+            print(f"ERROR: Alert evaluation of {len(batch)} readings failed: {e}")
+            traceback.print_exc()
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.pass_count += 1
+            self.last_pass_ms = elapsed_ms
+            self.max_pass_ms = max(self.max_pass_ms, elapsed_ms)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "capacity": self.capacity,
+            "evaluated_total": self.evaluated_total,
+            "failed_total": self.failed_total,
+            "pass_count": self.pass_count,
+            "last_pass_ms": round(self.last_pass_ms, 3),
+            "max_pass_ms": round(self.max_pass_ms, 3),
+        }
+
+
+alert_worker = AlertWorker() # Global worker instance, started/stopped in main.py
@@ -41,7 +41,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    user = crud.get_user(db, username=token_data.username) # type: ignore # Depends on crud.py
+    user = await database.run_db(crud.get_user, db, username=token_data.username) # type: ignore # Depends on crud.py
     if user is None:
         raise credentials_exception
     return user
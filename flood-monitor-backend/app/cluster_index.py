@@ -0,0 +1,144 @@
+# app/cluster_index.py
+import os
+from math import asinh, atan2, cos, degrees, floor, pi, radians, sin, tan
+from typing import Iterable, Optional
+
+from . import risk, schemas
+from .sensor_cache import SensorStateCache, sensor_cache
+
+CLUSTER_MAX_ZOOM = int(os.getenv("CLUSTER_MAX_ZOOM", 16))
+# Cells per tile side = 2 ** CLUSTER_CELL_SHIFT (4 -> 64 px cells on 256 px tiles)
+CLUSTER_CELL_SHIFT = int(os.getenv("CLUSTER_CELL_SHIFT", 2))
+MAX_MERCATOR_LAT = 85.05112878
+
+# Aggregate slots: [count, sum_lat, sum_sin_lon, sum_cos_lon, n_low, n_medium, n_high]
+# Longitudes are summed as unit vectors so a cluster straddling the antimeridian
+# averages to ~180 rather than ~0
+_COUNT, _SUM_LAT, _SUM_SIN_LON, _SUM_COS_LON, _RISK0 = 0, 1, 2, 3, 4
+
+
+def mercator_xy(lat: float, lon: float) -> tuple[float, float]:
+    """Web Mercator position normalized to [0, 1) on both axes (y grows southwards)."""
+    lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+    x = (lon + 180.0) / 360.0
+    y = (1.0 - asinh(tan(radians(lat))) / pi) / 2.0
+    return min(max(x, 0.0), 1.0 - 1e-12), min(max(y, 0.0), 1.0 - 1e-12)
+
+
+class ClusterIndex:
+    """Hierarchical grid of pre-aggregated clusters, one level per map zoom.
+
+    Level z divides the Web Mercator square into 2 ** (z + CLUSTER_CELL_SHIFT) cells per
+    side. Every cell keeps a count, coordinate sums (for the centroid) and a count per
+    risk level, so an incoming reading moves its sensor's contribution between cells in
+    O(zoom levels) and a viewport query only touches the cells it can show.
+    """
+
+    def __init__(self, cache: SensorStateCache, max_zoom: int = CLUSTER_MAX_ZOOM,
+                 cell_shift: int = CLUSTER_CELL_SHIFT):
+        self._cache = cache
+        self.max_zoom = max_zoom
+        self.cell_shift = cell_shift
+        self._levels: list[dict[tuple[int, int], list]] = [{} for _ in range(max_zoom + 1)]
+        self._contrib: dict[str, tuple[float, float, int]] = {} # sensor_id -> (lat, lon, risk index)
+        cache.add_listener(self)
+        risk.risk_engine.add_listener(self)
+
+    def rebuild(self, readings: Optional[Iterable[schemas.SensorDataOut]] = None):
+        self._levels = [{} for _ in range(self.max_zoom + 1)]
+        self._contrib = {}
+        readings = list(readings if readings is not None else self._cache.all())
+        for reading, risk_idx in zip(readings, risk.risk_engine.classify_readings(readings).tolist()):
+            self._add(reading, risk_idx)
+
+    def _cell(self, zoom: int, x: float, y: float) -> tuple[int, int]:
+        side = 1 << (zoom + self.cell_shift)
+        return floor(x * side), floor(y * side)
+
+    def _apply(self, lat: float, lon: float, risk_idx: int, sign: int):
+        x, y = mercator_xy(lat, lon)
+        sin_lon, cos_lon = sin(radians(lon)), cos(radians(lon))
+        for zoom, level in enumerate(self._levels):
+            key = self._cell(zoom, x, y)
+            agg = level.get(key)
+            if agg is None:
+                agg = level[key] = [0, 0.0, 0.0, 0.0, 0, 0, 0]
+            agg[_COUNT] += sign
+            agg[_SUM_LAT] += sign * lat
+            agg[_SUM_SIN_LON] += sign * sin_lon
+            agg[_SUM_COS_LON] += sign * cos_lon
+            agg[_RISK0 + risk_idx] += sign
+            if agg[_COUNT] <= 0:
+                del level[key]
+
+    def _add(self, reading: schemas.SensorDataOut, risk_idx: Optional[int] = None):
+        if reading.latitude is None or reading.longitude is None:
+            return
+        if risk_idx is None:
+            risk_idx = risk.risk_index(reading.water_level, reading.latitude, reading.longitude, reading.sensor_id)
+        contrib = (reading.latitude, reading.longitude, risk_idx)
+        old = self._contrib.get(reading.sensor_id)
+        if old == contrib:
+            return
+        if old is not None:
+            self._apply(*old, sign=-1)
+        self._apply(*contrib, sign=1)
+        self._contrib[reading.sensor_id] = contrib
+
+    def query(self, zoom: int, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> list[schemas.ClusterOut]:
+        """Clusters for a viewport. min_lon > max_lon describes a box crossing the antimeridian."""
+        zoom = max(0, min(zoom, self.max_zoom))
+        level = self._levels[zoom]
+        side = 1 << (zoom + self.cell_shift)
+
+        x0, y1 = self._cell(zoom, *mercator_xy(min_lat, min_lon))
+        x1, y0 = self._cell(zoom, *mercator_xy(max_lat, max_lon))
+        x_ranges = [(x0, x1)] if min_lon <= max_lon else [(x0, side - 1), (0, x1)]
+        wanted = (y1 - y0 + 1) * sum(b - a + 1 for a, b in x_ranges)
+
+        if wanted > len(level):
+            keys = [k for k in level if y0 <= k[1] <= y1 and any(a <= k[0] <= b for a, b in x_ranges)]
+        else:
+            keys = [(x, y) for y in range(y0, y1 + 1) for a, b in x_ranges for x in range(a, b + 1) if (x, y) in level]
+
+        clusters = []
+        for key in keys:
+            agg = level[key]
+            count = agg[_COUNT]
+            worst = max(i for i in range(len(risk.RISK_LEVELS)) if agg[_RISK0 + i] > 0)
+            cluster = schemas.ClusterOut(
+                latitude=agg[_SUM_LAT] / count,
+                longitude=degrees(atan2(agg[_SUM_SIN_LON], agg[_SUM_COS_LON])),
+                count=count,
+                risk_level=risk.RISK_LEVELS[worst],
+                risk_counts={name: agg[_RISK0 + i] for i, name in enumerate(risk.RISK_LEVELS)},
+            )
+            if count == 1:
+                self._fill_single(cluster, zoom, key)
+            clusters.append(cluster)
+        return clusters
+
+    def _fill_single(self, cluster: schemas.ClusterOut, zoom: int, key: tuple[int, int]):
+        # Singleton cells are shown as the sensor itself; find it through the grid index
+        lat, lon = cluster.latitude, cluster.longitude
+        for sensor_id, _ in self._cache.index.within_radius(lat, lon, 0.001):
+            reading = self._cache.get(sensor_id)
+            if reading is not None and self._cell(zoom, *mercator_xy(reading.latitude, reading.longitude)) == key:
+                cluster.sensor_id = reading.sensor_id
+                cluster.water_level = reading.water_level
+                cluster.last_updated = reading.timestamp
+                return
+
+    # --- SensorStateCache listener ---
+    def sensor_updated(self, old: Optional[schemas.SensorDataOut], new: schemas.SensorDataOut):
+        self._add(new)
+
+    def sensors_reset(self):
+        self.rebuild()
+
+    # --- RiskEngine listener ---
+    def thresholds_changed(self):
+        self.rebuild()
+
+
+cluster_index = ClusterIndex(sensor_cache) # Global index, fed by sensor_cache updates
@@ -0,0 +1,186 @@
+# app/contours.py
+import os
+from collections import OrderedDict
+from typing import NamedTuple
+
+import numpy as np
+import orjson
+
+from . import geo, risk
+from .heatmap import HeatmapCache, IDWGrid, heatmap_cache
+
+CONTOUR_DELTA_M = float(os.getenv("CONTOUR_DELTA_M", 0.05)) # Regenerate once any grid cell moved more than this
+CONTOUR_CACHE_SIZE = int(os.getenv("CONTOUR_CACHE_SIZE", 16))
+
+
+def contour_levels() -> tuple[tuple[str, float], ...]:
+    # The area above each threshold is at least that risk level. Contours follow the default
+    # thresholds; region/sensor overrides do not reshape them.
+    default = risk.risk_engine.default
+    return (("medium", default.warning), ("high", default.critical))
+
+# Corner offsets (d_row, d_col) of a marching-squares cell, counter-clockwise from bottom-left
+_CORNERS = ((0, 0), (0, 1), (1, 1), (1, 0))
+
+Ring = list[tuple[float, float]] # Closed [lat, lon] ring, first point repeated at the end
+
+
+def contour_rings(values: np.ndarray, min_lat: float, min_lon: float, resolution: float,
+                  threshold: float) -> list[Ring]:
+    """Rings around the grid cells whose value is above threshold (marching squares).
+
+    values[r, c] is the value at the centre of the cell starting at
+    (min_lat + r * resolution, min_lon + c * resolution); NaN counts as below. The grid
+    is padded with NaN nodes placed on its bounds so every ring closes. Rings keep the
+    area above threshold on their left: outer boundaries run counter-clockwise and
+    holes clockwise (lon as x, lat as y).
+    """
+    rows, cols = values.shape
+    padded = np.full((rows + 2, cols + 2), np.nan)
+    padded[1:-1, 1:-1] = values
+    with np.errstate(invalid="ignore"):
+        above = padded > threshold
+    node_lats = min_lat + (np.arange(rows + 2) - 0.5) * resolution
+    node_lons = min_lon + (np.arange(cols + 2) - 0.5) * resolution
+    node_lats[[0, -1]] = min_lat, min_lat + rows * resolution
+    node_lons[[0, -1]] = min_lon, min_lon + cols * resolution
+
+    # Only cells whose four corners disagree contain contour segments
+    corners = np.stack([above[:-1, :-1], above[:-1, 1:], above[1:, 1:], above[1:, :-1]])
+    mixed = corners.any(axis=0) & ~corners.all(axis=0)
+
+    points: dict[tuple, tuple[float, float]] = {}
+    next_edge: dict[tuple, tuple] = {}
+    for i, j in zip(*np.nonzero(mixed)):
+        nodes = [(i + di, j + dj) for di, dj in _CORNERS]
+        # Walk the cell's edges counter-clockwise, noting where the walk leaves/enters the area
+        crossings = [] # (is_exit, edge)
+        for k in range(4):
+            a, b = nodes[k], nodes[(k + 1) % 4]
+            if above[a] == above[b]:
+                continue
+            edge = (min(a, b), max(a, b)) # Same key from both cells sharing the edge
+            if edge not in points:
+                va, vb = padded[a], padded[b]
+                t = (threshold - va) / (vb - va) if np.isfinite(va) and np.isfinite(vb) else 0.5
+                points[edge] = (
+                    round(float(node_lats[a[0]] + t * (node_lats[b[0]] - node_lats[a[0]])), 6),
+                    round(float(node_lons[a[1]] + t * (node_lons[b[1]] - node_lons[a[1]])), 6),
+                )
+            crossings.append((bool(above[a]), edge))
+        # Each exit joins the following entry; a saddle whose centre is below threshold
+        # joins the preceding entry instead, keeping its two high corners apart
+        step = 1
+        if len(crossings) == 4 and not np.nanmean([padded[node] for node in nodes]) > threshold:
+            step = -1
+        for n, (is_exit, edge) in enumerate(crossings):
+            if is_exit:
+                next_edge[edge] = crossings[(n + step) % len(crossings)][1]
+
+    rings = []
+    while next_edge:
+        start, edge = next_edge.popitem()
+        ring = [points[start]]
+        while edge != start:
+            ring.append(points[edge])
+            edge = next_edge.pop(edge)
+        ring.append(ring[0])
+        rings.append(ring)
+    return rings
+
+def _signed_area(ring: Ring) -> float:
+    lats = np.array([p[0] for p in ring])
+    lons = np.array([p[1] for p in ring])
+    return float(np.sum(lons[:-1] * lats[1:] - lons[1:] * lats[:-1])) / 2
+
+def rings_to_polygons(rings: list[Ring]) -> list[dict]:
+    """Groups oriented rings into {"exterior", "holes"} polygons. A hole goes to the
+    smallest exterior ring containing it."""
+    exteriors, holes = [], []
+    for ring in rings:
+        area = _signed_area(ring)
+        (exteriors if area > 0 else holes).append((abs(area), ring))
+    exteriors.sort(key=lambda item: item[0])
+    polygons = [{"exterior": ring, "holes": []} for _, ring in exteriors]
+    for _, hole in holes:
+        lat, lon = hole[0]
+        for polygon in polygons:
+            exterior = np.array(polygon["exterior"])
+            if geo.points_in_polygon([lat], [lon], exterior[:, 0], exterior[:, 1])[0]:
+                polygon["holes"].append(hole)
+                break
+    return polygons
+
+
+class _CachedContours(NamedTuple):
+    grid: IDWGrid
+    version: int # grid.version the check below was made against
+    levels: tuple # contour_levels() the contours were traced at
+    values: np.ndarray # Grid values the contours were traced from
+    encoded: bytes
+
+
+class ContourCache:
+    """Risk-level contour polygons per heatmap grid.
+
+    Contours are traced from the IDW grid of HeatmapCache. When the grid has changed
+    since they were traced, they are only regenerated if some cell's interpolated water
+    level moved by more than delta_m (or gained/lost coverage); smaller drifts keep
+    serving the cached polygons.
+    """
+
+    def __init__(self, heatmaps: HeatmapCache, delta_m: float = CONTOUR_DELTA_M,
+                 max_entries: int = CONTOUR_CACHE_SIZE):
+        self._heatmaps = heatmaps
+        self.delta_m = delta_m
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, _CachedContours] = OrderedDict()
+        self.regenerations = 0
+
+    def get(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float, resolution: float) -> bytes:
+        """ContourSetOut as JSON bytes. Raises ValueError if the grid would be too large."""
+        grid = self._heatmaps.grid(min_lat, min_lon, max_lat, max_lon, resolution)
+        key = (resolution, grid.i0, grid.j0, grid.rows, grid.cols)
+        entry = self._entries.get(key)
+        levels = contour_levels()
+        if entry is not None and entry.grid is grid and entry.levels == levels:
+            self._entries.move_to_end(key)
+            if entry.version == grid.version:
+                return entry.encoded
+            values = grid.values()
+            if not self._changed(entry.values, values):
+                self._entries[key] = entry._replace(version=grid.version)
+                return entry.encoded
+        else:
+            values = grid.values()
+        self._entries[key] = _CachedContours(grid, grid.version, levels, values, self._encode(grid, values, levels))
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self.regenerations += 1
+        return self._entries[key].encoded
+
+    def _changed(self, old: np.ndarray, new: np.ndarray) -> bool:
+        old_missing, new_missing = np.isnan(old), np.isnan(new)
+        if not np.array_equal(old_missing, new_missing):
+            return True
+        covered = ~new_missing
+        return bool(covered.any() and np.max(np.abs(new[covered] - old[covered])) > self.delta_m)
+
+    def _encode(self, grid: IDWGrid, values: np.ndarray, contour_levels: tuple) -> bytes:
+        min_lat, min_lon, max_lat, max_lon = grid.bounds()
+        levels = []
+        for risk_level, threshold in contour_levels:
+            rings = contour_rings(values, min_lat, min_lon, grid.resolution, threshold)
+            levels.append({"risk_level": risk_level, "threshold": threshold, "polygons": rings_to_polygons(rings)})
+        return orjson.dumps({
+            "min_lat": min_lat, "min_lon": min_lon, "max_lat": max_lat, "max_lon": max_lon,
+            "resolution": grid.resolution,
+            "levels": levels,
+        })
+
+    def clear(self):
+        self._entries.clear()
+
+
+contour_cache = ContourCache(heatmap_cache) # Global contour cache on top of the heatmap grids
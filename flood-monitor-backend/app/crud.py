@@ -1,32 +1,99 @@
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import desc, func 
+from sqlalchemy import desc, func, insert, select, update, tuple_, and_, or_
+from sqlalchemy.dialects import postgresql, sqlite
 from . import models, schemas
 # Import get_password_hash from the new security.py
 from .security import get_password_hash
+from datetime import datetime
 from typing import Optional
 
 # SensorData CRUD
 def create_sensor_data(db: Session, data: schemas.SensorDataCreate) -> models.SensorData:
     sensor_entry = models.SensorData(**data.model_dump()) # Use model_dump() for Pydantic v2
     db.add(sensor_entry)
+    db.flush() # Assigns id/timestamp so sensor_latest is upserted in the same transaction
+    upsert_sensor_latest(db, [sensor_entry])
     db.commit()
     db.refresh(sensor_entry)
     return sensor_entry
 
-def get_latest_sensor_data(db: Session, limit: int = 100) -> list[models.SensorData]:
-    return db.query(models.SensorData).order_by(models.SensorData.timestamp.desc()).limit(limit).all()
+def create_sensor_data_batch(db: Session, items: list[schemas.SensorDataCreate]) -> list[models.SensorData]:
+    # One multi-row INSERT ... RETURNING for the whole batch. No commit here so the caller
+    # can add the batch's alerts and commit everything in a single transaction.
+    if not items:
+        return []
+    entries = db.scalars(
+        insert(models.SensorData).returning(models.SensorData, sort_by_parameter_order=True),
+        [item.model_dump() for item in items]
+    ).all()
+    upsert_sensor_latest(db, entries)
+    return entries
+
+# sensor_latest maintenance
+def upsert_sensor_latest(db: Session, entries: list[models.SensorData]):
+    # Keep only the newest reading per sensor (a row may not be upserted twice in one
+    # statement). now() is per transaction in Postgres, so the id breaks timestamp ties.
+    newest: dict[str, models.SensorData] = {}
+    for entry in entries:
+        current = newest.get(entry.sensor_id)
+        if current is None or (entry.timestamp, entry.id) >= (current.timestamp, current.id):
+            newest[entry.sensor_id] = entry
+    if not newest:
+        return
+    rows = [
+        {
+            "sensor_id": e.sensor_id, "reading_id": e.id, "latitude": e.latitude, "longitude": e.longitude,
+            "water_level": e.water_level, "rainfall": e.rainfall, "timestamp": e.timestamp,
+        }
+        for e in newest.values()
+    ]
+
+    dialect = db.get_bind().dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        for row in rows: # No portable upsert; the merge is per sensor, not per reading
+            db.merge(models.SensorLatest(**row))
+        return
+
+    dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = dialect_insert(models.SensorLatest)
+    latest = models.SensorLatest.__table__.c
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[latest.sensor_id],
+        set_={name: stmt.excluded[name] for name in rows[0] if name != "sensor_id"},
+        # Never let an older reading (e.g. a late flush) overwrite a newer one
+        where=or_(
+            latest.timestamp < stmt.excluded.timestamp,
+            and_(latest.timestamp == stmt.excluded.timestamp, latest.reading_id <= stmt.excluded.reading_id),
+        ),
+    )
+    db.execute(stmt, rows)
 
-def get_sensor_data_for_risk_map(db: Session, limit: int = 500) -> list[models.SensorData]:
+def backfill_sensor_latest(db: Session) -> int:
+    # One-off fill for databases that have sensor_data history from before sensor_latest existed
+    if db.query(models.SensorLatest.sensor_id).first() is not None:
+        return 0
     subquery = db.query(
         models.SensorData.sensor_id,
         func.max(models.SensorData.timestamp).label("max_timestamp")
     ).group_by(models.SensorData.sensor_id).subquery()
-
-    return db.query(models.SensorData).join(
+    entries = db.query(models.SensorData).join(
         subquery,
         (models.SensorData.sensor_id == subquery.c.sensor_id) &
         (models.SensorData.timestamp == subquery.c.max_timestamp)
-    ).order_by(models.SensorData.timestamp.desc()).limit(limit).all()
+    ).all()
+    upsert_sensor_latest(db, entries)
+    db.commit()
+    return len({e.sensor_id for e in entries})
+
+def get_latest_sensor_data(db: Session, limit: int = 100) -> list[models.SensorData]:
+    return db.query(models.SensorData).order_by(models.SensorData.timestamp.desc()).limit(limit).all()
+
+def get_sensor_data_for_risk_map(db: Session, limit: Optional[int] = 500) -> list[models.SensorLatest]:
+    # Served from sensor_latest: O(number of sensors), independent of history size
+    query = db.query(models.SensorLatest).order_by(models.SensorLatest.timestamp.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
 
 
 # User CRUD
@@ -53,13 +120,110 @@ def create_alert_db(db: Session, alert: schemas.AlertCreate) -> models.Alert:
     db.refresh(db_alert)
     return db_alert
 
-def get_alerts_db(db: Session, skip: int = 0, limit: int = 100) -> list[models.Alert]:
-    return db.query(models.Alert).order_by(desc(models.Alert.timestamp)).offset(skip).limit(limit).all()
+def create_alerts_db_batch(db: Session, alerts: list[schemas.AlertCreate]) -> list[models.Alert]:
+    # Bulk counterpart of create_alert_db; the caller commits (see create_sensor_data_batch).
+    if not alerts:
+        return []
+    return db.scalars(
+        insert(models.Alert).returning(models.Alert, sort_by_parameter_order=True),
+        [alert.model_dump() for alert in alerts]
+    ).all()
+
+def resolve_alerts_db_batch(db: Session, alert_ids: list[int]) -> list[models.Alert]:
+    # One UPDATE ... RETURNING for every id; the caller commits
+    if not alert_ids:
+        return []
+    return _resolve_alerts_where(db, models.Alert.id.in_(alert_ids))
+
+def resolve_alerts_db_bulk(db: Session, criteria: schemas.AlertBulkResolve) -> list[schemas.AlertOut]:
+    # Resolves every open alert matching all given criteria in one statement and commits.
+    # Returns snapshots taken before the commit expires the rows, so callers on the event
+    # loop never trigger a reload.
+    conditions = []
+    if criteria.ids is not None:
+        conditions.append(models.Alert.id.in_(criteria.ids))
+    if criteria.sensor_id is not None:
+        conditions.append(models.Alert.sensor_id == criteria.sensor_id)
+    if criteria.level is not None:
+        conditions.append(models.Alert.level == criteria.level)
+    if criteria.older_than is not None:
+        conditions.append(models.Alert.timestamp < criteria.older_than)
+    alerts = [schemas.AlertOut.model_validate(a) for a in _resolve_alerts_where(db, *conditions)]
+    db.commit()
+    return alerts
+
+def resolve_open_alert_db(db: Session, alert_id: int) -> Optional[schemas.AlertOut]:
+    # Resolves the alert only if it is still open and commits; None if it was not (or does
+    # not exist), so concurrent resolvers of one alert see exactly one success
+    alerts = [schemas.AlertOut.model_validate(a) for a in _resolve_alerts_where(db, models.Alert.id == alert_id)]
+    db.commit()
+    return alerts[0] if alerts else None
+
+def _resolve_alerts_where(db: Session, *conditions) -> list[models.Alert]:
+    return db.scalars(
+        update(models.Alert)
+        .where(models.Alert.is_resolved == False, *conditions)
+        .values(is_resolved=True)
+        .returning(models.Alert)
+    ).all()
+
+def update_alert_descriptions(db: Session, descriptions: dict[int, str]) -> list[models.Alert]:
+    # Bulk UPDATE by primary key; the caller commits
+    if not descriptions:
+        return []
+    db.execute(update(models.Alert), [{"id": alert_id, "description": text} for alert_id, text in descriptions.items()])
+    return db.scalars(select(models.Alert).where(models.Alert.id.in_(list(descriptions)))).all()
+
+def get_open_alert_counts(db: Session) -> list[tuple[str, Optional[str], int]]:
+    # (level, sensor_id, count) of unresolved alerts, for warming alert_summary at startup
+    return db.execute(
+        select(models.Alert.level, models.Alert.sensor_id, func.count())
+        .where(models.Alert.is_resolved == False)
+        .group_by(models.Alert.level, models.Alert.sensor_id)
+    ).all()
+
+def get_open_sensor_alerts(db: Session) -> list[models.Alert]:
+    # Unresolved sensor alerts, oldest first, for warming alert_engine and rise_detector
+    return db.query(models.Alert)\
+        .filter(models.Alert.is_resolved == False, models.Alert.sensor_id.isnot(None))\
+        .order_by(models.Alert.timestamp, models.Alert.id)\
+        .all()
+
+def get_alert_db(db: Session, alert_id: int) -> Optional[models.Alert]:
+    return db.query(models.Alert).filter(models.Alert.id == alert_id).first()
+
+def get_alerts_db(
+    db: Session,
+    limit: int = 100,
+    before: Optional[tuple[datetime, int]] = None,
+    resolved: Optional[bool] = None,
+    level: Optional[str] = None,
+    sensor_id: Optional[str] = None,
+) -> list[models.Alert]:
+    # Keyset pagination, newest first: `before` is the (timestamp, id) of the last alert of
+    # the previous page, so every page is an index range scan however deep it is.
+    query = db.query(models.Alert)
+    if resolved is not None:
+        query = query.filter(models.Alert.is_resolved == resolved)
+    if level is not None:
+        query = query.filter(models.Alert.level == level)
+    if sensor_id is not None:
+        query = query.filter(models.Alert.sensor_id == sensor_id)
+    if before is not None:
+        # Compare against the cursor alert's stored timestamp rather than the decoded one:
+        # SQLite keeps server_default timestamps as second-precision text, which never
+        # equals a bound datetime. The decoded value only covers a since-deleted alert.
+        before_timestamp, before_id = before
+        stored_timestamp = select(models.Alert.timestamp).where(models.Alert.id == before_id).scalar_subquery()
+        query = query.filter(
+            tuple_(models.Alert.timestamp, models.Alert.id) < tuple_(func.coalesce(stored_timestamp, before_timestamp), before_id)
+        )
+    return query.order_by(desc(models.Alert.timestamp), desc(models.Alert.id)).limit(limit).all()
 
 def get_latest_unresolved_alerts(db: Session, count: int = 2) -> list[models.Alert]:
     return db.query(models.Alert)\
         .filter(models.Alert.is_resolved == False)\
-        .order_by(models.Alert.timestamp.desc())\
+        .order_by(models.Alert.timestamp.desc(), models.Alert.id.desc())\
         .limit(count)\
         .all()
 
@@ -75,6 +239,58 @@ from sqlalchemy.orm import Session, joinedload # Ensure joinedload is imported
 
 # ...
 
+# District polygon CRUD
+def get_polygons(db: Session) -> list[models.DistrictPolygon]:
+    return db.query(models.DistrictPolygon).order_by(models.DistrictPolygon.name).all()
+
+def get_polygon(db: Session, name: str) -> Optional[models.DistrictPolygon]:
+    return db.query(models.DistrictPolygon).filter(models.DistrictPolygon.name == name).first()
+
+def upsert_polygon(db: Session, polygon: schemas.PolygonCreate) -> models.DistrictPolygon:
+    db_polygon = db.query(models.DistrictPolygon).filter(models.DistrictPolygon.name == polygon.name).first()
+    if db_polygon is None:
+        db_polygon = models.DistrictPolygon(name=polygon.name)
+        db.add(db_polygon)
+    db_polygon.coordinates = [list(vertex) for vertex in polygon.coordinates]
+    db.commit()
+    db.refresh(db_polygon)
+    return db_polygon
+
+def delete_polygon(db: Session, name: str) -> bool:
+    # Region thresholds on the polygon go with it, in the same transaction
+    deleted = db.query(models.DistrictPolygon).filter(models.DistrictPolygon.name == name).delete()
+    if deleted:
+        db.query(models.RiskThreshold).filter(
+            models.RiskThreshold.scope == schemas.RiskScopeEnum.region.value, models.RiskThreshold.target == name
+        ).delete()
+    db.commit()
+    return bool(deleted)
+
+# --- Risk thresholds ---
+def get_risk_thresholds(db: Session) -> list[models.RiskThreshold]:
+    return db.query(models.RiskThreshold).order_by(models.RiskThreshold.scope, models.RiskThreshold.target).all()
+
+def upsert_risk_threshold(db: Session, threshold: schemas.RiskThresholdCreate) -> models.RiskThreshold:
+    db_threshold = db.query(models.RiskThreshold).filter(
+        models.RiskThreshold.scope == threshold.scope.value,
+        models.RiskThreshold.target == threshold.target
+    ).first()
+    if db_threshold is None:
+        db_threshold = models.RiskThreshold(scope=threshold.scope.value, target=threshold.target)
+        db.add(db_threshold)
+    db_threshold.warning_level = threshold.warning_level
+    db_threshold.critical_level = threshold.critical_level
+    db.commit()
+    db.refresh(db_threshold)
+    return db_threshold
+
+def delete_risk_threshold(db: Session, scope: str, target: str) -> bool:
+    deleted = db.query(models.RiskThreshold).filter(
+        models.RiskThreshold.scope == scope, models.RiskThreshold.target == target
+    ).delete()
+    db.commit()
+    return bool(deleted)
+
 # Message (Chat) CRUD
 def create_message(db: Session, message: schemas.MessageCreate, user_id: int) -> models.Message:
     db_message = models.Message(**message.model_dump(), user_id=user_id)
@@ -97,7 +313,10 @@ def get_messages(db: Session, skip: int = 0, limit: int = 50) -> list[models.Mes
 # Spatial Analysis (Haversine-based, simplified)
 from math import radians, sin, cos, sqrt, atan2
 from typing import Optional # Ensure this is imported if not already
+import numpy as np
+from . import geo
 
+# Scalar version, kept for one-off distances; batch work goes through geo.haversine_km
 def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     R = 6371  # Radius of Earth in kilometers
 
@@ -113,18 +332,58 @@ def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     distance = R * c
     return distance
 
-def get_sensors_in_radius(db: Session, lat: float, lon: float, radius_km: float, water_level_threshold: Optional[float] = None) -> list[models.SensorData]:
-    # Consider fetching only latest reading per sensor if dataset is large
-    all_latest_sensors = get_sensor_data_for_risk_map(db, limit=1000) # Adjust limit as needed
+def get_sensors_in_radius(db: Session, lat: float, lon: float, radius_km: float, water_level_threshold: Optional[float] = None) -> list[models.SensorLatest]:
+    all_latest_sensors = [
+        s for s in get_sensor_data_for_risk_map(db, limit=None) # One row per sensor, no cap needed
+        if s.latitude is not None and s.longitude is not None
+    ]
+    if not all_latest_sensors:
+        return []
+    # One vectorized haversine pass over all sensors instead of a per-sensor loop
+    distances = geo.haversine_km(
+        lat, lon,
+        np.fromiter((s.latitude for s in all_latest_sensors), dtype=np.float64, count=len(all_latest_sensors)),
+        np.fromiter((s.longitude for s in all_latest_sensors), dtype=np.float64, count=len(all_latest_sensors)),
+    )
     nearby_sensors = []
-    for sensor in all_latest_sensors:
-        if sensor.latitude is not None and sensor.longitude is not None:
-            distance = haversine(lat, lon, sensor.latitude, sensor.longitude)
-            if distance <= radius_km:
-                if water_level_threshold is None or (sensor.water_level is not None and sensor.water_level >= water_level_threshold):
-                    nearby_sensors.append(sensor)
+    for index in np.flatnonzero(distances <= radius_km).tolist():
+        sensor = all_latest_sensors[index]
+        if water_level_threshold is None or (sensor.water_level is not None and sensor.water_level >= water_level_threshold):
+            nearby_sensors.append(sensor)
     return nearby_sensors
 
+def get_nearest_sensors(db: Session, lat: float, lon: float, k: int) -> list[tuple[models.SensorLatest, float]]:
+    all_latest_sensors = [
+        s for s in get_sensor_data_for_risk_map(db, limit=None)
+        if s.latitude is not None and s.longitude is not None
+    ]
+    indices, distances = geo.nearest_k(
+        lat, lon,
+        np.fromiter((s.latitude for s in all_latest_sensors), dtype=np.float64, count=len(all_latest_sensors)),
+        np.fromiter((s.longitude for s in all_latest_sensors), dtype=np.float64, count=len(all_latest_sensors)),
+        k
+    )
+    return [(all_latest_sensors[i], d) for i, d in zip(indices.tolist(), distances.tolist())]
+
+def get_sensors_in_circles(db: Session, circles: list[schemas.SpatialQueryCircle]) -> list[list[models.SensorLatest]]:
+    # Loads sensor_latest once and answers every circle with one distance matrix
+    all_latest_sensors = [
+        s for s in get_sensor_data_for_risk_map(db, limit=None)
+        if s.latitude is not None and s.longitude is not None
+    ]
+    hits = geo.points_within_circles(
+        [c.latitude for c in circles], [c.longitude for c in circles], [c.radius_km for c in circles],
+        np.fromiter((s.latitude for s in all_latest_sensors), dtype=np.float64, count=len(all_latest_sensors)),
+        np.fromiter((s.longitude for s in all_latest_sensors), dtype=np.float64, count=len(all_latest_sensors)),
+    )
+    results = []
+    for circle, (indices, _) in zip(circles, hits):
+        sensors = [all_latest_sensors[i] for i in indices.tolist()]
+        if circle.min_water_level is not None:
+            sensors = [s for s in sensors if s.water_level is not None and s.water_level >= circle.min_water_level]
+        results.append(sensors)
+    return results
+
 
 '''
 from sqlalchemy.orm import Session
@@ -1,5 +1,6 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
 import os
 from dotenv import load_dotenv
 
@@ -24,6 +25,11 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Session is synchronous: async endpoints must run their DB work through this so a slow
+# query waits in the threadpool instead of stalling the event loop (and every WebSocket on it).
+async def run_db(func, *args, **kwargs):
+    return await run_in_threadpool(func, *args, **kwargs)
 '''
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
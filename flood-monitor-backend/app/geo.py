@@ -0,0 +1,96 @@
+# app/geo.py
+# Vectorized great-circle helpers. Every function takes scalars or NumPy arrays and
+# computes all distances in a single NumPy pass (no per-sensor Python loop).
+from math import asin, cos, degrees, radians, sin
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat, lon, lats, lons) -> np.ndarray:
+    """Distances in km from one point (lat, lon) to every point in lats/lons."""
+    lat1 = np.radians(lat)
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+    dlat = lat2 - lat1
+    dlon = np.radians(np.asarray(lons, dtype=np.float64)) - np.radians(lon)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def haversine_matrix_km(lats1, lons1, lats2, lons2) -> np.ndarray:
+    """(len(lats1), len(lats2)) matrix of distances in km between two point sets."""
+    lat1 = np.radians(np.asarray(lats1, dtype=np.float64))[:, None]
+    lon1 = np.radians(np.asarray(lons1, dtype=np.float64))[:, None]
+    lat2 = np.radians(np.asarray(lats2, dtype=np.float64))[None, :]
+    lon2 = np.radians(np.asarray(lons2, dtype=np.float64))[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def points_within_circles(circle_lats, circle_lons, radii_km, lats, lons,
+                          max_cells: int = 4_000_000) -> list[tuple[np.ndarray, np.ndarray]]:
+    """For each circle, (indices, distances_km) of the points inside it, nearest first.
+    Distances come from haversine_matrix_km, evaluated in row chunks of at most max_cells."""
+    circle_lats = np.asarray(circle_lats, dtype=np.float64)
+    circle_lons = np.asarray(circle_lons, dtype=np.float64)
+    radii_km = np.asarray(radii_km, dtype=np.float64)
+    results = []
+    rows_per_chunk = max(1, max_cells // max(1, len(lats)))
+    for start in range(0, len(circle_lats), rows_per_chunk):
+        stop = start + rows_per_chunk
+        distances = haversine_matrix_km(circle_lats[start:stop], circle_lons[start:stop], lats, lons)
+        inside = distances <= radii_km[start:stop, None]
+        for row, row_inside in zip(distances, inside):
+            indices = np.flatnonzero(row_inside)
+            order = np.argsort(row[indices], kind="stable")
+            results.append((indices[order], row[indices][order]))
+    return results
+
+def nearest_k(lat: float, lon: float, lats, lons, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """(indices, distances_km) of the k points closest to (lat, lon), nearest first."""
+    distances = haversine_km(lat, lon, lats, lons)
+    if k < len(distances):
+        indices = np.argpartition(distances, k - 1)[:k]
+    else:
+        indices = np.arange(len(distances))
+    order = np.argsort(distances[indices], kind="stable")
+    return indices[order], distances[indices][order]
+
+def points_in_polygon(lats, lons, poly_lats, poly_lons) -> np.ndarray:
+    """Boolean mask of points inside a polygon (even-odd ray casting in lat/lon space).
+    Loops over the polygon's edges, each edge tested against all points at once."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    inside = np.zeros(lats.shape, dtype=bool)
+    prev_lat, prev_lon = poly_lats[-1], poly_lons[-1]
+    for edge_lat, edge_lon in zip(poly_lats, poly_lons):
+        crosses = (edge_lat > lats) != (prev_lat > lats)
+        if edge_lat != prev_lat: # Horizontal edges never cross the ray
+            lon_at_lat = (prev_lon - edge_lon) * (lats - edge_lat) / (prev_lat - edge_lat) + edge_lon
+            inside ^= crosses & (lons < lon_at_lat)
+        prev_lat, prev_lon = edge_lat, edge_lon
+    return inside
+
+def wrap_lon(lon):
+    """Normalizes longitudes into [-180, 180)."""
+    return ((lon + 180) % 360) - 180
+
+def radius_bbox(lat: float, lon: float, radius_km: float) -> tuple[float, float, float, float]:
+    """Bounding box (min_lat, min_lon, max_lat, max_lon) of a great-circle radius.
+    Longitudes are not wrapped; a box that contains a pole spans all longitudes."""
+    angular = radius_km / EARTH_RADIUS_KM
+    d_lat = degrees(angular)
+    min_lat, max_lat = lat - d_lat, lat + d_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90), -180.0, min(max_lat, 90), 180.0
+    # Widest longitude offset of the circle (reached north/south of the centre's parallel)
+    d_lon = degrees(asin(min(1.0, sin(angular) / cos(radians(lat)))))
+    return min_lat, lon - d_lon, max_lat, lon + d_lon
+
+def bbox_mask(lats: np.ndarray, lons: np.ndarray, min_lat: float, min_lon: float,
+              max_lat: float, max_lon: float) -> np.ndarray:
+    """Boolean mask of points inside a bbox whose longitudes may run past +/-180."""
+    mask = (lats >= min_lat) & (lats <= max_lat)
+    if max_lon - min_lon >= 360:
+        return mask
+    # Shift longitudes so the box starts at 0 and test against its width
+    return mask & (((lons - min_lon) % 360) <= (max_lon - min_lon))
@@ -0,0 +1,175 @@
+# app/heatmap.py
+import os
+from collections import OrderedDict
+from math import ceil, degrees, floor
+from typing import Optional
+
+import numpy as np
+import orjson
+
+from . import geo, risk, schemas
+from .sensor_cache import SensorStateCache, sensor_cache
+
+HEATMAP_RADIUS_KM = float(os.getenv("HEATMAP_RADIUS_KM", 5.0)) # Sensors further away do not influence a cell
+HEATMAP_POWER = float(os.getenv("HEATMAP_POWER", 2.0)) # IDW weight = 1 / distance ** power
+HEATMAP_MAX_CELLS = int(os.getenv("HEATMAP_MAX_CELLS", 250_000))
+HEATMAP_CACHE_SIZE = int(os.getenv("HEATMAP_CACHE_SIZE", 16)) # Grids kept up to date in memory
+MIN_DISTANCE_KM = 0.01 # Caps the weight of a sensor sitting right on a cell centre
+
+
+class IDWGrid:
+    """Inverse-distance-weighted water levels over a fixed lat/lon grid.
+
+    Every cell keeps the running sums of w * water_level and w (plus a count of sensors
+    in range), so a reading is applied by adding or subtracting its weights over the
+    window of cells within radius_km of the sensor; the rest of the grid is untouched.
+    Row 0 is the southernmost row, column 0 the westernmost column.
+    """
+
+    def __init__(self, resolution: float, i0: int, j0: int, rows: int, cols: int,
+                 radius_km: float = HEATMAP_RADIUS_KM, power: float = HEATMAP_POWER):
+        self.resolution = resolution
+        self.i0, self.j0, self.rows, self.cols = i0, j0, rows, cols
+        self.radius_km = radius_km
+        self.power = power
+        self.lat_centers = (i0 + np.arange(rows) + 0.5) * resolution
+        self.lon_centers = (j0 + np.arange(cols) + 0.5) * resolution
+        self._num = np.zeros((rows, cols))
+        self._den = np.zeros((rows, cols))
+        self._in_range = np.zeros((rows, cols), dtype=np.int32) # Keeps "no data" exact despite float drift
+        self.version = 0 # Bumped on every change that touched the grid
+        self._encoded: Optional[bytes] = None
+
+    def bounds(self) -> tuple[float, float, float, float]:
+        return (self.i0 * self.resolution, self.j0 * self.resolution,
+                (self.i0 + self.rows) * self.resolution, (self.j0 + self.cols) * self.resolution)
+
+    def apply(self, lat: float, lon: float, water_level: float, sign: int = 1) -> bool:
+        """Adds (sign=1) or removes (sign=-1) one sensor's contribution. Returns False if
+        the sensor is out of range of every cell."""
+        min_lat, min_lon, max_lat, max_lon = geo.radius_bbox(lat, lon, self.radius_km)
+        r0 = np.searchsorted(self.lat_centers, min_lat, side="left")
+        r1 = np.searchsorted(self.lat_centers, max_lat, side="right")
+        c0 = np.searchsorted(self.lon_centers, min_lon, side="left")
+        c1 = np.searchsorted(self.lon_centers, max_lon, side="right")
+        if r0 >= r1 or c0 >= c1:
+            return False
+        distances = geo.haversine_km(lat, lon, self.lat_centers[r0:r1, None], self.lon_centers[None, c0:c1])
+        in_range = distances <= self.radius_km
+        if not in_range.any():
+            return False
+        weights = np.where(in_range, np.maximum(distances, MIN_DISTANCE_KM) ** -self.power, 0.0)
+        self._num[r0:r1, c0:c1] += sign * weights * water_level
+        self._den[r0:r1, c0:c1] += sign * weights
+        self._in_range[r0:r1, c0:c1] += sign * in_range
+        self.version += 1
+        self._encoded = None
+        return True
+
+    def values(self) -> np.ndarray:
+        """Interpolated water level per cell, NaN where no sensor is within radius_km."""
+        values = np.full((self.rows, self.cols), np.nan)
+        covered = self._in_range > 0
+        values[covered] = self._num[covered] / self._den[covered]
+        return values
+
+    def encoded(self) -> bytes:
+        """HeatmapOut as JSON bytes, re-encoded only after the grid changed."""
+        if self._encoded is None:
+            values = self.values()
+            missing = np.isnan(values)
+            cell_lats = np.repeat(self.lat_centers, self.cols)
+            cell_lons = np.tile(self.lon_centers, self.rows)
+            # Region thresholds apply by cell position; per-sensor ones have no cell equivalent
+            risk_idx = risk.risk_indices(values.ravel(), cell_lats, cell_lons).reshape(values.shape)
+            risk_idx = np.where(missing, None, risk_idx.astype(object))
+            water_levels = np.where(missing, None, np.round(values, 3).astype(object))
+            min_lat, min_lon, max_lat, max_lon = self.bounds()
+            self._encoded = orjson.dumps({
+                "min_lat": min_lat, "min_lon": min_lon, "max_lat": max_lat, "max_lon": max_lon,
+                "resolution": self.resolution, "rows": self.rows, "cols": self.cols,
+                "radius_km": self.radius_km,
+                "risk_levels": list(risk.RISK_LEVELS),
+                "water_level": water_levels.tolist(),
+                "risk": risk_idx.tolist(),
+            })
+        return self._encoded
+
+
+class HeatmapCache:
+    """IDW grids per (resolution, snapped bbox), kept current by sensor_cache updates.
+
+    A grid is built once on first request; afterwards each applied reading removes the
+    sensor's previous contribution and adds the new one, touching only the cells within
+    the IDW radius of its old and new position. Least recently used grids are dropped
+    beyond max_grids.
+    """
+
+    def __init__(self, cache: SensorStateCache, max_grids: int = HEATMAP_CACHE_SIZE,
+                 max_cells: int = HEATMAP_MAX_CELLS, radius_km: float = HEATMAP_RADIUS_KM):
+        self._cache = cache
+        self.max_grids = max_grids
+        self.max_cells = max_cells
+        self.radius_km = radius_km
+        self._grids: OrderedDict[tuple, IDWGrid] = OrderedDict()
+        cache.add_listener(self)
+        risk.risk_engine.add_listener(self)
+
+    def __len__(self) -> int:
+        return len(self._grids)
+
+    def grid(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float, resolution: float) -> IDWGrid:
+        """Grid covering the bbox, its edges snapped outwards to multiples of resolution
+        so that nearby viewports share one cached grid. Raises ValueError if too large."""
+        i0, j0 = floor(min_lat / resolution), floor(min_lon / resolution)
+        rows = max(1, ceil(max_lat / resolution) - i0)
+        cols = max(1, ceil(max_lon / resolution) - j0)
+        if rows * cols > self.max_cells:
+            raise ValueError(f"Heatmap would have {rows * cols} cells (limit {self.max_cells}); use a coarser resolution")
+        key = (resolution, i0, j0, rows, cols)
+        grid = self._grids.get(key)
+        if grid is not None:
+            self._grids.move_to_end(key)
+            return grid
+        grid = self._build(resolution, i0, j0, rows, cols)
+        self._grids[key] = grid
+        if len(self._grids) > self.max_grids:
+            self._grids.popitem(last=False)
+        return grid
+
+    def _build(self, resolution: float, i0: int, j0: int, rows: int, cols: int) -> IDWGrid:
+        grid = IDWGrid(resolution, i0, j0, rows, cols, radius_km=self.radius_km)
+        min_lat, min_lon, max_lat, max_lon = grid.bounds()
+        # Sensors up to radius_km outside the grid still weigh on its edge cells
+        d_lat = degrees(self.radius_km / geo.EARTH_RADIUS_KM)
+        widest_lat = min(89.0, max(abs(min_lat), abs(max_lat)) + d_lat)
+        d_lon = geo.radius_bbox(widest_lat, 0.0, self.radius_km)[3]
+        ids, _, _ = self._cache.index.arrays()
+        slots = self._cache.index.slots_in_bbox(min_lat - d_lat, min_lon - d_lon, max_lat + d_lat, max_lon + d_lon)
+        for slot in slots.tolist():
+            reading = self._cache.get(ids[slot])
+            if reading.water_level is not None:
+                grid.apply(reading.latitude, reading.longitude, reading.water_level)
+        return grid
+
+    def clear(self):
+        self._grids.clear()
+
+    # --- SensorStateCache listener ---
+    def sensor_updated(self, old: Optional[schemas.SensorDataOut], new: schemas.SensorDataOut):
+        for grid in self._grids.values():
+            if old is not None and old.latitude is not None and old.water_level is not None:
+                grid.apply(old.latitude, old.longitude, old.water_level, sign=-1)
+            if new.latitude is not None and new.water_level is not None:
+                grid.apply(new.latitude, new.longitude, new.water_level)
+
+    def sensors_reset(self):
+        self.clear()
+
+    # --- RiskEngine listener ---
+    def thresholds_changed(self):
+        for grid in self._grids.values():
+            grid._encoded = None # Values stay valid, only the risk raster changes
+
+
+heatmap_cache = HeatmapCache(sensor_cache) # Global heatmap grids, updated by sensor_cache
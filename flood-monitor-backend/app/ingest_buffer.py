@@ -0,0 +1,192 @@
+# app/ingest_buffer.py
+import asyncio
+import os
+import time
+import traceback
+from typing import Awaitable, Callable, List, Optional
+
+from . import schemas
+
+# Flush triggers and capacity (override via environment)
+INGEST_BUFFER_MAX_BATCH = int(os.getenv("INGEST_BUFFER_MAX_BATCH", 500))      # rows per flush
+INGEST_BUFFER_MAX_DELAY_MS = int(os.getenv("INGEST_BUFFER_MAX_DELAY_MS", 50))  # max wait before a partial flush
+INGEST_BUFFER_CAPACITY = int(os.getenv("INGEST_BUFFER_CAPACITY", 50000))       # readings held before rejecting
+INGEST_BUFFER_FLUSH_ATTEMPTS = int(os.getenv("INGEST_BUFFER_FLUSH_ATTEMPTS", 5))  # tries per batch before dead-lettering
+INGEST_BUFFER_RETRY_BACKOFF_MS = int(os.getenv("INGEST_BUFFER_RETRY_BACKOFF_MS", 200)) # first retry delay, doubled each time
+INGEST_DEAD_LETTER_PATH = os.getenv("INGEST_DEAD_LETTER_PATH", "ingest_dead_letter.jsonl") # batches that never made it
+
+FlushHandler = Callable[[List[schemas.SensorDataCreate]], Awaitable[None]]
+
+
+class IngestBuffer:
+    """Write-behind queue: readings are acknowledged on submit and written by a background
+    task in micro-batches, flushed when max_batch_size rows are waiting or max_delay_ms has
+    passed since the first row of the batch arrived.
+
+    Readings were already acknowledged, so a failed flush is retried with exponential
+    backoff (new readings keep queueing meanwhile and are rejected once it is full). The
+    handler must therefore only raise when nothing was committed. A batch that still
+    fails after flush_attempts tries is appended to the dead-letter file as JSON lines,
+    to be replayed by hand, or printed to the log if even that write fails.
+    """
+
+    def __init__(self, max_batch_size: int = INGEST_BUFFER_MAX_BATCH,
+                 max_delay_ms: int = INGEST_BUFFER_MAX_DELAY_MS,
+                 capacity: int = INGEST_BUFFER_CAPACITY,
+                 flush_attempts: int = INGEST_BUFFER_FLUSH_ATTEMPTS,
+                 retry_backoff_ms: int = INGEST_BUFFER_RETRY_BACKOFF_MS,
+                 dead_letter_path: str = INGEST_DEAD_LETTER_PATH):
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.capacity = capacity
+        self.flush_attempts = max(1, flush_attempts)
+        self.retry_backoff = retry_backoff_ms / 1000
+        self.dead_letter_path = dead_letter_path
+        self._queue: Optional[asyncio.Queue] = None
+        self._handler: Optional[FlushHandler] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: List[schemas.SensorDataCreate] = [] # Batch being collected by the flusher
+        self._inflight: Optional[asyncio.Task] = None      # Flush currently being written
+
+        # Counters exposed through stats()
+        self.accepted_total = 0
+        self.rejected_total = 0
+        self.flushed_total = 0
+        self.failed_total = 0 # Readings dead-lettered after every attempt failed
+        self.retried_total = 0 # Flush attempts repeated after an error
+        self.flush_count = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def depth(self) -> int:
+        pending = len(self._pending)
+        return pending + (self._queue.qsize() if self._queue is not None else 0)
+
+    async def start(self, handler: FlushHandler):
+        if self.running:
+            return
+        self._handler = handler
+        self._queue = asyncio.Queue(maxsize=self.capacity)
+        self._task = asyncio.create_task(self._run())
+
+    def submit(self, item: schemas.SensorDataCreate) -> bool:
+        """Queues a reading without waiting for the database. Returns False if the buffer is full."""
+        if not self.running:
+            return False
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.rejected_total += 1
+            return False
+        self.accepted_total += 1
+        return True
+
+    async def stop(self):
+        """Stops the flusher and writes everything still buffered (call on shutdown)."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._inflight is not None:
+            await self._inflight
+            self._inflight = None
+
+        remaining = self._pending
+        self._pending = []
+        while not self._queue.empty():
+            remaining.append(self._queue.get_nowait())
+        for start in range(0, len(remaining), self.max_batch_size):
+            await self._flush(remaining[start:start + self.max_batch_size])
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._pending = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(self._pending) < self.max_batch_size:
+                try:
+                    self._pending.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    self._pending.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            batch, self._pending = self._pending, []
+            # Shielded so a shutdown cancel never abandons a half-written batch; stop() awaits it.
+            self._inflight = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._inflight)
+            self._inflight = None
+
+    async def _flush(self, batch: List[schemas.SensorDataCreate]):
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            for attempt in range(1, self.flush_attempts + 1):
+                try:
+                    await self._handler(batch)
+                    self.flushed_total += len(batch)
+                    return
+                except Exception as e:
+                    print(f"ERROR: Ingest buffer flush of {len(batch)} readings failed (attempt {attempt}/{self.flush_attempts}): {e}")
+                    if attempt == self.flush_attempts:
+                        traceback.print_exc()
+                        break
+                    self.retried_total += 1
+                    await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            self.failed_total += len(batch)
+            self._dead_letter(batch)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.flush_count += 1
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self.total_flush_ms += elapsed_ms
+
+    def _dead_letter(self, batch: List[schemas.SensorDataCreate]):
+        lines = [item.model_dump_json() for item in batch]
+        try:
+            with open(self.dead_letter_path, "a") as f:
+                f.writelines(line + "\n" for line in lines)
+            print(f"WARNING: {len(batch)} readings written to dead-letter file {self.dead_letter_path}.")
+        except OSError as e:
+            print(f"ERROR: Could not write dead-letter file {self.dead_letter_path}: {e}; lost readings follow.")
+            for line in lines:
+                print(f"DEAD-LETTER: {line}")
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queue_depth": self.depth,
+            "capacity": self.capacity,
+            "max_batch_size": self.max_batch_size,
+            "max_delay_ms": self.max_delay * 1000,
+            "accepted_total": self.accepted_total,
+            "rejected_total": self.rejected_total,
+            "flushed_total": self.flushed_total,
+            "failed_total": self.failed_total,
+            "retried_total": self.retried_total,
+            "flush_count": self.flush_count,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3),
+            "avg_flush_ms": round(self.total_flush_ms / self.flush_count, 3) if self.flush_count else 0.0,
+        }
+
+
+ingest_buffer = IngestBuffer() # Global buffer instance, started/stopped in main.py
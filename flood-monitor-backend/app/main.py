@@ -1,6 +1,7 @@
 # app/main.py
 from fastapi import FastAPI, Depends, HTTPException, WebSocket, WebSocketDisconnect, Query, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from typing import List
 
@@ -13,13 +14,23 @@ from starlette.middleware.cors import CORSMiddleware as StarletteCORSMiddleware
 from . import models, schemas, crud, database
 from .database import engine # SessionLocal removed as get_db from database.py is preferred
 from .websocket_manager import manager # Global manager
+from .ingest_buffer import ingest_buffer
+from .alert_worker import alert_worker
+from .sensor_cache import sensor_cache
+from .state_sync import state_sync, load_shared_state
 from .auth import get_current_active_user, get_current_user, authenticate_user # role_checker used in routers
 from .security import create_access_token
 
 # Import Routers
-from .routers import alert_router, chat_router, spatial_router, sensor_router
+from .routers import alert_router, chat_router, spatial_router, sensor_router, risk_router
 
 models.Base.metadata.create_all(bind=engine)
+# create_all skips indexes of tables that already exist; add the ones introduced later
+for index in models.Alert.__table__.indexes:
+    index.create(bind=engine, checkfirst=True)
+with engine.begin() as connection:
+    # The (sensor_id, timestamp, id) index covers sensor_id lookups; drop the old single-column one
+    connection.execute(text("DROP INDEX IF EXISTS ix_alerts_sensor_id"))
 
 app = FastAPI(title="Flood Monitoring API")
 
@@ -32,12 +43,45 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"], # Alert list pagination
 )
 
+# --- Startup / Shutdown ---
+def _load_state_from_db():
+    # Runs in the threadpool at startup with its own session
+    db = database.SessionLocal()
+    try:
+        backfilled = crud.backfill_sensor_latest(db)
+        if backfilled:
+            print(f"INFO: Backfilled sensor_latest for {backfilled} sensors.")
+        # Open alerts are loaded by the worker that evaluates them, before its first pass
+        load_shared_state(db, warm=True)
+        print(f"INFO: Sensor cache warmed with {len(sensor_cache)} sensors.")
+    finally:
+        db.close()
+
+@app.on_event("startup")
+async def startup_main():
+    await database.run_db(_load_state_from_db)
+    await alert_worker.start(sensor_router.evaluate_alerts)
+    await state_sync.start() # Before the backend delivers other workers' updates to it
+    # Broadcast backend (BROADCAST_BACKEND) before anything broadcasts
+    await manager.start(state_sync=state_sync)
+    await ingest_buffer.start(sensor_router.flush_buffered_readings)
+
+@app.on_event("shutdown")
+async def shutdown_main():
+    # Flush readings that were acknowledged but not yet written
+    await ingest_buffer.stop()
+    await alert_worker.stop() # After the buffer: its last flush still queues readings here
+    await manager.stop()
+    await state_sync.stop()
+
 # --- Core Authentication Endpoints ---
 @app.post("/login", response_model=schemas.Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    # bcrypt verification is CPU-bound as well, so both run off the event loop
+    user = await database.run_db(authenticate_user, db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -80,9 +124,9 @@ async def websocket_general_endpoint_main(websocket: WebSocket): # Renamed
     print(f"General WebSocket connected: {websocket.client}")
     try:
         while True:
-            # You might want to handle incoming messages or just keep alive
+            # Clients only send subscribe/unsubscribe requests (see ConnectionManager)
             data = await websocket.receive_text()
-            print(f"Received on /ws/general: {data} (usually not expected for one-way broadcast)")
+            await manager.handle_general_message(websocket, data)
     except WebSocketDisconnect:
         manager.disconnect(websocket, connection_type="general")
         print(f"General WebSocket disconnected: {websocket.client}")
@@ -99,6 +143,7 @@ app.include_router(sensor_router.router) # Handles /sensor-ingest/* (and potenti
 app.include_router(alert_router.router)   # Handles /alerts/*
 app.include_router(chat_router.router)    # Handles /chat/*
 app.include_router(spatial_router.router) # Handles /spatial/*
+app.include_router(risk_router.router)    # Handles /risk/*
 
 
 '''
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, ForeignKey, Enum as SQLAlchemyEnum
+from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, ForeignKey, JSON, Index, UniqueConstraint, Enum as SQLAlchemyEnum
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship, declarative_base # Use declarative_base once
+from sqlalchemy.orm import relationship, declarative_base, synonym # Use declarative_base once
 import enum
 
 # Define Base ONCE for all models
@@ -36,6 +36,22 @@ class SensorData(Base):
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
 
 
+class SensorLatest(Base):
+    # Latest reading per sensor, upserted on every ingest so map/radius queries
+    # scan one row per sensor instead of the whole sensor_data history.
+    __tablename__ = "sensor_latest"
+
+    sensor_id = Column(String, primary_key=True)
+    reading_id = Column(Integer, ForeignKey("sensor_data.id"), nullable=False)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    water_level = Column(Float)
+    rainfall = Column(Float)
+    timestamp = Column(DateTime(timezone=True), index=True)
+
+    id = synonym("reading_id") # Lets SensorDataOut/SensorLocation validate these rows directly
+
+
 class Alert(Base):
     __tablename__ = "alerts"
 
@@ -45,7 +61,40 @@ class Alert(Base):
     level = Column(String, nullable=False)  # e.g. info, warning, critical
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
     is_resolved = Column(Boolean, default=False)
-    sensor_id = Column(String, index=True, nullable=True) # Optional: link alert to a sensor
+    sensor_id = Column(String, nullable=True) # Optional: link alert to a sensor (indexed via ix_alerts_sensor_timestamp_id)
+
+    # Keyset pagination walks (timestamp, id) descending, optionally within one filter
+    __table_args__ = (
+        Index("ix_alerts_timestamp_id", "timestamp", "id"),
+        Index("ix_alerts_unresolved_timestamp_id", "timestamp", "id",
+              postgresql_where=(is_resolved == False), sqlite_where=(is_resolved == False)),
+        Index("ix_alerts_level_timestamp_id", "level", "timestamp", "id"),
+        Index("ix_alerts_sensor_timestamp_id", "sensor_id", "timestamp", "id"),
+    )
+
+
+class DistrictPolygon(Base):
+    # Named boundary (municipality, district, ...) for /spatial/sensors-in-polygon
+    __tablename__ = "district_polygons"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, index=True, nullable=False)
+    coordinates = Column(JSON, nullable=False) # [[lat, lon], ...] outer ring, not closed
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class RiskThreshold(Base):
+    # Water level thresholds for one scope: "default" (target ""), "region" (target =
+    # district polygon name) or "sensor" (target = sensor_id). See app/risk.py.
+    __tablename__ = "risk_thresholds"
+    __table_args__ = (UniqueConstraint("scope", "target"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String, nullable=False)
+    target = Column(String, nullable=False, default="")
+    warning_level = Column(Float, nullable=False)
+    critical_level = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
 
 class Message(Base):
@@ -0,0 +1,94 @@
+# app/polygon_registry.py
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from . import geo, schemas
+from .sensor_cache import SensorStateCache, sensor_cache
+
+
+class RegisteredPolygon(NamedTuple):
+    name: str
+    lats: np.ndarray
+    lons: np.ndarray
+    bbox: tuple[float, float, float, float] # min_lat, min_lon, max_lat, max_lon
+
+
+def make_polygon(name: str, coordinates) -> RegisteredPolygon:
+    vertices = np.asarray(coordinates, dtype=np.float64)
+    lats, lons = vertices[:, 0], vertices[:, 1]
+    return RegisteredPolygon(name, lats, lons, (lats.min(), lons.min(), lats.max(), lons.max()))
+
+def sensors_in_polygon(polygon: RegisteredPolygon, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Indices of the points inside the polygon: bbox prefilter, then vectorized ray casting."""
+    min_lat, min_lon, max_lat, max_lon = polygon.bbox
+    candidates = np.flatnonzero((lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon))
+    inside = geo.points_in_polygon(lats[candidates], lons[candidates], polygon.lats, polygon.lons)
+    return candidates[inside]
+
+
+class PolygonRegistry:
+    """Named polygons (loaded from district_polygons) with a cached sensor membership set each.
+
+    A polygon's membership is computed on first use with one vectorized pass over the
+    cached sensor positions; after that it is only touched when a sensor appears or moves
+    (sensor_updated), so water-level-only readings never trigger point-in-polygon work.
+    Polygons are treated as planar in lat/lon and must not cross the antimeridian.
+    """
+
+    def __init__(self, cache: SensorStateCache):
+        self._cache = cache
+        self._polygons: dict[str, RegisteredPolygon] = {}
+        self._members: dict[str, set[str]] = {} # Only for polygons whose membership is computed
+        cache.add_listener(self)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._polygons
+
+    def get(self, name: str) -> Optional[RegisteredPolygon]:
+        return self._polygons.get(name)
+
+    def load(self, polygons: list[tuple[str, list]]):
+        self._polygons = {name: make_polygon(name, coordinates) for name, coordinates in polygons}
+        self._members = {}
+
+    def put(self, name: str, coordinates):
+        self._polygons[name] = make_polygon(name, coordinates)
+        self._members.pop(name, None)
+
+    def remove(self, name: str):
+        self._polygons.pop(name, None)
+        self._members.pop(name, None)
+
+    def members(self, name: str) -> set[str]:
+        members = self._members.get(name)
+        if members is None:
+            ids, lats, lons = self._cache.index.arrays()
+            members = {ids[slot] for slot in sensors_in_polygon(self._polygons[name], lats, lons).tolist()}
+            self._members[name] = members
+        return members
+
+    def readings(self, name: str) -> list[schemas.SensorDataOut]:
+        return [self._cache.get(sensor_id) for sensor_id in sorted(self.members(name))]
+
+    def sensor_count(self, name: str) -> Optional[int]:
+        members = self._members.get(name)
+        return len(members) if members is not None else None
+
+    # --- SensorStateCache listener ---
+    def sensor_updated(self, old: Optional[schemas.SensorDataOut], new: schemas.SensorDataOut):
+        if old is not None and (old.latitude, old.longitude) == (new.latitude, new.longitude):
+            return
+        point_lat = np.array([new.latitude], dtype=np.float64)
+        point_lon = np.array([new.longitude], dtype=np.float64)
+        for name, members in self._members.items():
+            if len(sensors_in_polygon(self._polygons[name], point_lat, point_lon)):
+                members.add(new.sensor_id)
+            else:
+                members.discard(new.sensor_id)
+
+    def sensors_reset(self):
+        self._members = {}
+
+
+polygon_registry = PolygonRegistry(sensor_cache) # Global registry, loaded in main.py startup
@@ -0,0 +1,363 @@
+# app/pubsub.py
+import asyncio
+import fcntl
+import os
+import threading
+import uuid
+from typing import Any, Callable, Optional
+
+import orjson
+
+# local | unix | postgres. With unix or postgres, state_sync.py keeps each worker's in-memory
+# state in step over the same backend and alerts are evaluated by one owner worker
+BROADCAST_BACKEND = os.getenv("BROADCAST_BACKEND", "local")
+BROADCAST_UNIX_SOCKET = os.getenv("BROADCAST_UNIX_SOCKET", "/tmp/flood-monitor-broadcast.sock")
+BROADCAST_PG_CHANNEL = os.getenv("BROADCAST_PG_CHANNEL", "flood_monitor_broadcast")
+BROADCAST_MAX_FRAME_BYTES = int(os.getenv("BROADCAST_MAX_FRAME_BYTES", 16 * 1024 * 1024))
+BROADCAST_RECONNECT_S = float(os.getenv("BROADCAST_RECONNECT_S", 1.0))
+BROADCAST_OWNER_CHECK_S = float(os.getenv("BROADCAST_OWNER_CHECK_S", 5.0))
+
+PG_NOTIFY_MAX_BYTES = 7900 # Postgres rejects NOTIFY payloads of 8000 bytes or more, header included
+PG_NOTIFY_CHUNK_CHARS = 7000
+
+Deliver = Callable[[str, Any], None] # (channel, message) -> hands it to this process's WebSockets
+
+# A backend's listener (optional) is told when the backend (re)connects to the other workers,
+# since anything relayed while it was cut off is lost, and when this worker gains or loses
+# ownership. Exactly one connected worker owns at a time; it evaluates the alerts.
+#   listener.relay_connected()
+#   listener.ownership_changed(owner: bool)
+
+
+class LocalBroadcast:
+    """Single process: published messages go straight to this process's connections."""
+
+    relays = False # Nothing leaves this process
+
+    async def start(self, deliver: Deliver, listener=None):
+        self._deliver = deliver
+        if listener is not None:
+            listener.ownership_changed(True) # The only worker
+
+    async def publish(self, channel: str, message: Any):
+        self._deliver(channel, message)
+
+    async def stop(self):
+        pass
+
+
+class UnixSocketBroadcast:
+    """Workers on one machine relay broadcasts through a broker on a Unix socket.
+
+    Whichever worker holds the lock file next to the socket runs the broker, which
+    forwards each newline-framed message to every other connected worker; when it exits
+    the lock is released and another worker takes over on its next reconnect. Messages
+    are delivered locally first, so a broker outage only interrupts cross-worker fan-out.
+    The broker's worker is the owner.
+    """
+
+    relays = True
+
+    def __init__(self, path: str = BROADCAST_UNIX_SOCKET):
+        self.path = path
+        self._deliver: Optional[Deliver] = None
+        self._listener = None
+        self._task: Optional[asyncio.Task] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._lock_fd: Optional[int] = None
+        self._peers: set[asyncio.StreamWriter] = set() # Broker side
+
+    async def start(self, deliver: Deliver, listener=None):
+        self._deliver = deliver
+        self._listener = listener
+        self._task = asyncio.create_task(self._run())
+
+    async def publish(self, channel: str, message: Any):
+        self._deliver(channel, message)
+        if self._writer is None:
+            return # Broker unreachable: only this worker's clients get it
+        try:
+            self._writer.write(orjson.dumps({"channel": channel, "message": message}) + b"\n")
+        except Exception as e:
+            print(f"WARNING: Could not publish to broadcast broker: {e}")
+
+    async def _run(self):
+        while True:
+            writer = None
+            try:
+                await self._try_become_broker()
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=BROADCAST_MAX_FRAME_BYTES)
+                self._writer = writer
+                print(f"INFO: Connected to broadcast broker at {self.path}.")
+                if self._listener is not None:
+                    self._listener.relay_connected()
+                while line := await reader.readline():
+                    envelope = orjson.loads(line)
+                    self._deliver(envelope["channel"], envelope["message"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"WARNING: Broadcast broker connection failed: {e}")
+            finally:
+                self._writer = None
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(BROADCAST_RECONNECT_S)
+
+    async def _try_become_broker(self):
+        if self._server is not None:
+            return
+        fd = os.open(self.path + ".lock", os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd) # Another worker runs the broker
+            return
+        self._lock_fd = fd
+        if os.path.exists(self.path):
+            os.unlink(self.path) # Left behind by a broker that died
+        self._server = await asyncio.start_unix_server(self._serve_peer, path=self.path, limit=BROADCAST_MAX_FRAME_BYTES)
+        print(f"INFO: Broadcast broker listening on {self.path}.")
+        if self._listener is not None:
+            self._listener.ownership_changed(True) # Until this process exits
+
+    async def _serve_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._peers.add(writer)
+        try:
+            while line := await reader.readline():
+                for peer in self._peers:
+                    if peer is not writer:
+                        peer.write(line)
+        except Exception as e:
+            print(f"WARNING: Broadcast broker dropped a worker: {e}")
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._server is not None:
+            self._server.close()
+            for peer in list(self._peers):
+                peer.close()
+            await self._server.wait_closed()
+            self._server = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            os.close(self._lock_fd) # Releases the broker lock
+            self._lock_fd = None
+
+
+class PostgresBroadcast:
+    """Workers on any number of nodes sharing the database relay broadcasts through
+    LISTEN/NOTIFY.
+
+    Payloads are split into chunks tagged "origin:message id:index:count:" to stay under
+    the NOTIFY size limit; a message's chunks are sent in one transaction and arrive in
+    order. Each worker delivers its own messages locally and ignores their echo.
+    Publishing only queues the message; a sender task issues the NOTIFYs off the event
+    loop, in publish order.
+
+    The owner is whichever worker holds a session advisory lock keyed on the channel,
+    checked every BROADCAST_OWNER_CHECK_S on a connection of its own. If the owner's
+    connection dies, Postgres releases the lock and another worker takes it on its next
+    check, so for up to that long two workers may both believe they own.
+    """
+
+    relays = True
+
+    def __init__(self, channel: str = BROADCAST_PG_CHANNEL):
+        self.channel = channel
+        self.origin = uuid.uuid4().hex[:12]
+        self._sequence = 0
+        self._deliver: Optional[Deliver] = None
+        self._listener = None
+        self._owner = False
+        self._owner_conn = None
+        self._holds_lock = False
+        self._listen_conn = None
+        self._listen_fd: Optional[int] = None
+        self._notify_conn = None
+        self._notify_lock = threading.Lock()
+        self._outbox: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+        self._partial: dict[str, tuple[str, list[str]]] = {} # origin -> (message id, chunks so far)
+        self._lost: Optional[asyncio.Event] = None
+
+    async def start(self, deliver: Deliver, listener=None):
+        self._deliver = deliver
+        self._listener = listener
+        self._outbox = asyncio.Queue()
+        self._lost = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._send())]
+        if listener is not None:
+            self._tasks.append(asyncio.create_task(self._own()))
+
+    async def publish(self, channel: str, message: Any):
+        self._deliver(channel, message)
+        self._sequence += 1
+        self._outbox.put_nowait(self._chunks(str(self._sequence), orjson.dumps({"channel": channel, "message": message}).decode()))
+
+    def _chunks(self, message_id: str, payload: str) -> list[str]:
+        chunks, pos = [], 0
+        while pos < len(payload):
+            size = PG_NOTIFY_CHUNK_CHARS
+            while len(payload[pos:pos + size].encode()) > PG_NOTIFY_MAX_BYTES - 64: # Room for the header
+                size //= 2
+            chunks.append(payload[pos:pos + size])
+            pos += size
+        return [f"{self.origin}:{message_id}:{i}:{len(chunks)}:{chunk}" for i, chunk in enumerate(chunks)]
+
+    def _raw_connection(self):
+        # Dedicated connection built from the app's engine, taken out of the pool for good
+        from .database import engine
+        connection = engine.raw_connection()
+        connection.detach()
+        driver_connection = connection.driver_connection
+        driver_connection.autocommit = True
+        return driver_connection
+
+    def _notify(self, chunks: list[str]):
+        with self._notify_lock:
+            if self._notify_conn is None or self._notify_conn.closed:
+                self._notify_conn = self._raw_connection()
+            with self._notify_conn.cursor() as cursor:
+                cursor.execute("BEGIN")
+                for chunk in chunks:
+                    cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, chunk))
+                cursor.execute("COMMIT")
+
+    async def _send(self):
+        from .database import run_db
+        while True:
+            chunks = await self._outbox.get()
+            try:
+                await run_db(self._notify, chunks)
+            except Exception as e:
+                print(f"WARNING: Could not publish broadcast through NOTIFY: {e}")
+                with self._notify_lock:
+                    if self._notify_conn is not None:
+                        self._notify_conn.close()
+                    self._notify_conn = None
+
+    async def _listen(self):
+        from .database import run_db
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                self._listen_conn = await run_db(self._raw_connection)
+                with self._listen_conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                self._lost.clear()
+                self._listen_fd = self._listen_conn.fileno()
+                loop.add_reader(self._listen_fd, self._on_readable)
+                print(f"INFO: Listening for broadcasts on Postgres channel {self.channel}.")
+                if self._listener is not None:
+                    self._listener.relay_connected()
+                await self._lost.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"WARNING: Postgres broadcast listener failed: {e}")
+            finally:
+                self._close_listener(loop)
+            await asyncio.sleep(BROADCAST_RECONNECT_S)
+
+    def _on_readable(self):
+        try:
+            self._listen_conn.poll()
+        except Exception as e:
+            print(f"WARNING: Postgres broadcast listener lost its connection: {e}")
+            self._lost.set()
+            return
+        while self._listen_conn.notifies:
+            self._receive(self._listen_conn.notifies.pop(0).payload)
+
+    def _receive(self, payload: str):
+        origin, message_id, index, count, chunk = payload.split(":", 4)
+        if origin == self.origin:
+            return # Already delivered locally by publish()
+        if index == "0":
+            self._partial[origin] = (message_id, [])
+        current = self._partial.get(origin)
+        if current is None or current[0] != message_id:
+            return # Missed the start of this message
+        current[1].append(chunk)
+        if len(current[1]) == int(count):
+            del self._partial[origin]
+            envelope = orjson.loads("".join(current[1]))
+            self._deliver(envelope["channel"], envelope["message"])
+
+    def _check_owner(self) -> bool:
+        # Session-level lock: held for as long as this connection lives
+        if self._owner_conn is None or self._owner_conn.closed:
+            self._owner_conn, self._holds_lock = self._raw_connection(), False
+        with self._owner_conn.cursor() as cursor:
+            if self._holds_lock:
+                cursor.execute("SELECT 1") # Still connected, so still holding it
+            else:
+                cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (self.channel,))
+                self._holds_lock = bool(cursor.fetchone()[0])
+        return self._holds_lock
+
+    def _close_owner_conn(self):
+        if self._owner_conn is not None:
+            self._owner_conn.close() # Releases the lock if it was held
+        self._owner_conn, self._holds_lock = None, False
+
+    async def _own(self):
+        from .database import run_db
+        while True:
+            try:
+                owner = await run_db(self._check_owner)
+            except Exception as e:
+                print(f"WARNING: Could not check broadcast ownership: {e}")
+                self._close_owner_conn()
+                owner = False
+            if owner != self._owner:
+                self._owner = owner
+                print(f"INFO: This worker {'now owns' if owner else 'no longer owns'} Postgres channel {self.channel}.")
+                self._listener.ownership_changed(owner)
+            await asyncio.sleep(BROADCAST_OWNER_CHECK_S)
+
+    def _close_listener(self, loop: asyncio.AbstractEventLoop):
+        if self._listen_fd is not None:
+            loop.remove_reader(self._listen_fd)
+            self._listen_fd = None
+        if self._listen_conn is not None:
+            self._listen_conn.close()
+            self._listen_conn = None
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._close_owner_conn()
+        with self._notify_lock:
+            if self._notify_conn is not None:
+                self._notify_conn.close()
+                self._notify_conn = None
+
+
+BROADCAST_BACKENDS = {
+    "local": LocalBroadcast,
+    "unix": UnixSocketBroadcast,
+    "postgres": PostgresBroadcast,
+}
+
+def create_broadcast_backend(name: str = BROADCAST_BACKEND):
+    if name not in BROADCAST_BACKENDS:
+        raise ValueError(f"Unknown BROADCAST_BACKEND '{name}', expected one of {', '.join(BROADCAST_BACKENDS)}")
+    return BROADCAST_BACKENDS[name]()
@@ -0,0 +1,207 @@
+# app/rise_detector.py
+import os
+import threading
+from typing import Iterable, NamedTuple, Optional, Sequence
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from . import crud, models, schemas
+from .alert_engine import AlertEvents
+
+RISE_ALERT_DELTA_M = float(os.getenv("RISE_ALERT_DELTA_M", 0.5)) # Rise that triggers an alert...
+RISE_ALERT_WINDOW_MIN = float(os.getenv("RISE_ALERT_WINDOW_MIN", 15)) # ...within this many minutes
+RISE_ALERT_COOLDOWN_MIN = float(os.getenv("RISE_ALERT_COOLDOWN_MIN", 30)) # Minimum gap between alerts for one sensor
+RISE_BUFFER_SIZE = int(os.getenv("RISE_BUFFER_SIZE", 32)) # Readings kept per sensor to start with...
+RISE_BUFFER_MAX_SIZE = int(os.getenv("RISE_BUFFER_MAX_SIZE", 4096)) # ...grown up to this while the window needs it
+
+RISE_ALERT_LEVEL = "rate_of_rise" # Kept apart from the threshold levels handled by alert_engine
+
+
+class ReadingRing:
+    """Ring of (time, water level) for one sensor plus a monotonic queue of the slots
+    holding the window minimum, so each push reports the rise over the window in
+    amortized O(1). Sequence numbers only grow; slot = seq % capacity.
+
+    Readings leave by age, not count: when the slot about to be overwritten is still
+    inside the window, the ring doubles (up to max_capacity) instead, so sensors that
+    report often keep the whole window.
+    """
+
+    __slots__ = ("times", "levels", "minima", "seq", "min_head", "min_tail", "max_capacity",
+                 "last_alert", "open_alert")
+
+    def __init__(self, capacity: int = RISE_BUFFER_SIZE, max_capacity: int = RISE_BUFFER_MAX_SIZE):
+        self.times = np.empty(capacity, dtype=np.float64)
+        self.levels = np.empty(capacity, dtype=np.float64)
+        self.minima = np.empty(capacity, dtype=np.int64) # Ring of seqs with increasing levels
+        self.seq = 0
+        self.min_head = 0
+        self.min_tail = 0
+        self.max_capacity = max(capacity, max_capacity)
+        self.last_alert: Optional[float] = None # Time of the last committed alert (cooldown)
+        self.open_alert: Optional[int] = None # Id of the unresolved rise alert, if any
+
+    def last_time(self) -> Optional[float]:
+        return float(self.times[(self.seq - 1) % len(self.times)]) if self.seq else None
+
+    def _grow(self):
+        capacity = len(self.times)
+        new_capacity = min(capacity * 2, self.max_capacity)
+        seqs = np.arange(self.seq - capacity, self.seq)
+        times, levels = np.empty(new_capacity), np.empty(new_capacity)
+        times[seqs % new_capacity] = self.times[seqs % capacity]
+        levels[seqs % new_capacity] = self.levels[seqs % capacity]
+        positions = np.arange(self.min_head, self.min_tail)
+        minima = np.empty(new_capacity, dtype=np.int64)
+        minima[positions % new_capacity] = self.minima[positions % capacity]
+        self.times, self.levels, self.minima = times, levels, minima
+
+    def push(self, t: float, level: float, window_s: float) -> tuple[float, float]:
+        """Adds a reading; returns (rise above the window minimum, seconds since that minimum)."""
+        capacity = len(self.times)
+        if self.seq >= capacity and capacity < self.max_capacity and self.times[self.seq % capacity] >= t - window_s:
+            self._grow()
+            capacity = len(self.times)
+        slot = self.seq % capacity
+        self.times[slot] = t
+        self.levels[slot] = level
+        self.seq += 1
+        # The slot just written may still be referenced as an old minimum
+        if self.min_tail > self.min_head and self.minima[self.min_head % capacity] < self.seq - capacity:
+            self.min_head += 1
+        while self.min_tail > self.min_head and self.levels[self.minima[(self.min_tail - 1) % capacity] % capacity] >= level:
+            self.min_tail -= 1
+        self.minima[self.min_tail % capacity] = self.seq - 1
+        self.min_tail += 1
+        while self.times[self.minima[self.min_head % capacity] % capacity] < t - window_s:
+            self.min_head += 1 # Never empties: the reading just pushed is inside the window
+        oldest = self.minima[self.min_head % capacity] % capacity
+        return level - float(self.levels[oldest]), t - float(self.times[oldest])
+
+
+class _RiseChanges(NamedTuple):
+    opens: list[tuple[str, float, schemas.AlertCreate]] # (sensor_id, reading time, alert)
+    resolves: list[tuple[str, int]] # (sensor_id, alert id)
+
+
+class RiseDetector:
+    """Rate-of-rise rule over per-sensor ReadingRings, evaluated in memory on ingest.
+
+    Fires when a sensor's water level is more than delta_m above its lowest reading of
+    the last window_min minutes, at most once per cooldown_min per sensor, and not while
+    the sensor's previous rise alert is still open. That alert is resolved by the first
+    reading showing no such rise once the cooldown has passed. Readings that arrive
+    older than the sensor's newest one are skipped.
+
+    Like AlertEngine, the cooldown and open alert only advance once the alert changes
+    are committed, so a failed write loses nothing.
+    """
+
+    def __init__(self, delta_m: float = RISE_ALERT_DELTA_M, window_min: float = RISE_ALERT_WINDOW_MIN,
+                 cooldown_min: float = RISE_ALERT_COOLDOWN_MIN, buffer_size: int = RISE_BUFFER_SIZE,
+                 max_buffer_size: int = RISE_BUFFER_MAX_SIZE):
+        self.delta_m = delta_m
+        self.window_s = window_min * 60
+        self.cooldown_s = cooldown_min * 60
+        self.buffer_size = buffer_size
+        self.max_buffer_size = max_buffer_size
+        self._rings: dict[str, ReadingRing] = {}
+        self._lock = threading.Lock()
+
+    def _ring(self, sensor_id: str) -> ReadingRing:
+        ring = self._rings.get(sensor_id)
+        if ring is None:
+            ring = self._rings[sensor_id] = ReadingRing(self.buffer_size, self.max_buffer_size)
+        return ring
+
+    def load(self, open_alerts: Iterable[models.Alert]):
+        """Picks up unresolved rise alerts (oldest first) so they are deduplicated and resolved,
+        replacing the open alerts known so far (cooldowns are kept)."""
+        with self._lock:
+            for ring in self._rings.values():
+                ring.open_alert = None
+            for alert in open_alerts:
+                if alert.sensor_id is None or alert.level != RISE_ALERT_LEVEL:
+                    continue
+                ring = self._ring(alert.sensor_id)
+                ring.open_alert, ring.last_alert = alert.id, alert.timestamp.timestamp()
+
+    def alert_resolved(self, alert_id: int, sensor_id: Optional[str]):
+        """Called when an alert is resolved outside the detector (e.g. /alerts/{id}/resolve)."""
+        with self._lock:
+            ring = self._rings.get(sensor_id)
+            if ring is not None and ring.open_alert == alert_id:
+                ring.open_alert = None
+
+    def observe(self, readings: Sequence[schemas.SensorDataOut]):
+        """Pushes readings into the rings without evaluating them, so a worker that does not
+        evaluate alerts has full windows if it takes over (see state_sync.py)."""
+        with self._lock:
+            for reading in readings:
+                ring = self._ring(reading.sensor_id)
+                t = reading.timestamp.timestamp()
+                last = ring.last_time()
+                if last is None or t >= last:
+                    ring.push(t, reading.water_level, self.window_s)
+
+    def check(self, readings: Sequence[schemas.SensorDataOut]) -> _RiseChanges:
+        """Pushes readings into the rings and returns the alert changes they call for."""
+        changes = _RiseChanges([], [])
+        alerted: dict[str, float] = {} # Opened in this batch: sensor -> reading time
+        resolved: set[str] = set()
+        with self._lock:
+            for reading in readings:
+                ring = self._ring(reading.sensor_id)
+                t = reading.timestamp.timestamp()
+                last = ring.last_time()
+                if last is not None and t < last:
+                    continue
+                rise, span_s = ring.push(t, reading.water_level, self.window_s)
+                sensor_id = reading.sensor_id
+                last_alert = alerted.get(sensor_id, ring.last_alert)
+                is_open = sensor_id in alerted or (ring.open_alert is not None and sensor_id not in resolved)
+                cooled = last_alert is None or t - last_alert >= self.cooldown_s
+                if rise > self.delta_m:
+                    if is_open or not cooled:
+                        continue
+                    alerted[sensor_id] = t
+                    changes.opens.append((sensor_id, t, schemas.AlertCreate(
+                        title=f"Rapid Rise at Sensor {sensor_id}",
+                        description=f"Water level rose {rise:.2f}m in {span_s / 60:.0f} min (now {reading.water_level:.2f}m).",
+                        level=RISE_ALERT_LEVEL, sensor_id=sensor_id
+                    )))
+                elif is_open and cooled and sensor_id not in alerted:
+                    resolved.add(sensor_id)
+                    changes.resolves.append((sensor_id, ring.open_alert))
+        return changes
+
+    def process(self, db: Session, readings: Sequence[schemas.SensorDataOut]) -> AlertEvents:
+        """Evaluates readings, writes the resulting rise alerts/resolutions and commits db."""
+        changes = self.check(readings)
+        if not changes.opens and not changes.resolves:
+            return AlertEvents([], [], [])
+        try:
+            new_orm = crud.create_alerts_db_batch(db, [alert for _, _, alert in changes.opens])
+            resolved_orm = crud.resolve_alerts_db_batch(db, [alert_id for _, alert_id in changes.resolves])
+            events = AlertEvents(
+                new=[schemas.AlertOut.model_validate(a) for a in new_orm],
+                updated=[],
+                resolved=[schemas.AlertOut.model_validate(a) for a in resolved_orm],
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        with self._lock:
+            for sensor_id, alert_id in changes.resolves:
+                ring = self._rings[sensor_id]
+                if ring.open_alert == alert_id:
+                    ring.open_alert = None
+            for (sensor_id, t, _), alert in zip(changes.opens, events.new):
+                ring = self._rings[sensor_id]
+                ring.last_alert, ring.open_alert = t, alert.id
+        return events
+
+
+rise_detector = RiseDetector() # Global detector, fed by the alert worker
@@ -0,0 +1,164 @@
+# app/risk.py
+import os
+from typing import Iterable, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from .polygon_registry import PolygonRegistry, polygon_registry, sensors_in_polygon
+
+# Default water level thresholds in metres (a reading must be strictly above them).
+# The "default" row of risk_thresholds overrides them at runtime.
+WARNING_LEVEL_M = float(os.getenv("RISK_WARNING_LEVEL_M", 5.0))
+CRITICAL_LEVEL_M = float(os.getenv("RISK_CRITICAL_LEVEL_M", 7.0))
+
+RISK_LEVELS = ("low", "medium", "high") # Index 0..2, ordered by severity
+ALERT_LEVELS = (None, "warning", "critical") # Alert level raised for each risk index
+
+SCOPE_DEFAULT, SCOPE_REGION, SCOPE_SENSOR = "default", "region", "sensor"
+
+
+class Thresholds(NamedTuple):
+    warning: float
+    critical: float
+
+
+def _as_float_array(values) -> np.ndarray:
+    if isinstance(values, np.ndarray):
+        return values.astype(np.float64, copy=False)
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+class RiskEngine:
+    """Water-level thresholds by scope, applied to whole arrays of readings in one call.
+
+    A reading uses its sensor's row if there is one, else the region rows whose polygon
+    (from the polygon registry) contains it - the strictest when several do - else the
+    default row. Region membership is one vectorized pass per region row over the batch.
+
+    Structures that cache risk levels register with add_listener() and are told through
+    listener.thresholds_changed() whenever the effective thresholds may have changed.
+
+    Changes arrive on the event loop while the alert worker classifies in the threadpool,
+    so the tables are copy-on-write: a change builds a new dict and swaps it in, and a
+    reader works on the references it took at the start.
+    """
+
+    def __init__(self, registry: PolygonRegistry):
+        self._registry = registry
+        self.default = Thresholds(WARNING_LEVEL_M, CRITICAL_LEVEL_M)
+        self._region: dict[str, Thresholds] = {}
+        self._sensor: dict[str, Thresholds] = {}
+        self._listeners = []
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def _changed(self):
+        for listener in self._listeners:
+            listener.thresholds_changed()
+
+    def load(self, rows: Iterable[tuple[str, str, float, float]]):
+        """Replaces every table with (scope, target, warning, critical) rows."""
+        default = Thresholds(WARNING_LEVEL_M, CRITICAL_LEVEL_M)
+        region, sensor = {}, {}
+        for scope, target, warning, critical in rows:
+            if scope == SCOPE_DEFAULT:
+                default = Thresholds(warning, critical)
+            else:
+                (region if scope == SCOPE_REGION else sensor)[target] = Thresholds(warning, critical)
+        self.default, self._region, self._sensor = default, region, sensor
+        self._changed()
+
+    def _store(self, scope: str, target: str, thresholds: Optional[Thresholds]):
+        if scope == SCOPE_DEFAULT:
+            self.default = thresholds or Thresholds(WARNING_LEVEL_M, CRITICAL_LEVEL_M)
+            return
+        table = dict(self._region if scope == SCOPE_REGION else self._sensor)
+        if thresholds is None:
+            table.pop(target, None)
+        else:
+            table[target] = thresholds
+        if scope == SCOPE_REGION:
+            self._region = table
+        else:
+            self._sensor = table
+
+    def set(self, scope: str, target: str, warning: float, critical: float):
+        self._store(scope, target, Thresholds(warning, critical))
+        self._changed()
+
+    def remove(self, scope: str, target: str):
+        self._store(scope, target, None)
+        self._changed()
+
+    def region_changed(self, name: str):
+        # A polygon was replaced; only matters if it carries thresholds
+        if name in self._region:
+            self._changed()
+
+    def region_removed(self, name: str):
+        # A polygon was deleted (crud.delete_polygon drops its threshold row too)
+        if name in self._region:
+            self._store(SCOPE_REGION, name, None)
+            self._changed()
+
+    def thresholds(self, count: int, lats=None, lons=None,
+                   sensor_ids: Optional[Sequence[str]] = None) -> tuple[np.ndarray, np.ndarray]:
+        """(warning, critical) threshold arrays for count readings."""
+        default, regions, sensors = self.default, self._region, self._sensor # Swapped on change, never mutated
+        warning = np.full(count, default.warning)
+        critical = np.full(count, default.critical)
+        if regions and lats is not None and lons is not None:
+            lats, lons = _as_float_array(lats), _as_float_array(lons)
+            region_warning = np.full(count, np.inf)
+            region_critical = np.full(count, np.inf)
+            for name, region in regions.items():
+                polygon = self._registry.get(name)
+                if polygon is None:
+                    continue
+                inside = sensors_in_polygon(polygon, lats, lons)
+                region_warning[inside] = np.minimum(region_warning[inside], region.warning)
+                region_critical[inside] = np.minimum(region_critical[inside], region.critical)
+            in_region = np.isfinite(region_critical)
+            warning[in_region] = region_warning[in_region]
+            critical[in_region] = region_critical[in_region]
+        if sensors and sensor_ids is not None:
+            for i, sensor_id in enumerate(sensor_ids):
+                own = sensors.get(sensor_id)
+                if own is not None:
+                    warning[i], critical[i] = own
+        return warning, critical
+
+    def classify(self, water_levels, lats=None, lons=None,
+                 sensor_ids: Optional[Sequence[str]] = None) -> np.ndarray:
+        """Risk index (0..2, see RISK_LEVELS) per reading; missing water levels count as low."""
+        water_levels = _as_float_array(water_levels)
+        warning, critical = self.thresholds(len(water_levels), lats, lons, sensor_ids)
+        return (water_levels > warning).astype(np.int8) + (water_levels > critical)
+
+    def classify_readings(self, readings: Sequence) -> np.ndarray:
+        """classify() for ORM rows or schemas with sensor_id/latitude/longitude/water_level."""
+        return self.classify(
+            [r.water_level for r in readings],
+            [r.latitude for r in readings],
+            [r.longitude for r in readings],
+            [r.sensor_id for r in readings],
+        )
+
+
+risk_engine = RiskEngine(polygon_registry) # Global engine, loaded from risk_thresholds in main.py startup
+
+
+def risk_index(water_level: Optional[float], latitude: Optional[float] = None,
+               longitude: Optional[float] = None, sensor_id: Optional[str] = None) -> int:
+    return int(risk_engine.classify(
+        [water_level], [latitude], [longitude], None if sensor_id is None else [sensor_id]
+    )[0])
+
+def classify_risk_level(water_level: Optional[float], latitude: Optional[float] = None,
+                        longitude: Optional[float] = None, sensor_id: Optional[str] = None) -> str:
+    return RISK_LEVELS[risk_index(water_level, latitude, longitude, sensor_id)]
+
+def risk_indices(water_levels: np.ndarray, lats=None, lons=None) -> np.ndarray:
+    """Vectorized risk_index over arrays of water levels and positions (NaN counts as low)."""
+    return risk_engine.classify(water_levels, lats, lons)
@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, status
+import base64
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Response, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from app import crud, models, schemas, auth
-from app.database import get_db
+from app.database import get_db, run_db
+from app.alert_engine import alert_engine
+from app.alert_summary import alert_summary
+from app.rise_detector import rise_detector
+from app.state_sync import state_sync
 # Use the global manager instance from websocket_manager
 from app.websocket_manager import manager as connection_manager
 
@@ -11,16 +17,33 @@ router = APIRouter(
     tags=["alerts"],
 )
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Opaque page cursor: the (timestamp, id) of the last alert on the previous page
+def encode_alert_cursor(alert: models.Alert) -> str:
+    return base64.urlsafe_b64encode(f"{alert.timestamp.isoformat()}|{alert.id}".encode()).decode()
+
+def decode_alert_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        timestamp, alert_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(alert_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
 # Helper for formatting new alerts for WebSocket broadcast
 def format_new_alert_for_broadcast(alert_orm: models.Alert) -> dict:
     alert_out = schemas.AlertOut.model_validate(alert_orm) # Pydantic V2
-    return {"type": "new_alert", "data": alert_out.model_dump(mode='json')}
+    return {"type": "new_alert", "data": [alert_out.model_dump(mode='json')]} # new_alert data is always a list
 
 # Helper for formatting resolved alerts for WebSocket broadcast
 def format_resolved_alert_for_broadcast(alert_orm: models.Alert) -> dict:
     alert_out = schemas.AlertOut.model_validate(alert_orm) # Pydantic V2
     return {"type": "alert_resolved", "data": alert_out.model_dump(mode='json')}
 
+# One frame for a bulk resolve: data is the list of resolved alerts
+def format_bulk_resolved_alerts_for_broadcast(alerts: List[schemas.AlertOut]) -> dict:
+    return {"type": "alerts_resolved", "data": [a.model_dump(mode='json') for a in alerts]}
+
 
 @router.post("/", response_model=schemas.AlertOut, status_code=status.HTTP_201_CREATED)
 async def create_alert_endpoint(
@@ -39,7 +62,8 @@ async def create_alert_endpoint(
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to create alerts")
 
     # crud.create_alert_db expects schemas.AlertCreate
-    db_alert = crud.create_alert_db(db=db, alert=alert_data)
+    db_alert = await run_db(crud.create_alert_db, db=db, alert=alert_data)
+    await state_sync.alerts_changed(opened=[schemas.AlertOut.model_validate(db_alert)]) # Summary, other workers
 
     # Broadcast new alert
     background_tasks.add_task(
@@ -51,17 +75,54 @@ async def create_alert_endpoint(
 
 @router.get("/", response_model=List[schemas.AlertOut])
 def get_alerts_endpoint(
-    # resolved: Optional[bool] = None, # crud.get_alerts_db needs update for this
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description=f"Value of {NEXT_CURSOR_HEADER} from the previous page"),
+    resolved: Optional[bool] = None,
+    level: Optional[str] = None,
+    sensor_id: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
-    # Modify crud.get_alerts_db if filtering by 'resolved' is needed.
-    # For now, removing the 'resolved' filter argument from the call.
-    alerts = crud.get_alerts_db(db, skip=skip, limit=limit)
+    # Newest first. One extra row tells whether there is a next page; its cursor is
+    # returned in the X-Next-Cursor header so the body stays a plain list.
+    before = decode_alert_cursor(cursor) if cursor else None
+    alerts = crud.get_alerts_db(db, limit=limit + 1, before=before, resolved=resolved, level=level, sensor_id=sensor_id)
+    if len(alerts) > limit:
+        alerts = alerts[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_alert_cursor(alerts[-1])
     return alerts # FastAPI handles serialization
 
+@router.post("/resolve", response_model=List[schemas.AlertOut])
+async def bulk_resolve_alerts_endpoint(
+    criteria: schemas.AlertBulkResolve,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.role_checker([
+        schemas.RoleEnum.commander,
+        schemas.RoleEnum.field_responder,
+        schemas.RoleEnum.admin
+    ])),
+    background_tasks: BackgroundTasks = BackgroundTasks()
+):
+    # Resolves every open alert matching the criteria in one UPDATE ... RETURNING; alerts
+    # already resolved are skipped, so the response lists only what this call changed
+    resolved = await run_db(crud.resolve_alerts_db_bulk, db, criteria)
+    for alert in resolved:
+        alert_engine.alert_resolved(alert.id, alert.sensor_id)
+        rise_detector.alert_resolved(alert.id, alert.sensor_id)
+    await state_sync.alerts_changed(resolved=resolved) # Summary, other workers
+    if resolved:
+        background_tasks.add_task(
+            connection_manager.broadcast_general,
+            format_bulk_resolved_alerts_for_broadcast(resolved)
+        )
+    return resolved
+
+@router.get("/summary", response_model=schemas.AlertSummaryOut)
+async def get_alert_summary_endpoint(current_user: models.User = Depends(auth.get_current_active_user)):
+    # Open alert counts from in-memory counters; no database access
+    return alert_summary.snapshot()
+
 # Endpoint for AlertNotifications.js
 @router.get("/latest-unresolved", response_model=List[schemas.AlertOut])
 def get_latest_unresolved_alerts_endpoint(
@@ -79,10 +140,7 @@ def get_alert_endpoint(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
-    # crud.get_alert_db needs to be defined. Assuming it looks like:
-    # def get_alert_db(db: Session, alert_id: int) -> Optional[models.Alert]:
-    #     return db.query(models.Alert).filter(models.Alert.id == alert_id).first()
-    db_alert = db.query(models.Alert).filter(models.Alert.id == alert_id).first() # Temporary direct query
+    db_alert = crud.get_alert_db(db, alert_id=alert_id)
     if db_alert is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Alert not found")
     return db_alert
@@ -99,27 +157,24 @@ async def resolve_alert_endpoint(
     ])),
     background_tasks: BackgroundTasks = BackgroundTasks()
 ):
-    # crud.resolve_alert_db expects alert_id, not the ORM object.
-    # crud.resolve_alert_db needs to handle user_id if you plan to log who resolved it.
-    # For now, adapting to the provided crud.resolve_alert_db signature.
-    
-    # Fetch the alert first to check its existence and current state
-    alert_to_resolve = db.query(models.Alert).filter(models.Alert.id == alert_id).first()
-    if alert_to_resolve is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Alert not found")
-    if alert_to_resolve.is_resolved:
+    # Conditional UPDATE ... RETURNING: only the caller that actually flips is_resolved gets
+    # the alert back, so the engine and summary are told once even if the alert engine or a
+    # bulk resolve races with this request
+    resolved_alert = await run_db(crud.resolve_open_alert_db, db, alert_id)
+    if resolved_alert is None:
+        if await run_db(crud.get_alert_db, db, alert_id=alert_id) is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Alert not found")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Alert already resolved")
-
-    resolved_alert_orm = crud.resolve_alert_db(db=db, alert_id=alert_id) # Pass alert_id
-    if not resolved_alert_orm: # Should not happen if checks above pass, but good practice
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to resolve alert")
+    alert_engine.alert_resolved(resolved_alert.id, resolved_alert.sensor_id) # Stays quiet until the sensor changes level
+    rise_detector.alert_resolved(resolved_alert.id, resolved_alert.sensor_id)
+    await state_sync.alerts_changed(resolved=[resolved_alert]) # Summary, other workers
 
     # Broadcast updated alert status
     background_tasks.add_task(
         connection_manager.broadcast_general,
-        format_resolved_alert_for_broadcast(resolved_alert_orm)
+        format_resolved_alert_for_broadcast(resolved_alert)
     )
-    return resolved_alert_orm
+    return resolved_alert
 
 '''
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, status
@@ -22,7 +22,7 @@ async def websocket_chat_endpoint_route( # Renamed
     db: Session = database.SessionLocal() # Create a new session for this WebSocket connection
     try:
         # Manually call get_current_user with the token from query and the new db session
-        current_user = await auth.get_current_user(token=token, db=db)
+        current_user = await auth.get_current_user(token=token, db=db) # DB lookup is offloaded inside
         print(f"User {current_user.username} authenticated for chat WebSocket.")
     except HTTPException as e:
         print(f"Chat WebSocket authentication failed: {e.detail}")
@@ -48,7 +48,7 @@ async def websocket_chat_endpoint_route( # Renamed
                 await websocket.send_text(json.dumps({"error": "Invalid message format/structure.", "details": error_detail}))
                 continue
             
-            db_message = crud.create_message(db, message=message_data, user_id=current_user.id)
+            db_message = await database.run_db(crud.create_message, db, message=message_data, user_id=current_user.id)
             chat_message_out = schemas.MessageOut.model_validate(db_message)
             await connection_manager.broadcast_chat(
                 {"type": "new_message", "data": chat_message_out.model_dump(mode='json')}
@@ -72,7 +72,7 @@ async def get_historical_chat_messages_route( # Renamed
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
-    messages_orm = crud.get_messages(db, skip=skip, limit=limit)
+    messages_orm = await database.run_db(crud.get_messages, db, skip=skip, limit=limit)
     return messages_orm # FastAPI handles conversion
 
 
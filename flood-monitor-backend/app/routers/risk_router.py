@@ -0,0 +1,59 @@
+# app/routers/risk_router.py
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.orm import Session
+from typing import List
+from app import crud, models, schemas, auth
+from app.database import get_db, run_db
+from app.risk import risk_engine, RISK_LEVELS
+from app.polygon_registry import polygon_registry
+from app.state_sync import state_sync
+
+router = APIRouter(
+    prefix="/risk",
+    tags=["risk"],
+    dependencies=[Depends(auth.get_current_active_user)]
+)
+
+@router.get("/thresholds", response_model=List[schemas.RiskThresholdOut])
+async def list_risk_thresholds_route(db: Session = Depends(get_db)):
+    return await run_db(crud.get_risk_thresholds, db)
+
+@router.put("/thresholds", response_model=schemas.RiskThresholdOut)
+async def set_risk_threshold_route(
+    threshold: schemas.RiskThresholdCreate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.role_checker([
+        schemas.RoleEnum.admin,
+        schemas.RoleEnum.commander,
+        schemas.RoleEnum.government_official
+    ]))
+):
+    # Creates or replaces the thresholds for one scope/target; applies to the next reading
+    # classified, and cached clusters/tiles/heatmaps are refreshed through the engine's listeners
+    if threshold.scope == schemas.RiskScopeEnum.region and threshold.target not in polygon_registry:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown polygon: {threshold.target}")
+    db_threshold = await run_db(crud.upsert_risk_threshold, db, threshold)
+    risk_engine.set(db_threshold.scope, db_threshold.target, db_threshold.warning_level, db_threshold.critical_level)
+    await state_sync.thresholds_changed() # Other workers reload theirs
+    return db_threshold
+
+@router.delete("/thresholds", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_risk_threshold_route(
+    scope: schemas.RiskScopeEnum = Query(...),
+    target: str = Query("", description="Sensor ID or polygon name; empty for the default scope"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.role_checker([
+        schemas.RoleEnum.admin,
+        schemas.RoleEnum.commander,
+        schemas.RoleEnum.government_official
+    ]))
+):
+    if not await run_db(crud.delete_risk_threshold, db, scope.value, target):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Threshold not found")
+    risk_engine.remove(scope.value, target)
+    await state_sync.thresholds_changed()
+
+@router.post("/classify", response_model=List[str])
+async def classify_readings_route(readings: List[schemas.RiskClassifyIn]):
+    # Batch analytics: risk level per reading, in request order, under the current thresholds
+    return [RISK_LEVELS[i] for i in risk_engine.classify_readings(readings).tolist()]
@@ -1,9 +1,15 @@
 # app/routers/sensor_router.py
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, status, Query, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app import crud, models, schemas, auth # auth might not be needed if endpoint is internal/unprotected
-from app.database import get_db
+from app.alert_engine import alert_engine, AlertEvents
+from app.rise_detector import rise_detector
+from app.alert_worker import alert_worker
+from app.database import get_db, run_db, SessionLocal
+from app.ingest_buffer import ingest_buffer
+from app.sensor_cache import sensor_cache
+from app.state_sync import state_sync
 from app.websocket_manager import manager as connection_manager # For broadcasting
 # Removed: from .. import models, schemas, crud, database (avoid .. imports if possible, use app.)
 
@@ -15,6 +21,91 @@ router = APIRouter(
     tags=["sensor data"], # General tag
 )
 
+# Readings accepted per /sensor-ingest/batch request
+MAX_INGEST_BATCH_SIZE = 5000
+
+# Writes a batch of readings in one transaction. Alerts are evaluated afterwards by
+# alert_worker. Returns Pydantic snapshots taken before the commit (committed ORM rows
+# are expired and would otherwise be re-read one by one).
+def persist_sensor_batch(db: Session, items: List[schemas.SensorDataCreate]) -> list[schemas.SensorDataOut]:
+    try:
+        sensor_entries_orm = crud.create_sensor_data_batch(db=db, items=items)
+        sensors_out = [schemas.SensorDataOut.model_validate(entry) for entry in sensor_entries_orm]
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return sensors_out
+
+# Single-reading counterpart of persist_sensor_batch
+def persist_sensor_reading(db: Session, data: schemas.SensorDataCreate) -> schemas.SensorDataOut:
+    return schemas.SensorDataOut.model_validate(crud.create_sensor_data(db=db, data=data))
+
+# Broadcast payload of a reading: plain dict of the SensorDataOut fields, without a
+# Pydantic dump; the manager's JSON encoder writes the timestamp as ISO 8601
+def sensor_payload(s: schemas.SensorDataOut) -> dict:
+    return {
+        "id": s.id, "sensor_id": s.sensor_id, "latitude": s.latitude, "longitude": s.longitude,
+        "water_level": s.water_level, "rainfall": s.rainfall, "timestamp": s.timestamp,
+    }
+
+def format_sensor_batch_for_broadcast(sensors_out: list[schemas.SensorDataOut]) -> dict:
+    return {
+        "type": "sensor_batch_update",
+        "data": [sensor_payload(s) for s in sensors_out],
+    }
+
+# --- Alert evaluation (alert_worker handler, registered at startup in main.py) ---
+# alert_engine (thresholds) and rise_detector (rate of rise) each commit their own transaction
+def _process_alerts_new_session(detector, readings: List[schemas.SensorDataOut]) -> AlertEvents:
+    db = SessionLocal()
+    try:
+        return detector.process(db, readings)
+    finally:
+        db.close()
+
+def alert_event_messages(alert_events: AlertEvents) -> list[dict]:
+    # One frame per kind of change, data always a list of alerts
+    messages = []
+    for frame_type, alerts in (("new_alert", alert_events.new), ("alert_updated", alert_events.updated),
+                               ("alerts_resolved", alert_events.resolved)):
+        if alerts:
+            messages.append({"type": frame_type, "data": [a.model_dump(mode='json') for a in alerts]})
+    return messages
+
+async def publish_alert_events(alert_events: AlertEvents):
+    await state_sync.alerts_changed(alert_events.new, alert_events.resolved)
+    for message in alert_event_messages(alert_events):
+        await connection_manager.broadcast_general(message)
+
+async def evaluate_alerts(readings: List[schemas.SensorDataOut]):
+    await state_sync.before_alert_pass()
+    # Each pass's committed changes are counted and broadcast before the next pass runs, so
+    # a failing pass never hides the other's alerts; the first failure is re-raised at the end
+    failure = None
+    for detector in (alert_engine, rise_detector):
+        try:
+            alert_events = await run_db(_process_alerts_new_session, detector, readings)
+        except Exception as e:
+            failure = failure or e
+            continue
+        await publish_alert_events(alert_events)
+    if failure is not None:
+        raise failure
+
+def _persist_sensor_batch_new_session(items: List[schemas.SensorDataCreate]):
+    db = SessionLocal()
+    try:
+        return persist_sensor_batch(db, items)
+    finally:
+        db.close()
+
+# Flush handler for ingest_buffer (registered at startup in main.py)
+async def flush_buffered_readings(items: List[schemas.SensorDataCreate]):
+    sensors_out = await run_db(_persist_sensor_batch_new_session, items)
+    await state_sync.readings_committed(sensors_out) # Cache, alert evaluation, other workers
+    await connection_manager.broadcast_general(format_sensor_batch_for_broadcast(sensors_out))
+
 # --- Sensor Data Ingestion (POST) ---
 @router.post("/sensor-ingest", response_model=schemas.SensorDataOut, status_code=status.HTTP_201_CREATED)
 async def ingest_sensor_data_route( # Renamed function
@@ -25,52 +116,88 @@ async def ingest_sensor_data_route( # Renamed function
     # current_user: models.User = Depends(auth.role_checker([schemas.RoleEnum.admin, schemas.RoleEnum.field_responder]))
 ):
     try:
-        sensor_entry_orm = crud.create_sensor_data(db=db, data=data)
+        # Just the insert: threshold and rate-of-rise alerts are evaluated by alert_worker
+        sensor_out = await run_db(persist_sensor_reading, db, data)
+        await state_sync.readings_committed([sensor_out]) # Cache, alert evaluation, other workers
 
-        sensor_out = schemas.SensorDataOut.model_validate(sensor_entry_orm)
         background_tasks.add_task(
             connection_manager.broadcast_general,
-            {"type": "sensor_update", "data": sensor_out.model_dump(mode='json')}
+            {"type": "sensor_update", "data": sensor_payload(sensor_out)}
         )
 
-        # Alert checking (from your existing code)
-        if sensor_entry_orm.water_level is not None:
-            alert_to_create = None
-            if sensor_entry_orm.water_level > 7.0:
-                alert_to_create = schemas.AlertCreate(
-                    title=f"Critical Water Level at Sensor {sensor_entry_orm.sensor_id}",
-                    description=f"Water level reached {sensor_entry_orm.water_level:.2f}m.",
-                    level="critical", sensor_id=sensor_entry_orm.sensor_id
-                )
-            elif sensor_entry_orm.water_level > 5.0:
-                alert_to_create = schemas.AlertCreate(
-                    title=f"Warning: High Water Level at Sensor {sensor_entry_orm.sensor_id}",
-                    description=f"Water level at {sensor_entry_orm.water_level:.2f}m.",
-                    level="warning", sensor_id=sensor_entry_orm.sensor_id
-                )
-            
-            if alert_to_create:
-                db_alert = crud.create_alert_db(db=db, alert=alert_to_create)
-                background_tasks.add_task(
-                    connection_manager.broadcast_general,
-                    {"type": "new_alert", "data": schemas.AlertOut.model_validate(db_alert).model_dump(mode='json')}
-                )
-
-        return sensor_entry_orm
+        return sensor_out
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+# --- Batch Sensor Data Ingestion (POST) ---
+# Gateways that buffer readings send them here in one request: a single bulk INSERT,
+# one transaction for the readings, and one combined WebSocket broadcast. Alerts are
+# evaluated afterwards by alert_worker.
+@router.post("/sensor-ingest/batch", response_model=List[schemas.SensorDataOut], status_code=status.HTTP_201_CREATED)
+async def ingest_sensor_data_batch_route(
+    data: List[schemas.SensorDataCreate],
+    db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks = BackgroundTasks(),
+):
+    if not data:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Batch must contain at least one reading")
+    if len(data) > MAX_INGEST_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch exceeds {MAX_INGEST_BATCH_SIZE} readings"
+        )
+    try:
+        sensors_out = await run_db(persist_sensor_batch, db, data)
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
+    await state_sync.readings_committed(sensors_out) # Cache, alert evaluation, other workers
+    background_tasks.add_task(
+        connection_manager.broadcast_general,
+        format_sensor_batch_for_broadcast(sensors_out)
+    )
+    return sensors_out
+
+# --- Write-behind Ingestion (POST) ---
+# Acknowledges immediately; ingest_buffer writes the reading with the next micro-batch.
+@router.post("/sensor-ingest/buffered", response_model=schemas.IngestAck, status_code=status.HTTP_202_ACCEPTED)
+async def ingest_sensor_data_buffered_route(data: schemas.SensorDataCreate):
+    if not ingest_buffer.submit(data):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Ingest buffer is full or not running, retry later",
+            headers={"Retry-After": "1"},
+        )
+    return {"status": "queued", "queue_depth": ingest_buffer.depth}
+
+@router.get("/sensor-ingest/buffer-stats", response_model=schemas.IngestBufferStats)
+def get_ingest_buffer_stats_route():
+    return ingest_buffer.stats()
+
+@router.get("/sensor-ingest/alert-worker-stats", response_model=schemas.AlertWorkerStats)
+def get_alert_worker_stats_route():
+    return alert_worker.stats()
+
+@router.get("/sensor-ingest/websocket-stats", response_model=schemas.WebSocketStats)
+def get_websocket_stats_route():
+    return connection_manager.stats()
+
 # --- Get Latest Sensor Data (for LiveMap initial load) ---
+# Latest reading per sensor, newest first: from sensor_cache once it is warmed, else from sensor_latest.
 @router.get("/sensor-data", response_model=List[schemas.SensorDataOut])
-def get_latest_sensor_data_route( # Renamed function
+async def get_latest_sensor_data_route( # Renamed function
     limit: int = Query(50, ge=1, le=200), # Default limit 50 for LiveMap
     db: Session = Depends(get_db),
     # Optional: Add auth if this data needs protection
     # current_user: models.User = Depends(auth.get_current_active_user)
 ):
-    return crud.get_latest_sensor_data(db, limit=limit)
+    if sensor_cache.warmed:
+        return sensor_cache.latest(limit)
+    return await run_db(crud.get_sensor_data_for_risk_map, db, limit=limit)
 
 '''
 # app/routers/sensor_router.py
@@ -1,9 +1,18 @@
 # app/routers/spatial_router.py
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Dict, List, Optional
 from app import crud, models, schemas, auth
-from app.database import get_db
+from app.database import get_db, run_db
+from app.sensor_cache import sensor_cache
+from app.polygon_registry import polygon_registry, make_polygon, sensors_in_polygon
+from app.cluster_index import cluster_index
+from app.tile_cache import tile_cache
+from app.heatmap import heatmap_cache
+from app.contours import contour_cache
+from app.state_sync import state_sync
+from app import risk
+import numpy as np
 
 router = APIRouter(
     prefix="/spatial",
@@ -19,7 +28,11 @@ async def get_sensors_within_radius_route( # Renamed
     min_water_level: Optional[float] = Query(None, description="Optional minimum water level filter"),
     db: Session = Depends(get_db)
 ):
-    sensors_orm = crud.get_sensors_in_radius(
+    if sensor_cache.warmed:
+        # Grid index lookup over the cached latest positions, no DB round trip
+        return sensor_cache.within_radius(latitude, longitude, radius_km, min_water_level)
+    sensors_orm = await run_db(
+        crud.get_sensors_in_radius,
         db,
         lat=latitude,
         lon=longitude,
@@ -28,22 +41,198 @@ async def get_sensors_within_radius_route( # Renamed
     )
     return sensors_orm
 
+@router.get("/nearest", response_model=List[schemas.NearestSensorOut])
+async def get_nearest_sensors_route(
+    latitude: float = Query(..., description="Reference latitude", ge=-90, le=90),
+    longitude: float = Query(..., description="Reference longitude", ge=-180, le=180),
+    k: int = Query(5, ge=1, le=100, description="Number of sensors to return"),
+    db: Session = Depends(get_db)
+):
+    # k nearest sensors by great-circle distance, nearest first (grid ring search over the cache)
+    if sensor_cache.warmed:
+        nearest = sensor_cache.nearest(latitude, longitude, k)
+    else:
+        nearest = await run_db(crud.get_nearest_sensors, db, latitude, longitude, k)
+    return [
+        schemas.NearestSensorOut(
+            **schemas.SensorDataOut.model_validate(sensor).model_dump(), distance_km=round(distance, 3)
+        )
+        for sensor, distance in nearest
+    ]
+
+# Upper bound on circles per /sensors-in-circles request
+MAX_QUERY_CIRCLES = 500
+
+@router.post("/sensors-in-circles", response_model=Dict[str, List[schemas.SensorDataOut]])
+async def get_sensors_within_circles_route(
+    circles: List[schemas.SpatialQueryCircle],
+    db: Session = Depends(get_db)
+):
+    # Many shelters/hospitals at once: sensor state is read once and every circle is
+    # answered from one vectorized distance pass. Results are keyed by circle id (or index).
+    if not circles:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="At least one circle is required")
+    if len(circles) > MAX_QUERY_CIRCLES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {MAX_QUERY_CIRCLES} circles per request")
+    keys = [c.id if c.id is not None else str(i) for i, c in enumerate(circles)]
+    if len(set(keys)) != len(keys):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Circle ids must be unique")
+
+    if sensor_cache.warmed:
+        results = sensor_cache.within_circles(circles)
+    else:
+        results = await run_db(crud.get_sensors_in_circles, db, circles)
+    return dict(zip(keys, results))
+
+# --- Named polygons (districts / municipal boundaries) ---
+def _polygon_out(db_polygon: models.DistrictPolygon) -> schemas.PolygonOut:
+    return schemas.PolygonOut(
+        id=db_polygon.id, name=db_polygon.name, coordinates=db_polygon.coordinates,
+        sensor_count=polygon_registry.sensor_count(db_polygon.name)
+    )
+
+@router.get("/polygons", response_model=List[schemas.PolygonOut])
+async def list_polygons_route(db: Session = Depends(get_db)):
+    return [_polygon_out(p) for p in await run_db(crud.get_polygons, db)]
+
+@router.post("/polygons", response_model=schemas.PolygonOut)
+async def register_polygon_route(
+    polygon: schemas.PolygonCreate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.role_checker([
+        schemas.RoleEnum.admin,
+        schemas.RoleEnum.commander,
+        schemas.RoleEnum.government_official
+    ]))
+):
+    # Creates the polygon, or replaces the vertices of an existing one with the same name
+    db_polygon = await run_db(crud.upsert_polygon, db, polygon)
+    polygon_registry.put(db_polygon.name, db_polygon.coordinates) # Membership recomputed on next query
+    risk.risk_engine.region_changed(db_polygon.name)
+    await state_sync.polygon_changed(db_polygon.name) # Other workers reload it
+    return _polygon_out(db_polygon)
+
+@router.delete("/polygons/{name}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_polygon_route(
+    name: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.role_checker([
+        schemas.RoleEnum.admin,
+        schemas.RoleEnum.commander,
+        schemas.RoleEnum.government_official
+    ]))
+):
+    if not await run_db(crud.delete_polygon, db, name):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Polygon not found")
+    polygon_registry.remove(name)
+    risk.risk_engine.region_removed(name)
+    await state_sync.polygon_changed(name)
+
+def _polygon_readings_from_db(db: Session, names: List[str]) -> Dict[str, List[models.SensorLatest]]:
+    # Uncached path (sensor cache not warmed): one sensor_latest load shared by all polygons
+    sensors = [s for s in crud.get_sensor_data_for_risk_map(db, limit=None) if s.latitude is not None and s.longitude is not None]
+    lats = np.fromiter((s.latitude for s in sensors), dtype=np.float64, count=len(sensors))
+    lons = np.fromiter((s.longitude for s in sensors), dtype=np.float64, count=len(sensors))
+    polygons = {p.name: p for p in crud.get_polygons(db)}
+    return {
+        name: [sensors[i] for i in sensors_in_polygon(make_polygon(name, polygons[name].coordinates), lats, lons).tolist()]
+        for name in names
+    }
+
+@router.get("/sensors-in-polygon", response_model=Dict[str, List[schemas.SensorDataOut]])
+async def get_sensors_in_polygons_route(
+    name: List[str] = Query(..., description="Registered polygon name (repeat for several)"),
+    db: Session = Depends(get_db)
+):
+    # Latest readings of the sensors inside each named polygon, keyed by polygon name
+    missing = [n for n in name if n not in polygon_registry]
+    if missing:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown polygon(s): {', '.join(missing)}")
+    if not sensor_cache.warmed:
+        return await run_db(_polygon_readings_from_db, db, name)
+    return {n: polygon_registry.readings(n) for n in name}
+
+@router.get("/clusters", response_model=List[schemas.ClusterOut])
+async def get_risk_clusters_route(
+    zoom: int = Query(..., ge=0, le=22, description="Map zoom level"),
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180, description="May be < min_lon for a viewport crossing the antimeridian"),
+):
+    # Server-side marker clustering: only the pre-aggregated cells visible in the viewport are
+    # returned, each with its member count and worst risk level.
+    if min_lat > max_lat:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="min_lat must not exceed max_lat")
+    if not sensor_cache.warmed:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Sensor state is still loading")
+    return cluster_index.query(zoom, min_lat, min_lon, max_lat, max_lon)
+
+@router.get("/tiles/{z}/{x}/{y}", response_model=List[schemas.RiskPoint])
+async def get_risk_tile_route(z: int, x: int, y: int):
+    # Risk layer (RiskPoint list) for one slippy-map tile, served from the LRU tile cache
+    if not 0 <= z <= 22 or not (0 <= x < (1 << z) and 0 <= y < (1 << z)):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tile out of range")
+    if not sensor_cache.warmed:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Sensor state is still loading")
+    return Response(content=tile_cache.get(z, x, y), media_type="application/json")
+
+@router.get("/heatmap", response_model=schemas.HeatmapOut)
+async def get_risk_heatmap_route(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    resolution: float = Query(0.01, gt=0, le=10, description="Cell size in degrees"),
+):
+    # Interpolated (IDW) water-level/risk raster. Grids are cached per resolution and bbox and
+    # updated in place as readings arrive, so repeated requests only pay for JSON encoding.
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="min_lat/min_lon must not exceed max_lat/max_lon")
+    if not sensor_cache.warmed:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Sensor state is still loading")
+    try:
+        grid = heatmap_cache.grid(min_lat, min_lon, max_lat, max_lon, resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return Response(content=grid.encoded(), media_type="application/json")
+
+@router.get("/contours", response_model=schemas.ContourSetOut)
+async def get_risk_contours_route(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    resolution: float = Query(0.01, gt=0, le=10, description="Cell size in degrees of the interpolated grid"),
+):
+    # Flood-extent polygons (areas above the warning/critical water levels), traced with marching
+    # squares over the cached heatmap grid and only re-traced once the grid moved by CONTOUR_DELTA_M.
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="min_lat/min_lon must not exceed max_lat/max_lon")
+    if not sensor_cache.warmed:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Sensor state is still loading")
+    try:
+        content = contour_cache.get(min_lat, min_lon, max_lat, max_lon, resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return Response(content=content, media_type="application/json")
+
 @router.get("/risk-map-data", response_model=List[schemas.RiskPoint])
 async def get_dynamic_risk_map_data_route(db: Session = Depends(get_db)): # Renamed
-    latest_sensor_readings = crud.get_sensor_data_for_risk_map(db, limit=200) # Fetches models.SensorData
+    if sensor_cache.warmed:
+        latest_sensor_readings = sensor_cache.latest(200) # No DB round trip
+    else:
+        latest_sensor_readings = await run_db(crud.get_sensor_data_for_risk_map, db, limit=200)
     risk_points = []
-    for sensor_orm in latest_sensor_readings:
-        risk_level = "low"
-        if sensor_orm.water_level is not None:
-            if sensor_orm.water_level > 7.0: risk_level = "high"
-            elif sensor_orm.water_level > 5.0: risk_level = "medium"
-        
+    # ORM rows or cached SensorDataOut, same attributes; classified in one vectorized call
+    risk_idx = risk.risk_engine.classify_readings(latest_sensor_readings).tolist()
+    for sensor_orm, sensor_risk in zip(latest_sensor_readings, risk_idx):
         risk_points.append(
             schemas.RiskPoint(
                 latitude=sensor_orm.latitude,
                 longitude=sensor_orm.longitude,
                 water_level=sensor_orm.water_level,
-                risk_level=risk_level,
+                risk_level=risk.RISK_LEVELS[sensor_risk],
                 sensor_id=sensor_orm.sensor_id,
                 last_updated=sensor_orm.timestamp
             )
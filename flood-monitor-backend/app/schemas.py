@@ -1,8 +1,8 @@
 # app/schemas.py
-from pydantic import BaseModel, Field, field_serializer, computed_field
+from pydantic import BaseModel, Field, field_serializer, computed_field, model_validator
 from datetime import datetime
 from enum import Enum as PyEnum
-from typing import Optional
+from typing import Dict, List, Literal, Optional, Tuple
 
 # --- Pydantic V2 Style Config ---
 # Common config to be reused if needed, or apply directly
@@ -32,6 +32,36 @@ class SensorDataOut(BaseModel):
     def serialize_timestamp(self, dt: datetime, _info):
         return dt.isoformat()
 
+class IngestAck(BaseModel): # Response for write-behind ingest; the reading is written by a later flush
+    status: str
+    queue_depth: int
+
+class IngestBufferStats(BaseModel):
+    running: bool
+    queue_depth: int
+    capacity: int
+    max_batch_size: int
+    max_delay_ms: float
+    accepted_total: int
+    rejected_total: int
+    flushed_total: int
+    failed_total: int # Readings dead-lettered after every flush attempt failed
+    retried_total: int
+    flush_count: int
+    last_flush_ms: float
+    max_flush_ms: float
+    avg_flush_ms: float
+
+class AlertWorkerStats(BaseModel):
+    running: bool
+    queue_depth: int
+    capacity: int
+    evaluated_total: int
+    failed_total: int
+    pass_count: int
+    last_pass_ms: float
+    max_pass_ms: float
+
 
 class RoleEnum(str, PyEnum):
     admin = "admin"
@@ -78,6 +108,30 @@ class AlertOut(AlertCreate):
     def serialize_timestamp(self, dt: datetime, _info):
         return dt.isoformat()
 
+class WebSocketStats(BaseModel):
+    general_connections: int
+    chat_connections: int
+    queued_frames: int # Frames waiting in all send queues
+    dropped_clients: int # Closed for falling behind since startup
+
+class AlertSummaryOut(BaseModel):
+    total_open: int
+    by_level: Dict[str, int] # Open alerts per level
+    by_sensor: Dict[str, int] # Open alerts per sensor, only sensors with any
+
+class AlertBulkResolve(BaseModel):
+    # Unresolved alerts matching every given criterion are resolved; at least one is required
+    ids: Optional[List[int]] = None
+    sensor_id: Optional[str] = None
+    level: Optional[str] = None
+    older_than: Optional[datetime] = None # Raised before this time
+
+    @model_validator(mode='after')
+    def check_criteria(self):
+        if self.ids is None and self.sensor_id is None and self.level is None and self.older_than is None:
+            raise ValueError("Give ids or at least one filter (sensor_id, level, older_than)")
+        return self
+
 # Schemas for Chat
 class MessageBase(BaseModel):
     content: str
@@ -140,11 +194,126 @@ class SensorLocation(BaseModel): # Example, adjust fields as needed
     def serialize_timestamp(self, dt: datetime, _info):
         return dt.isoformat()
 
-class SpatialQueryCircle(BaseModel):
-    latitude: float
+class NearestSensorOut(SensorDataOut): # /spatial/nearest result: latest reading plus distance
+    distance_km: float
+
+class ClusterOut(BaseModel): # Pre-aggregated marker for /spatial/clusters
+    latitude: float # Centroid of the member sensors
     longitude: float
-    radius_km: float
-    # min_water_level: Optional[float] = None # this was in mapService.js, add if needed for POST body
+    count: int
+    risk_level: str # Worst risk level among the members
+    risk_counts: Dict[str, int]
+    # Set only for single-sensor clusters
+    sensor_id: Optional[str] = None
+    water_level: Optional[float] = None
+    last_updated: Optional[datetime] = None
+
+    @field_serializer('last_updated')
+    def serialize_last_updated(self, dt: Optional[datetime], _info):
+        return dt.isoformat() if dt else None
+
+class HeatmapOut(BaseModel): # IDW raster for /spatial/heatmap, row 0 = southernmost row
+    min_lat: float # Grid bounds, snapped outwards to multiples of resolution
+    min_lon: float
+    max_lat: float
+    max_lon: float
+    resolution: float # Cell size in degrees
+    rows: int
+    cols: int
+    radius_km: float # Cells with no sensor this close are null
+    risk_levels: List[str] # Names for the indices in risk
+    water_level: List[List[Optional[float]]]
+    risk: List[List[Optional[int]]]
+
+class ContourPolygon(BaseModel):
+    exterior: List[Tuple[float, float]] # Closed [lat, lon] ring, counter-clockwise
+    holes: List[List[Tuple[float, float]]] = [] # Closed rings, clockwise
+
+class ContourLevel(BaseModel):
+    risk_level: str # Risk level of the area inside the polygons
+    threshold: float # Water level (m) the polygons enclose values above
+    polygons: List[ContourPolygon]
+
+class ContourSetOut(BaseModel): # /spatial/contours, traced from the heatmap grid with the same bounds
+    min_lat: float
+    min_lon: float
+    max_lat: float
+    max_lon: float
+    resolution: float
+    levels: List[ContourLevel]
+
+class PolygonCreate(BaseModel):
+    name: str = Field(..., min_length=1)
+    coordinates: List[Tuple[float, float]] = Field(..., min_length=3) # [lat, lon] vertices of the outer ring
+
+class PolygonOut(PolygonCreate):
+    id: int
+    sensor_count: Optional[int] = None # Sensors currently inside (from the membership cache)
+
+    model_config = PYDANTIC_V2_MODEL_CONFIG
+
+class RiskScopeEnum(str, PyEnum):
+    default = "default" # Target must be empty
+    region = "region" # Target is a registered polygon name
+    sensor = "sensor" # Target is a sensor_id
+
+class RiskThresholdCreate(BaseModel):
+    scope: RiskScopeEnum
+    target: str = ""
+    warning_level: float # Metres; readings strictly above are medium risk / warning alerts
+    critical_level: float # Metres; readings strictly above are high risk / critical alerts
+
+    @model_validator(mode='after')
+    def check_levels(self):
+        if self.critical_level < self.warning_level:
+            raise ValueError("critical_level must not be below warning_level")
+        if (self.scope == RiskScopeEnum.default) != (self.target == ""):
+            raise ValueError("target must be empty for the default scope and set otherwise")
+        return self
+
+class RiskThresholdOut(RiskThresholdCreate):
+    id: int
+    updated_at: Optional[datetime] = None
+
+    model_config = PYDANTIC_V2_MODEL_CONFIG
+
+class RiskClassifyIn(BaseModel): # One reading for /risk/classify
+    water_level: Optional[float] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    sensor_id: Optional[str] = None
+
+class SpatialQueryCircle(BaseModel):
+    id: Optional[str] = None # Key for this circle in batch results (defaults to its list index)
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    radius_km: float = Field(..., gt=0)
+    min_water_level: Optional[float] = None
+
+# Frame types broadcast on the /ws/general channel
+GeneralMessageType = Literal["sensor_update", "sensor_batch_update", "new_alert", "alert_updated",
+                             "alert_resolved", "alerts_resolved"]
+MAX_SUBSCRIPTION_SENSOR_IDS = 1000
+
+class GeneralSubscription(BaseModel):
+    # Filters a /ws/general client sends with {"action": "subscribe", ...}; None means no filter.
+    # An item is delivered if its type matches and (no sensor/bbox filter is set, its sensor
+    # is listed, or it lies inside bbox).
+    types: Optional[List[GeneralMessageType]] = Field(None, max_length=len(GeneralMessageType.__args__))
+    sensor_ids: Optional[List[str]] = Field(None, max_length=MAX_SUBSCRIPTION_SENSOR_IDS)
+    # min_lat, min_lon, max_lat, max_lon; min_lon > max_lon is a viewport crossing the antimeridian
+    bbox: Optional[Tuple[float, float, float, float]] = None
+
+    @model_validator(mode='after')
+    def check_bbox(self):
+        if self.bbox is None:
+            return self
+        min_lat, min_lon, max_lat, max_lon = self.bbox
+        if not -90 <= min_lat <= max_lat <= 90:
+            raise ValueError("bbox must be [min_lat, min_lon, max_lat, max_lon] with -90 <= min_lat <= max_lat <= 90")
+        if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+            raise ValueError("bbox longitudes must be within [-180, 180]")
+        return self
     
 '''
 from pydantic import BaseModel, Field
@@ -0,0 +1,102 @@
+# app/sensor_cache.py
+import heapq
+from typing import Iterable, Optional
+
+from . import geo, schemas
+from .spatial_index import SensorGridIndex
+
+
+class SensorStateCache:
+    """Latest reading of every sensor, keyed by sensor_id.
+
+    Warmed from sensor_latest at startup and pushed to by the ingest routes after each
+    commit, so dashboard/map reads are answered without a database round trip.
+    Each worker has its own; state_sync applies readings ingested by the other workers.
+    Sensor positions are mirrored into a SensorGridIndex for spatial queries.
+
+    Derived structures register with add_listener() and are told about every applied
+    reading via listener.sensor_updated(old, new) (old is None for a new sensor) and
+    about a full reload via listener.sensors_reset().
+    """
+
+    def __init__(self):
+        self._latest: dict[str, schemas.SensorDataOut] = {}
+        self.index = SensorGridIndex()
+        self.warmed = False
+        self._listeners = []
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def __len__(self) -> int:
+        return len(self._latest)
+
+    def warm(self, readings: Iterable[schemas.SensorDataOut]):
+        self.warmed = False # Listeners get one sensors_reset() instead of per-reading updates
+        self._latest = {}
+        self.index.clear()
+        self.update(readings)
+        self.warmed = True
+        for listener in self._listeners:
+            listener.sensors_reset()
+
+    def update(self, readings: Iterable[schemas.SensorDataOut]) -> list[schemas.SensorDataOut]:
+        """Stores readings that are newer than the cached one; returns those that were applied."""
+        applied = []
+        for reading in readings:
+            current = self._latest.get(reading.sensor_id)
+            # Buffered flushes can land out of order; (timestamp, id) decides which reading is newer
+            if current is not None and (reading.timestamp, reading.id) < (current.timestamp, current.id):
+                continue
+            self._latest[reading.sensor_id] = reading
+            if reading.latitude is not None and reading.longitude is not None:
+                self.index.upsert(reading.sensor_id, reading.latitude, reading.longitude)
+            applied.append(reading)
+            if self.warmed:
+                for listener in self._listeners:
+                    listener.sensor_updated(current, reading)
+        return applied
+
+    def get(self, sensor_id: str) -> Optional[schemas.SensorDataOut]:
+        return self._latest.get(sensor_id)
+
+    def all(self) -> list[schemas.SensorDataOut]:
+        return list(self._latest.values())
+
+    def latest(self, limit: Optional[int] = None) -> list[schemas.SensorDataOut]:
+        """Latest reading per sensor, most recently updated sensors first."""
+        sort_key = lambda r: (r.timestamp, r.id)
+        if limit is None:
+            return sorted(self._latest.values(), key=sort_key, reverse=True)
+        return heapq.nlargest(limit, self._latest.values(), key=sort_key)
+
+    def within_radius(self, lat: float, lon: float, radius_km: float,
+                      min_water_level: Optional[float] = None) -> list[schemas.SensorDataOut]:
+        """Latest readings of sensors within radius_km, nearest first (exact, uncapped)."""
+        readings = [self._latest[sensor_id] for sensor_id, _ in self.index.within_radius(lat, lon, radius_km)]
+        return filter_min_water_level(readings, min_water_level)
+
+    def nearest(self, lat: float, lon: float, k: int) -> list[tuple[schemas.SensorDataOut, float]]:
+        """(latest reading, distance_km) of the k sensors nearest to (lat, lon), nearest first."""
+        return [(self._latest[sensor_id], distance) for sensor_id, distance in self.index.nearest(lat, lon, k)]
+
+    def within_circles(self, circles: list[schemas.SpatialQueryCircle]) -> list[list[schemas.SensorDataOut]]:
+        """Latest readings inside each circle (nearest first), all circles in one vectorized pass."""
+        ids, lats, lons = self.index.arrays()
+        hits = geo.points_within_circles(
+            [c.latitude for c in circles], [c.longitude for c in circles], [c.radius_km for c in circles],
+            lats, lons,
+        )
+        return [
+            filter_min_water_level([self._latest[ids[slot]] for slot in slots.tolist()], circle.min_water_level)
+            for circle, (slots, _) in zip(circles, hits)
+        ]
+
+
+def filter_min_water_level(readings: list, min_water_level: Optional[float]) -> list:
+    if min_water_level is None:
+        return readings
+    return [r for r in readings if r.water_level is not None and r.water_level >= min_water_level]
+
+
+sensor_cache = SensorStateCache() # Global cache instance, warmed in main.py startup
@@ -0,0 +1,204 @@
+# app/spatial_index.py
+import os
+from math import asin, cos, floor, inf, radians, sin
+from typing import Optional
+
+import numpy as np
+
+from . import geo
+
+SPATIAL_INDEX_CELL_DEG = float(os.getenv("SPATIAL_INDEX_CELL_DEG", 0.1)) # ~11 km cells; must divide 360
+
+
+class SensorGridIndex:
+    """Grid-bucket index over sensor positions.
+
+    Each sensor owns a slot in contiguous NumPy lat/lon arrays and sits in one cell of a
+    fixed lat/lon grid. Radius queries gather the slots of the cells overlapping the
+    circle's bounding box and check them with one vectorized haversine pass, so results
+    are exact and cost O(sensors near the query), not O(all sensors).
+    """
+
+    def __init__(self, cell_size_deg: float = SPATIAL_INDEX_CELL_DEG, initial_capacity: int = 1024):
+        self.cell_size = cell_size_deg
+        self._lon_cells = int(round(360 / cell_size_deg)) # Number of cells around a parallel
+        # Wrapping across the antimeridian assumes whole cells from -180 to 180; otherwise
+        # the edge cells fall outside [first, last] and sensors there are missed
+        if cell_size_deg <= 0 or abs(self._lon_cells * cell_size_deg - 360) > 1e-9:
+            raise ValueError(f"Spatial index cell size {cell_size_deg} must divide 360 degrees evenly")
+        self._initial_capacity = initial_capacity
+        self.clear()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def clear(self):
+        self._cells: dict[tuple[int, int], set[int]] = {}
+        self._slots: dict[str, int] = {}
+        self._ids: list[str] = []
+        self._lat = np.empty(self._initial_capacity, dtype=np.float64)
+        self._lon = np.empty(self._initial_capacity, dtype=np.float64)
+
+    def _cell(self, lat: float, lon: float) -> tuple[int, int]:
+        return floor(lat / self.cell_size), floor(geo.wrap_lon(lon) / self.cell_size)
+
+    def slot(self, sensor_id: str) -> Optional[int]:
+        return self._slots.get(sensor_id)
+
+    def position(self, sensor_id: str) -> Optional[tuple[float, float]]:
+        slot = self._slots.get(sensor_id)
+        if slot is None:
+            return None
+        return float(self._lat[slot]), float(self._lon[slot])
+
+    def arrays(self) -> tuple[list[str], np.ndarray, np.ndarray]:
+        """(sensor_ids, lats, lons) for every indexed sensor, aligned by slot.
+        The arrays are views: copy them before holding on across updates."""
+        count = len(self._ids)
+        return self._ids, self._lat[:count], self._lon[:count]
+
+    def upsert(self, sensor_id: str, lat: float, lon: float) -> bool:
+        """Places or moves a sensor. Returns True if its position changed."""
+        slot = self._slots.get(sensor_id)
+        if slot is None:
+            slot = len(self._ids)
+            if slot == len(self._lat):
+                self._lat = np.concatenate([self._lat, np.empty_like(self._lat)])
+                self._lon = np.concatenate([self._lon, np.empty_like(self._lon)])
+            self._slots[sensor_id] = slot
+            self._ids.append(sensor_id)
+        elif self._lat[slot] == lat and self._lon[slot] == lon:
+            return False
+        else:
+            self._discard(slot, self._cell(self._lat[slot], self._lon[slot]))
+        self._lat[slot] = lat
+        self._lon[slot] = lon
+        self._cells.setdefault(self._cell(lat, lon), set()).add(slot)
+        return True
+
+    def _discard(self, slot: int, cell: tuple[int, int]):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(slot)
+            if not members:
+                del self._cells[cell]
+
+    def slots_in_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> np.ndarray:
+        """Slots of the sensors inside the bbox. Longitudes may run past +/-180 to
+        describe a box crossing the antimeridian."""
+        count = len(self._ids)
+        i0, i1 = floor(min_lat / self.cell_size), floor(max_lat / self.cell_size)
+        lon_ranges = self._lon_cell_ranges(min_lon, max_lon)
+        wanted_cells = (i1 - i0 + 1) * sum(j1 - j0 + 1 for j0, j1 in lon_ranges)
+
+        if wanted_cells > len(self._cells):
+            # Box covers more cells than are occupied: one vectorized pass over all sensors
+            mask = geo.bbox_mask(self._lat[:count], self._lon[:count], min_lat, min_lon, max_lat, max_lon)
+            return np.flatnonzero(mask)
+
+        slots = []
+        for i in range(i0, i1 + 1):
+            for j0, j1 in lon_ranges:
+                for j in range(j0, j1 + 1):
+                    members = self._cells.get((i, j))
+                    if members:
+                        slots.extend(members)
+        slots = np.fromiter(slots, dtype=np.intp, count=len(slots))
+        # Edge cells reach past the box; trim them to the exact bbox
+        mask = geo.bbox_mask(self._lat[slots], self._lon[slots], min_lat, min_lon, max_lat, max_lon)
+        return slots[mask]
+
+    def _lon_cell_ranges(self, min_lon: float, max_lon: float) -> list[tuple[int, int]]:
+        first, last = -self._lon_cells // 2, self._lon_cells // 2 - 1
+        if max_lon - min_lon >= 360:
+            return [(first, last)]
+        j0 = floor(geo.wrap_lon(min_lon) / self.cell_size)
+        j1 = floor(geo.wrap_lon(max_lon) / self.cell_size)
+        if floor((min_lon + 180) / 360) == floor((max_lon + 180) / 360):
+            return [(j0, j1)]
+        return [(j0, last), (first, j1)] # Crosses the antimeridian
+
+    def within_radius_slots(self, lat: float, lon: float, radius_km: float) -> tuple[np.ndarray, np.ndarray]:
+        """(slots, distances_km) of every sensor within radius_km, nearest first."""
+        slots = self.slots_in_bbox(*geo.radius_bbox(lat, lon, radius_km))
+        distances = geo.haversine_km(lat, lon, self._lat[slots], self._lon[slots])
+        inside = distances <= radius_km
+        slots, distances = slots[inside], distances[inside]
+        order = np.argsort(distances, kind="stable")
+        return slots[order], distances[order]
+
+    def nearest_slots(self, lat: float, lon: float, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """(slots, distances_km) of the k sensors nearest to (lat, lon), nearest first.
+
+        Scans rings of cells outward from the query cell and stops once the k-th best
+        distance is no larger than a lower bound on the distance to any unscanned cell.
+        If the rings would visit more cells than are occupied (sparse data), it switches
+        to one vectorized pass over all sensors instead.
+        """
+        count = len(self._ids)
+        if count == 0 or k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        if k >= count:
+            return geo.nearest_k(lat, lon, self._lat[:count], self._lon[:count], k)
+
+        lon = float(geo.wrap_lon(lon))
+        ci, cj = self._cell(lat, lon)
+        i_min, i_max = floor(-90 / self.cell_size), floor(90 / self.cell_size)
+        first, last = -self._lon_cells // 2, self._lon_cells // 2 - 1
+        phi = radians(lat)
+        slots: list[int] = []
+        cells_visited = 0
+        r = 0
+        while True:
+            for i, j in _ring_cells(ci, cj, r):
+                if not i_min <= i <= i_max:
+                    continue
+                j = (j - first) % self._lon_cells + first # Wrap across the antimeridian
+                members = self._cells.get((i, j))
+                if members:
+                    slots.extend(members)
+            cells_visited += 8 * r if r else 1
+            if cells_visited > max(64, len(self._cells) // 8): # Python cell walk now costs more than NumPy over everything
+                return geo.nearest_k(lat, lon, self._lat[:count], self._lon[:count], k)
+
+            lon_span_done = (2 * r + 1) >= self._lon_cells
+            if len(slots) >= k or lon_span_done:
+                unique_slots = np.unique(np.fromiter(slots, dtype=np.intp, count=len(slots)))
+                best, distances = geo.nearest_k(lat, lon, self._lat[unique_slots], self._lon[unique_slots], k)
+                if len(best) >= k:
+                    # Anything unscanned lies outside this ring's lat band or its lon band
+                    lat_gap = min(
+                        lat - (ci - r) * self.cell_size if ci - r > i_min else inf,
+                        (ci + r + 1) * self.cell_size - lat if ci + r < i_max else inf,
+                    )
+                    lon_gap = inf if lon_span_done else min(lon - (cj - r) * self.cell_size, (cj + r + 1) * self.cell_size - lon)
+                    bound_km = min(
+                        radians(lat_gap) * geo.EARTH_RADIUS_KM,
+                        asin(sin(radians(min(lon_gap, 90))) * cos(phi)) * geo.EARTH_RADIUS_KM if lon_gap != inf else inf,
+                    )
+                    if distances[-1] <= bound_km:
+                        return unique_slots[best], distances
+            r += 1
+
+    def nearest(self, lat: float, lon: float, k: int) -> list[tuple[str, float]]:
+        """(sensor_id, distance_km) for the k nearest sensors, nearest first."""
+        slots, distances = self.nearest_slots(lat, lon, k)
+        return [(self._ids[slot], float(distance)) for slot, distance in zip(slots.tolist(), distances.tolist())]
+
+    def within_radius(self, lat: float, lon: float, radius_km: float) -> list[tuple[str, float]]:
+        """(sensor_id, distance_km) for every sensor within radius_km, nearest first."""
+        slots, distances = self.within_radius_slots(lat, lon, radius_km)
+        return [(self._ids[slot], float(distance)) for slot, distance in zip(slots.tolist(), distances.tolist())]
+
+
+def _ring_cells(ci: int, cj: int, r: int):
+    """Cells on the square ring at Chebyshev distance r around (ci, cj)."""
+    if r == 0:
+        yield ci, cj
+        return
+    for j in range(cj - r, cj + r + 1):
+        yield ci - r, j
+        yield ci + r, j
+    for i in range(ci - r + 1, ci + r):
+        yield i, cj - r
+        yield i, cj + r
@@ -0,0 +1,217 @@
+# app/state_sync.py
+import asyncio
+import uuid
+from typing import Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from . import crud, schemas
+from .alert_engine import alert_engine
+from .alert_summary import alert_summary
+from .alert_worker import alert_worker
+from .database import SessionLocal, run_db
+from .polygon_registry import polygon_registry
+from .rise_detector import rise_detector
+from .risk import risk_engine
+from .sensor_cache import sensor_cache
+from .websocket_manager import manager
+
+
+def load_shared_state(db: Session, warm: bool = False):
+    """Loads sensor_cache, polygons, thresholds and alert counts from db. warm rebuilds the
+    cache (startup); otherwise the readings are merged in, so newer ones already applied win."""
+    readings = [schemas.SensorDataOut.model_validate(row) for row in crud.get_sensor_data_for_risk_map(db, limit=None)]
+    if warm:
+        sensor_cache.warm(readings)
+    else:
+        sensor_cache.update(readings)
+    polygon_registry.load([(p.name, p.coordinates) for p in crud.get_polygons(db)])
+    load_thresholds(db)
+    alert_summary.load(crud.get_open_alert_counts(db))
+
+def load_thresholds(db: Session):
+    risk_engine.load(
+        (t.scope, t.target, t.warning_level, t.critical_level) for t in crud.get_risk_thresholds(db)
+    )
+
+def load_alert_state(db: Session):
+    open_alerts = crud.get_open_sensor_alerts(db)
+    alert_engine.load(open_alerts)
+    rise_detector.load(open_alerts)
+    print(f"INFO: Alert engine loaded {alert_engine.open_alert_count()} open alerts.")
+
+
+class StateSync:
+    """Keeps the in-memory state of several workers in step over the broadcast backend's
+    "state" channel (see pubsub.py).
+
+    Every change is applied locally first, then relayed to the other workers:
+    - readings: applied to each worker's sensor_cache, and so to the polygon, cluster,
+      tile and heatmap caches fed by it;
+    - opened and resolved alerts: applied to each worker's alert_summary, and resolves to
+      alert_engine and rise_detector;
+    - thresholds and polygons: each worker reloads them from the database.
+
+    Alerts are evaluated by the owner worker only (picked by the backend; always this
+    process with the local backend), so alert_engine and rise_detector have a single
+    writer. The others only push readings into their rise_detector rings so that a new
+    owner starts with full windows; it reloads the open alerts before its first pass.
+    Whatever was relayed while a worker was cut off from the backend is lost, so on every
+    reconnect after the first it reloads the shared state from the database.
+
+    Relayed messages are applied in arrival order by one task. Nothing is relayed with
+    the local backend.
+    """
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex[:12] # Our own messages come back with the local delivery
+        self.owner = False
+        self.relayed_total = 0
+        self.applied_total = 0
+        self._connected_before = False
+        self._reload_alerts = False
+        self._inbox: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def relaying(self) -> bool:
+        return manager.backend is not None and manager.backend.relays
+
+    async def start(self):
+        """Starts applying relayed state (call on startup, before manager.start)."""
+        if self._task is not None:
+            return
+        self._inbox = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    # --- Local changes, called after their commit ---
+    async def readings_committed(self, readings: list[schemas.SensorDataOut]):
+        await self._apply_readings(readings)
+        await self._relay("readings", [r.model_dump() for r in readings])
+
+    async def alerts_changed(self, opened: Sequence[schemas.AlertOut] = (), resolved: Sequence[schemas.AlertOut] = ()):
+        alert_summary.alerts_opened(opened)
+        alert_summary.alerts_resolved(resolved)
+        if opened or resolved:
+            await self._relay("alerts", {
+                "opened": [a.model_dump(mode='json') for a in opened],
+                "resolved": [a.model_dump(mode='json') for a in resolved],
+            })
+
+    async def thresholds_changed(self):
+        await self._relay("thresholds", None)
+
+    async def polygon_changed(self, name: str):
+        await self._relay("polygon", name)
+
+    async def before_alert_pass(self):
+        """Reloads the open alerts if this worker has become the owner since the last pass
+        (run by the alert worker's handler, so it never overlaps a pass)."""
+        if self._reload_alerts:
+            self._reload_alerts = False
+            await run_db(self._with_session, load_alert_state)
+
+    # --- Backend listener (see pubsub.py) ---
+    def relay_connected(self):
+        if self._connected_before:
+            self._enqueue({"kind": "resync"})
+        self._connected_before = True
+
+    def ownership_changed(self, owner: bool):
+        print(f"INFO: This worker {'now evaluates' if owner else 'no longer evaluates'} alerts.")
+        self.owner = owner
+        if owner:
+            self._reload_alerts = True
+
+    def received(self, message: dict):
+        # Called by the manager for every "state" message, ours included
+        if message.get("origin") != self.origin:
+            self._enqueue(message)
+
+    # --- Internals ---
+    def _enqueue(self, message: dict):
+        if self._inbox is None:
+            print(f"WARNING: State sync not started, dropped a '{message.get('kind')}' update.")
+            return
+        self._inbox.put_nowait(message)
+
+    async def _relay(self, kind: str, data):
+        if not self.relaying:
+            return
+        try:
+            await manager.publish_state({"origin": self.origin, "kind": kind, "data": data})
+            self.relayed_total += 1
+        except Exception as e:
+            print(f"WARNING: Could not relay '{kind}' state update: {e}")
+
+    async def _apply_readings(self, readings: list[schemas.SensorDataOut]):
+        sensor_cache.update(readings)
+        if self.owner:
+            await alert_worker.submit(readings)
+        else:
+            rise_detector.observe(readings)
+
+    @staticmethod
+    def _with_session(load, *args):
+        db = SessionLocal()
+        try:
+            return load(db, *args)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _load_polygon(db: Session, name: str):
+        polygon = crud.get_polygon(db, name)
+        if polygon is None:
+            polygon_registry.remove(name)
+            risk_engine.region_removed(name)
+        else:
+            polygon_registry.put(name, polygon.coordinates)
+            risk_engine.region_changed(name)
+
+    async def _apply(self, message: dict):
+        kind, data = message["kind"], message.get("data")
+        if kind == "readings":
+            await self._apply_readings([schemas.SensorDataOut.model_validate(r) for r in data])
+        elif kind == "alerts":
+            opened = [schemas.AlertOut.model_validate(a) for a in data["opened"]]
+            resolved = [schemas.AlertOut.model_validate(a) for a in data["resolved"]]
+            alert_summary.alerts_opened(opened)
+            alert_summary.alerts_resolved(resolved)
+            for alert in resolved: # Resolved by hand on another worker, or by the previous owner
+                alert_engine.alert_resolved(alert.id, alert.sensor_id)
+                rise_detector.alert_resolved(alert.id, alert.sensor_id)
+        elif kind == "thresholds":
+            await run_db(self._with_session, load_thresholds)
+        elif kind == "polygon":
+            await run_db(self._with_session, self._load_polygon, data)
+        elif kind == "resync":
+            await run_db(self._with_session, load_shared_state)
+            print("INFO: Reloaded shared state after reconnecting to the other workers.")
+        else:
+            print(f"WARNING: Unknown state update '{kind}' ignored.")
+            return
+        self.applied_total += 1
+
+    async def _run(self):
+        while True:
+            message = await self._inbox.get()
+            try:
+                await self._apply(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"ERROR: Could not apply '{message.get('kind')}' state update: {e}")
+
+
+state_sync = StateSync() # Global instance, started in main.py
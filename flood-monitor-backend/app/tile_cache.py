@@ -0,0 +1,117 @@
+# app/tile_cache.py
+import os
+from collections import OrderedDict
+from math import atan, degrees, pi, sinh
+from typing import Optional
+
+import orjson
+
+from . import risk, schemas
+from .cluster_index import mercator_xy
+from .sensor_cache import SensorStateCache, sensor_cache
+
+TILE_CACHE_SIZE = int(os.getenv("TILE_CACHE_SIZE", 4096)) # Encoded tiles kept in memory
+TILE_MAX_ZOOM = int(os.getenv("TILE_MAX_ZOOM", 18))
+
+
+def tile_bounds(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) of a Web Mercator (slippy map) tile."""
+    n = 1 << z
+    min_lon = x / n * 360.0 - 180.0
+    max_lon = (x + 1) / n * 360.0 - 180.0
+    max_lat = degrees(atan(sinh(pi * (1 - 2 * y / n))))
+    min_lat = degrees(atan(sinh(pi * (1 - 2 * (y + 1) / n))))
+    return min_lat, min_lon, max_lat, max_lon
+
+def tile_for(lat: float, lon: float, z: int) -> tuple[int, int]:
+    n = 1 << z
+    x, y = mercator_xy(lat, lon)
+    return int(x * n), int(y * n)
+
+
+class RiskTileCache:
+    """LRU cache of encoded risk-layer tiles (/spatial/tiles/{z}/{x}/{y}).
+
+    A tile is built from the grid index on first request and kept as ready-to-send JSON
+    bytes. When a reading arrives only the tiles containing that sensor's old and new
+    position (one per zoom level) are evicted; every other cached tile stays valid.
+    """
+
+    def __init__(self, cache: SensorStateCache, max_tiles: int = TILE_CACHE_SIZE, max_zoom: int = TILE_MAX_ZOOM):
+        self._cache = cache
+        self.max_tiles = max_tiles
+        self.max_zoom = max_zoom
+        self._tiles: OrderedDict[tuple[int, int, int], bytes] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        cache.add_listener(self)
+        risk.risk_engine.add_listener(self)
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+    def get(self, z: int, x: int, y: int) -> bytes:
+        if z > self.max_zoom: # Too many possible tiles to be worth caching
+            return orjson.dumps([p.model_dump(mode='json') for p in self.build(z, x, y)])
+        key = (z, x, y)
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return tile
+        self.misses += 1
+        tile = orjson.dumps([p.model_dump(mode='json') for p in self.build(z, x, y)])
+        self._tiles[key] = tile
+        if len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+        return tile
+
+    def build(self, z: int, x: int, y: int) -> list[schemas.RiskPoint]:
+        min_lat, min_lon, max_lat, max_lon = tile_bounds(z, x, y)
+        ids, _, _ = self._cache.index.arrays()
+        readings = []
+        for slot in self._cache.index.slots_in_bbox(min_lat, min_lon, max_lat, max_lon).tolist():
+            reading = self._cache.get(ids[slot])
+            # Sensors exactly on a shared edge belong to one tile only
+            if tile_for(reading.latitude, reading.longitude, z) == (x, y):
+                readings.append(reading)
+        return [
+            schemas.RiskPoint(
+                latitude=reading.latitude,
+                longitude=reading.longitude,
+                water_level=reading.water_level,
+                risk_level=risk.RISK_LEVELS[risk_idx],
+                sensor_id=reading.sensor_id,
+                last_updated=reading.timestamp,
+            )
+            for reading, risk_idx in zip(readings, risk.risk_engine.classify_readings(readings).tolist())
+        ]
+
+    def clear(self):
+        self._tiles.clear()
+
+    def stats(self) -> dict:
+        return {"tiles": len(self._tiles), "hits": self.hits, "misses": self.misses, "invalidations": self.invalidations}
+
+    def _invalidate_point(self, lat: float, lon: float):
+        for z in range(self.max_zoom + 1):
+            x, y = tile_for(lat, lon, z)
+            if self._tiles.pop((z, x, y), None) is not None:
+                self.invalidations += 1
+
+    # --- SensorStateCache listener ---
+    def sensor_updated(self, old: Optional[schemas.SensorDataOut], new: schemas.SensorDataOut):
+        if old is not None and (old.latitude, old.longitude) != (new.latitude, new.longitude):
+            self._invalidate_point(old.latitude, old.longitude)
+        self._invalidate_point(new.latitude, new.longitude)
+
+    def sensors_reset(self):
+        self.clear()
+
+    # --- RiskEngine listener ---
+    def thresholds_changed(self):
+        self.clear()
+
+
+tile_cache = RiskTileCache(sensor_cache) # Global tile cache, invalidated by sensor_cache updates
@@ -1,50 +1,338 @@
-from typing import List, Any
+import asyncio
+import os
+from math import floor
+from typing import Any, Dict, Optional
 from fastapi import WebSocket
-import json # Keep for potential direct string sending if ever needed.
+from pydantic import ValidationError
+import orjson
+
+from . import pubsub, schemas
+from .sensor_cache import sensor_cache
+
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", 256)) # Frames buffered per client before it is dropped
+WS_SLOW_CLIENT_CLOSE_CODE = 1013 # "Try again later": the frontend reconnects and refetches state
+WS_BBOX_CELL_DEG = float(os.getenv("WS_BBOX_CELL_DEG", 1.0)) # Cell size of the viewport subscription index
+WS_BBOX_MAX_CELLS = int(os.getenv("WS_BBOX_MAX_CELLS", 4096)) # Larger viewports are checked on every item instead
+
+
+def encode_frame(message: Any) -> str:
+    # orjson handles datetimes itself; text frames because the frontend JSON.parses event.data
+    return orjson.dumps(message).decode()
+
+
+class ClientConnection:
+    """One socket with its own bounded outbound queue, drained by a writer task, so a
+    slow client only ever delays itself."""
+
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.subscription: Optional[schemas.GeneralSubscription] = None # None: everything
+
+    def wants_location(self, lat: float, lon: float) -> bool:
+        min_lat, min_lon, max_lat, max_lon = self.subscription.bbox
+        if not min_lat <= lat <= max_lat:
+            return False
+        if min_lon <= max_lon:
+            return min_lon <= lon <= max_lon
+        return lon >= min_lon or lon <= max_lon # Viewport crossing the antimeridian
+
+
+class SubscriptionIndex:
+    """Which /ws/general clients want which messages.
+
+    Clients are indexed by message type, by sensor ID and, for viewports, by the cells
+    of a coarse lat/lon grid their bbox overlaps, so routing an item only looks at the
+    clients that could want it. Clients without a sensor/bbox filter take every item of
+    the types they subscribed to.
+    """
+
+    def __init__(self, cell_size_deg: float = WS_BBOX_CELL_DEG, max_cells: int = WS_BBOX_MAX_CELLS):
+        self.cell_size = cell_size_deg
+        self.max_cells = max_cells
+        self._any_type: set[ClientConnection] = set()
+        self._by_type: dict[str, set[ClientConnection]] = {}
+        self._unfiltered: set[ClientConnection] = set() # No sensor/bbox filter
+        self._by_sensor: dict[str, set[ClientConnection]] = {}
+        self._by_cell: dict[tuple[int, int], set[ClientConnection]] = {}
+        self._wide: set[ClientConnection] = set() # Viewports spanning more than max_cells
+
+    def _cell(self, lat: float, lon: float) -> tuple[int, int]:
+        return floor(lat / self.cell_size), floor(lon / self.cell_size)
+
+    def _keys(self, client: ClientConnection):
+        # (index, key) pairs the client is filed under
+        sub = client.subscription
+        if sub is None or sub.types is None:
+            yield self._any_type, None
+        else:
+            yield from ((self._by_type, t) for t in sub.types)
+        if sub is None or (sub.sensor_ids is None and sub.bbox is None):
+            yield self._unfiltered, None
+            return
+        yield from ((self._by_sensor, sensor_id) for sensor_id in sub.sensor_ids or ())
+        if sub.bbox is not None:
+            (i0, j0), (i1, j1) = self._cell(*sub.bbox[:2]), self._cell(*sub.bbox[2:])
+            if sub.bbox[1] <= sub.bbox[3]:
+                j_ranges = [(j0, j1)]
+            else: # Crossing the antimeridian: from min_lon up to 180 and from -180 up to max_lon
+                j_ranges = [(j0, self._cell(0.0, 180.0)[1]), (self._cell(0.0, -180.0)[1], j1)]
+            if (i1 - i0 + 1) * sum(b - a + 1 for a, b in j_ranges) > self.max_cells:
+                yield self._wide, None
+            else:
+                yield from ((self._by_cell, (i, j)) for i in range(i0, i1 + 1) for a, b in j_ranges for j in range(a, b + 1))
+
+    def add(self, client: ClientConnection):
+        for index, key in self._keys(client):
+            if key is None:
+                index.add(client)
+            else:
+                index.setdefault(key, set()).add(client)
+
+    def remove(self, client: ClientConnection):
+        for index, key in self._keys(client):
+            if key is None:
+                index.discard(client)
+            else:
+                clients = index.get(key)
+                if clients is not None:
+                    clients.discard(client)
+                    if not clients:
+                        del index[key]
+
+    def for_type(self, frame_type: Optional[str]) -> set[ClientConnection]:
+        return self._any_type | self._by_type.get(frame_type, set())
+
+    def unfiltered(self) -> set[ClientConnection]:
+        return self._unfiltered
+
+    def for_item(self, sensor_id: str, location: Optional[tuple[float, float]]) -> set[ClientConnection]:
+        """Filtered clients that want an item of this sensor (type not checked)."""
+        clients = set(self._by_sensor.get(sensor_id, ()))
+        if location is not None:
+            for client in self._by_cell.get(self._cell(*location), ()):
+                if client.wants_location(*location):
+                    clients.add(client)
+            for client in self._wide:
+                if client.wants_location(*location):
+                    clients.add(client)
+        return clients
+
+
+def _item_location(item: dict) -> Optional[tuple[float, float]]:
+    # Readings carry their position; alerts are placed at their sensor's last known one
+    # (state_sync relays readings, so every worker's sensor_cache has them all)
+    if item.get("latitude") is not None and item.get("longitude") is not None:
+        return item["latitude"], item["longitude"]
+    reading = sensor_cache.get(item["sensor_id"])
+    return (reading.latitude, reading.longitude) if reading is not None else None
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.chat_connections: List[WebSocket] = [] # For chat specific broadcasts
+    """Fans broadcasts out to WebSocket clients.
+
+    Broadcasting encodes the message to JSON once and enqueues that frame on every
+    interested client's queue; it never waits on a socket. A client whose queue
+    overflows is too far behind to catch up and is closed; a client whose send fails
+    is removed.
+
+    General clients may narrow what they receive by sending
+    {"action": "subscribe", "types": [...], "sensor_ids": [...], "bbox": [min_lat, min_lon, max_lat, max_lon]}
+    (every field optional) or {"action": "unsubscribe"} to receive everything again. An
+    item of a message whose data is a sensor reading or alert (or a list of them) is
+    routed to clients watching its sensor ID or whose bbox contains it; list messages
+    are cut down to the items each client wants. Items without a sensor go to everyone
+    subscribed to the type.
+
+    Broadcasts go through a pub/sub backend (see pubsub.py, chosen by BROADCAST_BACKEND)
+    so that with several workers every process fans them out to its own clients. Until
+    start() is called they are delivered in this process only. The "state" channel
+    carries state_sync's updates between workers rather than client frames.
+    """
+
+    def __init__(self, queue_size: int = WS_SEND_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.active_connections: Dict[WebSocket, ClientConnection] = {}
+        self.chat_connections: Dict[WebSocket, ClientConnection] = {} # For chat specific broadcasts
+        self.subscriptions = SubscriptionIndex() # Over active_connections
+        self.dropped_clients = 0
+        self._closing: set[asyncio.Task] = set() # Strong refs so close tasks are not collected early
+        self.backend = None
+        self.state_sync = None
+
+    async def start(self, backend=None, state_sync=None):
+        """Connects to the broadcast backend (call on startup). state_sync receives the
+        "state" channel and the backend's connection and ownership changes."""
+        backend = backend or pubsub.create_broadcast_backend()
+        self.state_sync = state_sync
+        await backend.start(self._deliver, state_sync)
+        self.backend = backend
+
+    async def stop(self):
+        if self.backend is not None:
+            backend, self.backend = self.backend, None
+            await backend.stop()
+
+    def _deliver(self, channel: str, message: Any):
+        # Called by the backend for messages published by any worker, this one included
+        if channel == "chat":
+            self._enqueue(message, "chat")
+        elif channel == "state":
+            if self.state_sync is not None:
+                self.state_sync.received(message)
+        else:
+            self._route_general(message)
+
+    async def _publish(self, channel: str, message: Any):
+        if self.backend is None:
+            self._deliver(channel, message)
+        else:
+            await self.backend.publish(channel, message)
+
+    def _connections(self, connection_type: str) -> Dict[WebSocket, ClientConnection]:
+        return self.chat_connections if connection_type == "chat" else self.active_connections
 
     async def connect(self, websocket: WebSocket, connection_type: str = "general"):
         await websocket.accept()
-        if connection_type == "chat":
-            self.chat_connections.append(websocket)
-        else:
-            self.active_connections.append(websocket)
+        client = ClientConnection(websocket, self.queue_size)
+        client.writer = asyncio.create_task(self._write(client, connection_type))
+        self._connections(connection_type)[websocket] = client
+        if connection_type != "chat":
+            self.subscriptions.add(client)
 
     def disconnect(self, websocket: WebSocket, connection_type: str = "general"):
-        if connection_type == "chat":
-            if websocket in self.chat_connections:
-                self.chat_connections.remove(websocket)
+        client = self._connections(connection_type).pop(websocket, None)
+        if client is None:
+            return
+        if connection_type != "chat":
+            self.subscriptions.remove(client)
+        if client.writer is not asyncio.current_task():
+            client.writer.cancel()
+
+    async def handle_general_message(self, websocket: WebSocket, text: str):
+        """Applies a subscribe/unsubscribe request sent by a general client and acknowledges it."""
+        client = self.active_connections.get(websocket)
+        if client is None:
+            return
+        try:
+            request = orjson.loads(text)
+            action = request.get("action") if isinstance(request, dict) else None
+            if action == "subscribe":
+                subscription = schemas.GeneralSubscription.model_validate(request)
+            elif action == "unsubscribe":
+                subscription = None
+            else:
+                raise ValueError("Expected action 'subscribe' or 'unsubscribe'")
+        except (orjson.JSONDecodeError, ValidationError, ValueError) as e:
+            self._send(client, encode_frame({"type": "subscription_error", "data": {"detail": str(e)}}), "general")
+            return
+        self.subscriptions.remove(client)
+        client.subscription = subscription
+        self.subscriptions.add(client)
+        data = subscription.model_dump() if subscription is not None else None
+        self._send(client, encode_frame({"type": "subscribed", "data": data}), "general")
+
+    async def _write(self, client: ClientConnection, connection_type: str):
+        try:
+            while True:
+                frame = await client.queue.get()
+                await client.websocket.send_text(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error sending to {connection_type} connection {client.websocket.client}: {e}")
+            self.disconnect(client.websocket, connection_type)
+
+    def _drop_slow_client(self, client: ClientConnection, connection_type: str):
+        self.disconnect(client.websocket, connection_type)
+        self.dropped_clients += 1
+        print(f"WARNING: Dropping slow {connection_type} connection {client.websocket.client} "
+              f"({self.queue_size} frames behind).")
+        task = asyncio.create_task(self._close(client.websocket))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await websocket.close(code=WS_SLOW_CLIENT_CLOSE_CODE)
+        except Exception:
+            pass # Already gone
+
+    def _send(self, client: ClientConnection, frame: str, connection_type: str):
+        try:
+            client.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self._drop_slow_client(client, connection_type)
+
+    def _enqueue(self, message: Any, connection_type: str):
+        connections = self._connections(connection_type)
+        if not connections:
+            return
+        frame = encode_frame(message) # Once per broadcast, shared by every client
+        for client in list(connections.values()):
+            self._send(client, frame, connection_type)
+
+    def _route_general(self, message: dict):
+        clients = self.subscriptions.for_type(message.get("type"))
+        if not clients:
+            return
+        data = message.get("data")
+        items = data if isinstance(data, list) else [data]
+        if not any(isinstance(item, dict) and "sensor_id" in item for item in items):
+            full = clients # Not about particular sensors: the type decides
         else:
-            if websocket in self.active_connections:
-                self.active_connections.remove(websocket)
+            full = clients & self.subscriptions.unfiltered()
+            # Filtered clients get the indices of the items they want
+            wanted: dict[ClientConnection, list[int]] = {}
+            for k, item in enumerate(items):
+                if isinstance(item, dict) and item.get("sensor_id") is not None:
+                    recipients = self.subscriptions.for_item(item["sensor_id"], _item_location(item))
+                    recipients &= clients
+                else:
+                    recipients = clients - full
+                for client in recipients:
+                    wanted.setdefault(client, []).append(k)
+            # One frame per distinct selection, however many clients share it
+            frames: dict[tuple[int, ...], str] = {}
+            for client, indices in wanted.items():
+                if len(indices) == len(items):
+                    full = full | {client}
+                    continue
+                key = tuple(indices)
+                if key not in frames:
+                    frames[key] = encode_frame({**message, "data": [items[k] for k in indices]})
+                self._send(client, frames[key], "general")
+        if full:
+            frame = encode_frame(message)
+            for client in full:
+                self._send(client, frame, "general")
+
+    def stats(self) -> dict:
+        return {
+            "general_connections": len(self.active_connections),
+            "chat_connections": len(self.chat_connections),
+            "queued_frames": sum(c.queue.qsize() for c in self.active_connections.values())
+                             + sum(c.queue.qsize() for c in self.chat_connections.values()),
+            "dropped_clients": self.dropped_clients,
+        }
 
     async def broadcast_general(self, message: dict):
-        """Broadcasts to general WebSocket connections (e.g., sensors, alerts)."""
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                print(f"Error broadcasting to general connection: {e}")
-                # Optionally remove problematic connection: self.disconnect(connection, "general")
+        """Broadcasts to general WebSocket connections (e.g., sensors, alerts) that subscribed to it."""
+        await self._publish("general", message)
 
     async def broadcast_chat(self, message: dict):
         """Broadcasts to chat-specific WebSocket connections."""
-        for connection in self.chat_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                print(f"Error broadcasting to chat connection: {e}")
-                # Optionally remove problematic connection: self.disconnect(connection, "chat")
+        await self._publish("chat", message)
+
+    async def publish_state(self, message: dict):
+        """Relays a state_sync update to the other workers."""
+        await self._publish("state", message)
 
     # If you want a single broadcast method that handles types internally:
     # async def broadcast(self, message: dict, target_type: str = "general"):
-    #     connections_to_use = self.chat_connections if target_type == "chat" else self.active_connections
-    #     for connection in connections_to_use:
-    #         await connection.send_json(message)
+    #     self._enqueue(message, target_type)
 
 manager = ConnectionManager() # Global manager instance
 '''
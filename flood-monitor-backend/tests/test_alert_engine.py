@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+from itertools import count
+
+import pytest
+
+from app import alert_engine as alert_engine_module
+from app import crud, models, schemas
+from app.alert_engine import ALERT_CLEAR_MARGIN_M, ALERT_CLEAR_READINGS, AlertEngine
+from app.risk import risk_engine
+
+WARNING, CRITICAL = risk_engine.default
+BASE_TIME = datetime(2026, 1, 1)
+_reading_ids = count(1)
+
+
+def reading(water_level, sensor_id="s1"):
+    n = next(_reading_ids)
+    return schemas.SensorDataOut(
+        id=n, sensor_id=sensor_id, latitude=13.0, longitude=80.0, water_level=water_level,
+        rainfall=0.0, timestamp=BASE_TIME + timedelta(minutes=n),
+    )
+
+
+def open_alerts(db):
+    return db.query(models.Alert).filter(models.Alert.is_resolved == False).all()
+
+
+@pytest.fixture
+def engine():
+    return AlertEngine()
+
+
+def test_escalates_and_resolves_lower_level(engine, db):
+    events = engine.process(db, [reading(WARNING + 0.5)])
+    assert [a.level for a in events.new] == ["warning"]
+    warning_id = events.new[0].id
+
+    events = engine.process(db, [reading(CRITICAL + 0.5)])
+    assert [a.level for a in events.new] == ["critical"]
+    assert [a.id for a in events.resolved] == [warning_id]
+    assert [a.level for a in open_alerts(db)] == ["critical"]
+
+
+def test_clear_needs_margin_and_consecutive_readings(engine, db):
+    engine.process(db, [reading(WARNING + 0.5)])
+
+    # Just under the threshold but inside the margin: holds the alert
+    events = engine.process(db, [reading(WARNING - ALERT_CLEAR_MARGIN_M / 2) for _ in range(ALERT_CLEAR_READINGS + 1)])
+    assert not events.resolved
+
+    # Clearly below, one reading short of the debounce
+    below = WARNING - ALERT_CLEAR_MARGIN_M - 0.5
+    events = engine.process(db, [reading(below) for _ in range(ALERT_CLEAR_READINGS - 1)])
+    assert not events.resolved and len(open_alerts(db)) == 1
+
+    events = engine.process(db, [reading(below)])
+    assert [a.level for a in events.resolved] == ["warning"]
+    assert not open_alerts(db)
+    assert engine.open_alert_count() == 0
+
+
+def test_manual_resolve_stays_quiet_until_level_changes(engine, db):
+    warning_id = engine.process(db, [reading(WARNING + 0.5)]).new[0].id
+    crud.resolve_open_alert_db(db, warning_id)
+    engine.alert_resolved(warning_id, "s1")
+
+    events = engine.process(db, [reading(WARNING + 0.8), reading(WARNING + 1.0)])
+    assert not events.new and not events.updated and not events.resolved
+
+    events = engine.process(db, [reading(CRITICAL + 0.5)])
+    assert [a.level for a in events.new] == ["critical"]
+    assert not events.resolved # The hand-resolved warning is not resolved again
+
+
+def test_open_then_resolve_within_one_batch(engine, db):
+    events = engine.process(db, [reading(WARNING + 0.5), reading(CRITICAL + 0.5)])
+    assert sorted(a.level for a in events.new) == ["critical", "warning"]
+    warning_id = next(a.id for a in events.new if a.level == "warning")
+    # The placeholder id of the warning was mapped to its real id before resolving it
+    assert [a.id for a in events.resolved] == [warning_id]
+    assert [a.level for a in open_alerts(db)] == ["critical"]
+    assert engine.open_alert_count() == 1
+
+
+def test_manual_resolve_during_pass_is_kept(engine, db, monkeypatch):
+    warning_id = engine.process(db, [reading(WARNING + 0.5)]).new[0].id
+    update_descriptions = crud.update_alert_descriptions
+
+    def resolve_by_hand_meanwhile(session, descriptions):
+        engine.alert_resolved(warning_id, "s1") # Runs while the pass is writing, lock not held
+        return update_descriptions(session, descriptions)
+
+    monkeypatch.setattr(alert_engine_module.crud, "update_alert_descriptions", resolve_by_hand_meanwhile)
+    events = engine.process(db, [reading(WARNING + 1.0)])
+    assert [a.id for a in events.updated] == [warning_id]
+    assert engine.open_alert_count() == 0
+
+
+def test_failed_write_leaves_state_untouched(engine, db, monkeypatch):
+    def fail(session, alerts):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(alert_engine_module.crud, "create_alerts_db_batch", fail)
+    with pytest.raises(RuntimeError):
+        engine.process(db, [reading(WARNING + 0.5)])
+    monkeypatch.undo()
+
+    events = engine.process(db, [reading(WARNING + 0.5)])
+    assert [a.level for a in events.new] == ["warning"]
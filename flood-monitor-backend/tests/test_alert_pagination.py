@@ -0,0 +1,34 @@
+from app import crud, schemas
+from app.routers.alert_router import decode_alert_cursor, encode_alert_cursor
+
+
+def create_alerts(db, n):
+    # One batch: the timestamps come from server_default and mostly share a second
+    crud.create_alerts_db_batch(db, [
+        schemas.AlertCreate(title=f"a{i}", description="", level="warning" if i % 2 else "critical", sensor_id=f"s{i % 3}")
+        for i in range(n)
+    ])
+    db.commit()
+
+
+def walk(db, limit, **filters):
+    pages, before = [], None
+    for _ in range(20): # Bounded: a cursor that does not advance would loop forever
+        page = crud.get_alerts_db(db, limit=limit, before=before, **filters)
+        if not page:
+            return pages
+        pages.append([a.id for a in page])
+        before = decode_alert_cursor(encode_alert_cursor(page[-1]))
+    return pages
+
+
+def test_cursor_pages_do_not_repeat_rows(db):
+    create_alerts(db, 9)
+    pages = walk(db, limit=2)
+    assert pages == [[9, 8], [7, 6], [5, 4], [3, 2], [1]]
+
+
+def test_cursor_pages_with_filter(db):
+    create_alerts(db, 9)
+    pages = walk(db, limit=2, level="warning")
+    assert [i for page in pages for i in page] == [8, 6, 4, 2]
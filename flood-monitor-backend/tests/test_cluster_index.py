@@ -0,0 +1,36 @@
+from datetime import datetime
+
+import pytest
+
+from app import schemas
+from app.cluster_index import ClusterIndex
+from app.sensor_cache import SensorStateCache
+
+
+def reading(sensor_id, latitude, longitude, water_level=1.0):
+    return schemas.SensorDataOut(
+        id=hash(sensor_id) & 0xFFFF, sensor_id=sensor_id, latitude=latitude, longitude=longitude,
+        water_level=water_level, rainfall=0.0, timestamp=datetime(2026, 1, 1),
+    )
+
+
+def test_centroid_of_cluster_across_antimeridian():
+    cache = SensorStateCache()
+    index = ClusterIndex(cache, max_zoom=2, cell_shift=0) # Zoom 0 is a single world-sized cell
+    cache.warm([reading("east", 10.0, 179.0), reading("west", 10.0, -179.0)])
+
+    [cluster] = index.query(0, -80.0, -180.0, 80.0, 180.0)
+    assert cluster.count == 2
+    assert abs(cluster.longitude) == pytest.approx(180.0)
+    assert cluster.latitude == pytest.approx(10.0)
+
+
+def test_moved_sensor_leaves_its_old_cell():
+    cache = SensorStateCache()
+    index = ClusterIndex(cache, max_zoom=4)
+    cache.warm([reading("s1", 10.0, 20.0)])
+    cache.update([reading("s1", -10.0, -20.0)])
+
+    [cluster] = index.query(4, -80.0, -180.0, 80.0, 180.0)
+    assert (cluster.count, cluster.sensor_id) == (1, "s1")
+    assert cluster.longitude == pytest.approx(-20.0)
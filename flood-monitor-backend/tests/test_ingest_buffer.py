@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+from app import schemas
+from app.ingest_buffer import IngestBuffer
+
+
+def item(i):
+    return schemas.SensorDataCreate(sensor_id=f"s{i}", latitude=13.0, longitude=80.0, water_level=1.0, rainfall=0.0)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_flushes_when_batch_is_full():
+    async def scenario():
+        batches = []
+
+        async def handler(batch):
+            batches.append([i.sensor_id for i in batch])
+
+        buffer = IngestBuffer(max_batch_size=3, max_delay_ms=10_000, capacity=10)
+        await buffer.start(handler)
+        for i in range(3):
+            assert buffer.submit(item(i))
+        await asyncio.sleep(0.05) # Far below max_delay: only the size trigger can fire
+        assert batches == [["s0", "s1", "s2"]]
+        await buffer.stop()
+
+    run(scenario())
+
+
+def test_flushes_partial_batch_after_max_delay():
+    async def scenario():
+        batches = []
+
+        async def handler(batch):
+            batches.append(len(batch))
+
+        buffer = IngestBuffer(max_batch_size=100, max_delay_ms=20, capacity=10)
+        await buffer.start(handler)
+        buffer.submit(item(0))
+        buffer.submit(item(1))
+        await asyncio.sleep(0.1)
+        assert batches == [2]
+        assert buffer.stats()["flushed_total"] == 2
+        await buffer.stop()
+
+    run(scenario())
+
+
+def test_rejects_when_full():
+    async def scenario():
+        release = asyncio.Event()
+
+        async def handler(batch):
+            await release.wait()
+
+        buffer = IngestBuffer(max_batch_size=1, max_delay_ms=0, capacity=2)
+        await buffer.start(handler)
+        assert buffer.submit(item(0))
+        await asyncio.sleep(0.01) # The flusher takes it and blocks in the handler
+        assert buffer.submit(item(1)) and buffer.submit(item(2))
+        assert not buffer.submit(item(3))
+        assert buffer.stats()["rejected_total"] == 1
+        release.set()
+        await buffer.stop()
+        assert buffer.stats()["flushed_total"] == 3
+
+    run(scenario())
+
+
+def test_failed_flush_is_retried():
+    async def scenario():
+        calls = []
+
+        async def handler(batch):
+            calls.append(len(batch))
+            if len(calls) < 3:
+                raise RuntimeError("database unavailable")
+
+        buffer = IngestBuffer(max_batch_size=2, max_delay_ms=10, capacity=10, flush_attempts=5, retry_backoff_ms=1)
+        await buffer.start(handler)
+        buffer.submit(item(0))
+        buffer.submit(item(1))
+        await asyncio.sleep(0.1)
+        await buffer.stop()
+        assert calls == [2, 2, 2]
+        stats = buffer.stats()
+        assert (stats["flushed_total"], stats["failed_total"], stats["retried_total"]) == (2, 0, 2)
+
+    run(scenario())
+
+
+def test_batch_failing_every_attempt_is_dead_lettered(tmp_path):
+    dead_letter = tmp_path / "dead.jsonl"
+
+    async def scenario():
+        async def handler(batch):
+            raise RuntimeError("database unavailable")
+
+        buffer = IngestBuffer(max_batch_size=2, max_delay_ms=10, capacity=10, flush_attempts=3,
+                              retry_backoff_ms=1, dead_letter_path=str(dead_letter))
+        await buffer.start(handler)
+        buffer.submit(item(0))
+        buffer.submit(item(1))
+        await asyncio.sleep(0.1)
+        await buffer.stop()
+        return buffer.stats()
+
+    stats = run(scenario())
+    assert (stats["failed_total"], stats["retried_total"]) == (2, 2)
+    assert [json.loads(line)["sensor_id"] for line in dead_letter.read_text().splitlines()] == ["s0", "s1"]
@@ -0,0 +1,103 @@
+import asyncio
+
+import orjson
+import pytest
+
+from app import pubsub
+from app.pubsub import PG_NOTIFY_MAX_BYTES, PostgresBroadcast, UnixSocketBroadcast
+
+
+class Listener:
+    def __init__(self):
+        self.connections = 0
+        self.ownership = []
+
+    def relay_connected(self):
+        self.connections += 1
+
+    def ownership_changed(self, owner):
+        self.ownership.append(owner)
+
+
+async def wait_until(condition, timeout=5.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("Timed out")
+
+
+def test_unix_broker_relays_between_workers_and_fails_over(tmp_path, monkeypatch):
+    monkeypatch.setattr(pubsub, "BROADCAST_RECONNECT_S", 0.01)
+    path = str(tmp_path / "broadcast.sock")
+
+    async def scenario():
+        first, second = UnixSocketBroadcast(path), UnixSocketBroadcast(path)
+        first_got, second_got = [], []
+        first_listener, second_listener = Listener(), Listener()
+        await first.start(lambda channel, message: first_got.append((channel, message)), first_listener)
+        await wait_until(lambda: first_listener.connections == 1)
+        await second.start(lambda channel, message: second_got.append((channel, message)), second_listener)
+        await wait_until(lambda: second_listener.connections == 1)
+        assert (first_listener.ownership, second_listener.ownership) == ([True], []) # The broker owns
+
+        await first.publish("general", {"n": 1})
+        await wait_until(lambda: len(second_got) == 1)
+        await second.publish("state", {"n": 2})
+        await wait_until(lambda: len(first_got) == 2)
+        assert first_got == second_got == [("general", {"n": 1}), ("state", {"n": 2})] # Local, then relayed
+
+        await first.stop() # The second worker takes the broker over
+        await wait_until(lambda: second_listener.ownership == [True] and second_listener.connections == 2)
+        third_got = []
+        third = UnixSocketBroadcast(path)
+        await third.start(lambda channel, message: third_got.append((channel, message)), Listener())
+        await wait_until(lambda: third._writer is not None)
+        await second.publish("chat", {"n": 3})
+        await wait_until(lambda: len(third_got) == 1)
+        assert third_got == [("chat", {"n": 3})]
+        await third.stop()
+        await second.stop()
+
+    asyncio.run(scenario())
+
+
+def notify_payloads(sender, message, message_id="1"):
+    return sender._chunks(message_id, orjson.dumps({"channel": "general", "message": message}).decode())
+
+
+def test_notify_chunks_stay_under_the_limit_and_reassemble():
+    sender, receiver = PostgresBroadcast(), PostgresBroadcast()
+    got = []
+    receiver._deliver = lambda channel, message: got.append((channel, message))
+    message = {"text": "水位" * 6000 + "x" * 9000} # Multibyte characters take up to 3 bytes each
+
+    chunks = notify_payloads(sender, message)
+    assert len(chunks) > 2
+    assert all(len(chunk.encode()) < PG_NOTIFY_MAX_BYTES for chunk in chunks)
+    for chunk in chunks:
+        receiver._receive(chunk)
+    assert got == [("general", message)]
+
+
+def test_notify_chunks_interleave_by_origin_and_skip_partial_messages():
+    first, second, receiver = PostgresBroadcast(), PostgresBroadcast(), PostgresBroadcast()
+    got = []
+    receiver._deliver = lambda channel, message: got.append(message)
+    first_chunks = notify_payloads(first, {"text": "a" * 20000})
+    second_chunks = notify_payloads(second, {"text": "b" * 20000})
+
+    for chunk in first_chunks[1:]: # Joined after the message started
+        receiver._receive(chunk)
+    for own in notify_payloads(receiver, {"text": "own"}):
+        receiver._receive(own) # Echo of our own NOTIFY: delivered locally already
+    assert got == []
+    for first_chunk, second_chunk in zip(first_chunks, second_chunks):
+        receiver._receive(first_chunk)
+        receiver._receive(second_chunk)
+    assert got == [{"text": "a" * 20000}, {"text": "b" * 20000}]
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        pubsub.create_broadcast_backend("redis")
@@ -0,0 +1,96 @@
+import asyncio
+from datetime import datetime, timedelta
+from itertools import count
+
+import pytest
+
+from app import models, schemas
+from app.alert_summary import alert_summary
+from app.rise_detector import RISE_ALERT_LEVEL, ReadingRing, RiseDetector
+from app.routers import sensor_router
+
+BASE_TIME = datetime(2026, 1, 1)
+_reading_ids = count(1)
+
+
+def reading(minute, water_level, sensor_id="s1"):
+    return schemas.SensorDataOut(
+        id=next(_reading_ids), sensor_id=sensor_id, latitude=13.0, longitude=80.0, water_level=water_level,
+        rainfall=0.0, timestamp=BASE_TIME + timedelta(minutes=minute),
+    )
+
+
+def rise_alerts(db, resolved=False):
+    return db.query(models.Alert).filter(
+        models.Alert.level == RISE_ALERT_LEVEL, models.Alert.is_resolved == resolved
+    ).order_by(models.Alert.id).all()
+
+
+def test_ring_measures_rise_over_the_window_only():
+    ring = ReadingRing(capacity=4, max_capacity=64)
+    assert ring.push(0, 1.0, 600) == (0.0, 0.0)
+    assert ring.push(300, 2.0, 600) == (1.0, 300.0)
+    assert ring.push(700, 2.5, 600) == (0.5, 400.0) # The 1.0 at t=0 left the window
+    assert ring.push(1400, 2.5, 600) == (0.0, 0.0)
+
+
+def test_ring_grows_to_keep_the_whole_window():
+    ring = ReadingRing(capacity=4, max_capacity=256)
+    for i in range(61): # Every 10 s for 10 minutes
+        rise, span = ring.push(i * 10.0, 1.0 + i * 0.01, 600)
+    assert len(ring.times) >= 61
+    assert (round(rise, 6), span) == (0.6, 600.0)
+
+
+def test_alerts_only_above_the_rate_threshold(db):
+    detector = RiseDetector(delta_m=0.5, window_min=10, cooldown_min=20)
+    events = detector.process(db, [reading(0, 1.0), reading(5, 1.4), reading(0, 1.0, "s2"), reading(5, 1.6, "s2")])
+    assert [a.sensor_id for a in events.new] == ["s2"]
+    assert [a.sensor_id for a in rise_alerts(db)] == ["s2"]
+
+
+def test_open_alert_is_not_duplicated_and_resolves_after_cooldown(db):
+    detector = RiseDetector(delta_m=0.5, window_min=10, cooldown_min=20)
+    first = detector.process(db, [reading(0, 1.0), reading(5, 1.6)]).new[0]
+
+    events = detector.process(db, [reading(10, 2.2)]) # Still rising while the alert is open
+    assert not events.new and not events.resolved
+    events = detector.process(db, [reading(22, 2.25)]) # Steady, but inside the cooldown
+    assert not events.resolved
+
+    events = detector.process(db, [reading(25, 2.3)])
+    assert [a.id for a in events.resolved] == [first.id]
+
+    events = detector.process(db, [reading(30, 3.0)]) # A new rise opens a new alert
+    assert len(events.new) == 1 and events.new[0].id != first.id
+    assert len(rise_alerts(db)) == 1 and len(rise_alerts(db, resolved=True)) == 1
+
+
+def test_open_alerts_loaded_at_startup_are_deduplicated(db):
+    detector = RiseDetector(delta_m=0.5, window_min=10, cooldown_min=20)
+    detector.process(db, [reading(0, 1.0), reading(5, 1.6)])
+
+    restarted = RiseDetector(delta_m=0.5, window_min=10, cooldown_min=20)
+    restarted.load(rise_alerts(db))
+    events = restarted.process(db, [reading(30, 1.0), reading(35, 1.7)])
+    assert not events.new
+
+
+def test_threshold_alerts_published_when_rise_pass_fails(db, monkeypatch):
+    published = []
+
+    async def broadcast(message):
+        published.append(message["type"])
+
+    def fail(session, readings):
+        raise RuntimeError("rise pass failed")
+
+    monkeypatch.setattr(sensor_router, "SessionLocal", lambda: db)
+    monkeypatch.setattr(sensor_router.connection_manager, "broadcast_general", broadcast)
+    monkeypatch.setattr(sensor_router.rise_detector, "process", fail)
+    before = alert_summary.snapshot()["total_open"]
+
+    with pytest.raises(RuntimeError): # Still reported to alert_worker
+        asyncio.run(sensor_router.evaluate_alerts([reading(0, 100.0, "threshold-sensor")]))
+    assert published == ["new_alert"]
+    assert alert_summary.snapshot()["total_open"] == before + 1
@@ -0,0 +1,42 @@
+from app import crud, schemas
+from app.polygon_registry import PolygonRegistry
+from app.risk import SCOPE_REGION, SCOPE_SENSOR, RiskEngine
+from app.sensor_cache import SensorStateCache
+
+SQUARE = [(0.0, 0.0), (0.0, 1.0), (1.0, 1.0), (1.0, 0.0)]
+
+
+def make_engine():
+    registry = PolygonRegistry(SensorStateCache())
+    registry.put("square", SQUARE)
+    return registry, RiskEngine(registry)
+
+
+def test_changes_swap_tables_instead_of_mutating_them():
+    _, engine = make_engine()
+    engine.set(SCOPE_SENSOR, "s1", 1.0, 2.0)
+    sensors = engine._sensor # What a reader in the threadpool may be iterating
+    engine.set(SCOPE_SENSOR, "s2", 1.0, 2.0)
+    engine.remove(SCOPE_SENSOR, "s1")
+    assert list(sensors) == ["s1"]
+    assert list(engine._sensor) == ["s2"]
+
+
+def test_deleted_polygon_drops_its_region_threshold():
+    registry, engine = make_engine()
+    engine.set(SCOPE_REGION, "square", 1.0, 2.0)
+    assert engine.classify([1.5], [0.5], [0.5]).tolist() == [1]
+
+    registry.remove("square")
+    engine.region_removed("square")
+    assert engine.classify([1.5], [0.5], [0.5]).tolist() == [0]
+    assert not engine._region
+
+
+def test_delete_polygon_removes_region_threshold_rows(db):
+    crud.upsert_polygon(db, schemas.PolygonCreate(name="square", coordinates=SQUARE))
+    crud.upsert_risk_threshold(db, schemas.RiskThresholdCreate(scope="region", target="square", warning_level=1, critical_level=2))
+    crud.upsert_risk_threshold(db, schemas.RiskThresholdCreate(scope="sensor", target="square", warning_level=1, critical_level=2))
+
+    assert crud.delete_polygon(db, "square")
+    assert [(t.scope, t.target) for t in crud.get_risk_thresholds(db)] == [("sensor", "square")]
@@ -0,0 +1,21 @@
+import pytest
+
+from app.spatial_index import SensorGridIndex
+
+
+def test_cell_size_must_divide_360():
+    with pytest.raises(ValueError):
+        SensorGridIndex(cell_size_deg=0.7)
+
+
+@pytest.mark.parametrize("cell_size", [0.1, 0.25, 7.5])
+def test_bbox_across_antimeridian_reaches_edge_cells(cell_size):
+    index = SensorGridIndex(cell_size_deg=cell_size)
+    for sensor_id, lon in (("west_edge", -179.99), ("east_edge", 179.99), ("far", 0.0)):
+        index.upsert(sensor_id, 0.0, lon)
+    for i in range(1000): # Enough occupied cells that the query walks cells instead of scanning everything
+        index.upsert(f"pad{i}", 60.0 - i * cell_size / 10, -170.0 + i * cell_size)
+
+    ids, _, _ = index.arrays()
+    found = {ids[slot] for slot in index.slots_in_bbox(-1.0, 179.0, 1.0, 181.0)}
+    assert found == {"west_edge", "east_edge"}
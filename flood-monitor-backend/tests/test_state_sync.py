@@ -0,0 +1,165 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import orjson
+import pytest
+
+from app import models, schemas, state_sync as state_sync_module
+from app.alert_engine import AlertEngine
+from app.alert_summary import AlertSummary
+from app.rise_detector import RiseDetector
+from app.sensor_cache import SensorStateCache
+from app.state_sync import StateSync
+from app.websocket_manager import ConnectionManager
+
+BASE_TIME = datetime(2026, 1, 1)
+
+
+class FakeAlertWorker:
+    def __init__(self):
+        self.submitted = []
+
+    async def submit(self, readings):
+        self.submitted.extend(readings)
+
+
+class RelayBackend:
+    # Like the multi-worker backends: delivers locally, then "relays" to the others
+    relays = True
+
+    def __init__(self):
+        self.relayed = []
+
+    async def start(self, deliver, listener=None):
+        self._deliver = deliver
+        listener.ownership_changed(False)
+
+    async def publish(self, channel, message):
+        self._deliver(channel, message)
+        self.relayed.append((channel, orjson.loads(orjson.dumps(message))))
+
+    async def stop(self):
+        pass
+
+
+@pytest.fixture
+def state(monkeypatch):
+    # Fresh per-process state behind state_sync
+    cache = SensorStateCache()
+    cache.warm([])
+    parts = {
+        "sensor_cache": cache, "alert_worker": FakeAlertWorker(), "rise_detector": RiseDetector(),
+        "alert_engine": AlertEngine(), "alert_summary": AlertSummary(), "manager": ConnectionManager(),
+    }
+    for name, value in parts.items():
+        monkeypatch.setattr(state_sync_module, name, value)
+    return parts
+
+
+def reading(minute, water_level, sensor_id="s1", reading_id=1):
+    return schemas.SensorDataOut(
+        id=reading_id, sensor_id=sensor_id, latitude=6.9, longitude=79.8,
+        water_level=water_level, rainfall=0.0, timestamp=BASE_TIME + timedelta(minutes=minute)
+    )
+
+
+def wire(kind, data, origin="other-worker"):
+    return orjson.loads(orjson.dumps({"origin": origin, "kind": kind, "data": data}))
+
+
+async def applied(sync, total):
+    for _ in range(500):
+        if sync.applied_total >= total:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("Timed out")
+
+
+def test_relayed_readings_feed_the_cache_and_only_the_owner_evaluates(state):
+    async def scenario():
+        sync = StateSync()
+        await sync.start()
+        sync.received(wire("readings", [reading(0, 1.0).model_dump()], origin=sync.origin)) # Our own echo
+        sync.received(wire("readings", [reading(0, 1.0).model_dump()]))
+        await applied(sync, 1)
+        sync.ownership_changed(True)
+        sync.received(wire("readings", [reading(5, 2.0, reading_id=2).model_dump()]))
+        await applied(sync, 2)
+        await sync.stop()
+        return sync
+
+    sync = asyncio.run(scenario())
+    assert sync.applied_total == 2
+    assert state["sensor_cache"].get("s1").water_level == 2.0
+    assert state["rise_detector"]._rings["s1"].seq == 1 # Observed while not the owner...
+    assert [r.id for r in state["alert_worker"].submitted] == [2] # ...evaluated once it is
+
+
+def test_relayed_alerts_move_the_summary_and_release_dedup(state):
+    alert = schemas.AlertOut(id=7, title="t", description="d", level="high", sensor_id="s1",
+                             timestamp=BASE_TIME, is_resolved=False)
+    calls = []
+    state["rise_detector"].alert_resolved = lambda alert_id, sensor_id: calls.append((alert_id, sensor_id))
+
+    async def scenario():
+        sync = StateSync()
+        await sync.start()
+        sync.received(wire("alerts", {"opened": [alert.model_dump(mode='json')], "resolved": []}))
+        await applied(sync, 1)
+        opened = state["alert_summary"].snapshot()["total_open"]
+        sync.received(wire("alerts", {"opened": [], "resolved": [alert.model_dump(mode='json')]}))
+        await applied(sync, 2)
+        await sync.stop()
+        return opened
+
+    assert asyncio.run(scenario()) == 1
+    assert state["alert_summary"].snapshot()["total_open"] == 0
+    assert calls == [(7, "s1")]
+
+
+def test_local_changes_are_relayed_once_and_not_applied_twice(state):
+    backend = RelayBackend()
+
+    async def scenario():
+        sync = StateSync()
+        await sync.start()
+        await state["manager"].start(backend=backend, state_sync=sync)
+        await sync.readings_committed([reading(0, 1.0)])
+        await sync.polygon_changed("district-1")
+        await asyncio.sleep(0.05)
+        await sync.stop()
+        return sync
+
+    sync = asyncio.run(scenario())
+    assert [message["kind"] for _, message in backend.relayed] == ["readings", "polygon"]
+    assert {channel for channel, _ in backend.relayed} == {"state"}
+    assert sync.applied_total == 0 # The local delivery of our own messages is ignored
+    assert state["sensor_cache"].get("s1").water_level == 1.0
+
+
+def test_nothing_is_relayed_with_the_local_backend(state):
+    async def scenario():
+        sync = StateSync()
+        await state["manager"].start(state_sync=sync)
+        await sync.readings_committed([reading(0, 1.0)])
+        return sync
+
+    sync = asyncio.run(scenario())
+    assert sync.owner and sync.relayed_total == 0
+    assert [r.id for r in state["alert_worker"].submitted] == [1]
+
+
+def test_new_owner_reloads_open_alerts_before_its_first_pass(db, state, monkeypatch):
+    db.add(models.Alert(title="t", description="d", level="warning", sensor_id="s1", timestamp=BASE_TIME))
+    db.commit()
+    monkeypatch.setattr(state_sync_module, "SessionLocal", lambda: db)
+
+    async def scenario():
+        sync = StateSync()
+        await sync.before_alert_pass() # Not the owner yet: nothing to load
+        assert state["alert_engine"].open_alert_count() == 0
+        sync.ownership_changed(True)
+        await sync.before_alert_pass()
+
+    asyncio.run(scenario())
+    assert state["alert_engine"].open_alert_count() == 1
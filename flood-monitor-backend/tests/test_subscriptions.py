@@ -0,0 +1,38 @@
+import pytest
+from pydantic import ValidationError
+
+from app import schemas
+from app.websocket_manager import ClientConnection, SubscriptionIndex
+
+
+def client(**subscription):
+    connection = ClientConnection(websocket=None, queue_size=1)
+    connection.subscription = schemas.GeneralSubscription(**subscription)
+    return connection
+
+
+@pytest.mark.parametrize("max_cells", [4096, 1]) # Indexed by cell, and as a wide viewport
+def test_bbox_across_antimeridian(max_cells):
+    index = SubscriptionIndex(cell_size_deg=1.0, max_cells=max_cells)
+    pacific = client(bbox=(-20.0, 170.0, 20.0, -170.0))
+    index.add(pacific)
+
+    assert index.for_item("a", (0.0, 175.5)) == {pacific}
+    assert index.for_item("b", (0.0, -175.5)) == {pacific}
+    assert index.for_item("c", (0.0, 180.0)) == {pacific}
+    assert not index.for_item("d", (0.0, 0.0))
+    assert not index.for_item("e", (30.0, 175.0))
+
+    index.remove(pacific)
+    assert not index.for_item("a", (0.0, 175.5))
+
+
+@pytest.mark.parametrize("subscription", [
+    {"types": ["sensor_update", "no_such_type"]},
+    {"sensor_ids": [f"s{i}" for i in range(schemas.MAX_SUBSCRIPTION_SENSOR_IDS + 1)]},
+    {"bbox": (10.0, 0.0, 5.0, 1.0)},
+    {"bbox": (0.0, 0.0, 1.0, 181.0)},
+])
+def test_rejected_subscriptions(subscription):
+    with pytest.raises(ValidationError):
+        schemas.GeneralSubscription(**subscription)
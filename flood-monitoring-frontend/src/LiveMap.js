@@ -1,8 +1,9 @@
 // frontend/src/LiveMap.js
-import React, { useEffect, useState, useRef, useCallback } from 'react';
-import { MapContainer, TileLayer, CircleMarker, Popup } from 'react-leaflet';
+import React from 'react';
+import { MapContainer, TileLayer } from 'react-leaflet';
 import L from 'leaflet';
 import 'leaflet/dist/leaflet.css';
+import RiskClusterLayer from './components/RiskClusterLayer';
 // import 'bootstrap/dist/css/bootstrap.min.css'; // Usually not needed directly in component if imported globally
 
 // Leaflet marker icon fix (keep this)
@@ -13,124 +14,23 @@ L.Icon.Default.mergeOptions({
   shadowUrl: 'https://unpkg.com/leaflet@1.9.3/dist/images/marker-shadow.png',
 });
 
-const SENSOR_MARKER_COLORS = {
-    high: 'red',    // water_level > 7
-    medium: 'orange',// water_level > 4 (or 5 depending on your logic)
-    low: 'blue',   // default
-    default: '#777' // For null or undefined water levels
-};
-
-function getSensorColor(waterLevel) {
-    if (waterLevel == null) return SENSOR_MARKER_COLORS.default;
-    if (waterLevel > 7.0) return SENSOR_MARKER_COLORS.high;
-    if (waterLevel > 4.0) return SENSOR_MARKER_COLORS.medium; // Adjust if your threshold is 5.0
-    return SENSOR_MARKER_COLORS.low;
-}
-
+const mapCenter = [13.0827, 80.2707]; // Default to Chennai
 
 export default function LiveMap({ sensorUpdateFromWebSocket }) {
-  const [sensorData, setSensorData] = useState([]);
-  const [error, setError] = useState('');
-  const mapRef = useRef();
-
-  const fetchInitialData = useCallback(() => {
-    console.log("LiveMap: Fetching initial sensor data from /sensor-data...");
-    // Assuming /sensor-data is available at the root of your API
-    // This endpoint is now defined in sensor_router.py without a prefix
-    fetch('http://127.0.0.1:8000/sensor-data?limit=50')
-      .then(res => {
-        if (!res.ok) {
-            // Try to parse error from backend if JSON
-            return res.json().then(errData => {
-                throw new Error(`HTTP error! status: ${res.status}, detail: ${errData.detail || JSON.stringify(errData)}`);
-            }).catch(() => { // If error response is not JSON
-                throw new Error(`HTTP error! status: ${res.status}, statusText: ${res.statusText}`);
-            });
-        }
-        return res.json();
-      })
-      .then(data => {
-        console.log("LiveMap: Initial sensor data received:", data);
-        setSensorData(data);
-        setError('');
-      })
-      .catch(err => {
-        console.error("LiveMap: Failed to fetch initial sensor data:", err);
-        setError(`Could not load sensor data: ${err.message}`);
-      });
-  }, []);
-
-  useEffect(() => {
-    fetchInitialData();
-  }, [fetchInitialData]);
-
-  useEffect(() => {
-    if (sensorUpdateFromWebSocket) {
-      console.log("LiveMap: Received sensor update via WebSocket:", sensorUpdateFromWebSocket);
-      setSensorData(prevData => {
-        const existingIndex = prevData.findIndex(s => s.id === sensorUpdateFromWebSocket.id);
-        let newDataArray;
-        if (existingIndex !== -1) {
-          newDataArray = [...prevData];
-          newDataArray[existingIndex] = sensorUpdateFromWebSocket;
-        } else {
-          newDataArray = [sensorUpdateFromWebSocket, ...prevData];
-        }
-        return newDataArray.slice(0, 100); // Keep most recent 100
-      });
-    }
-  }, [sensorUpdateFromWebSocket]);
-
-  if (error) {
-    return <div className="alert alert-warning text-center p-3 m-2">{error}</div>;
-  }
-
-  // Default center, can be adjusted or made dynamic
-  const mapCenter = sensorData.length > 0 && sensorData[0].latitude && sensorData[0].longitude
-    ? [sensorData[0].latitude, sensorData[0].longitude]
-    : [13.0827, 80.2707]; // Default to Chennai
-
-  if (sensorData.length === 0 && !error) {
-      return <div className="p-3 text-center">Loading sensor data for map...</div>;
-  }
-
+  // Markers come pre-clustered from /spatial/clusters for the visible area only; every
+  // WebSocket update (sensor_update / sensor_batch_update) triggers a throttled reload
   return (
     <div style={{ height: '100%', width: '100%' }}>
       <MapContainer
-        key={JSON.stringify(mapCenter)} // Force re-render if center changes significantly, optional
         center={mapCenter}
         zoom={7}
         style={{ height: '100%', width: '100%' }}
-        ref={mapRef} // Use whenCreated prop for map instance if needed for direct Leaflet API calls
       >
         <TileLayer
           attribution='© <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
           url='https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png'
         />
-
-        {sensorData.map(sensor => (
-          (typeof sensor.latitude === 'number' && typeof sensor.longitude === 'number') && (
-            <CircleMarker
-              key={sensor.id || sensor.sensor_id} // Ensure unique key
-              center={[sensor.latitude, sensor.longitude]}
-              radius={8}
-              pathOptions={{
-                color: getSensorColor(sensor.water_level),
-                fillColor: getSensorColor(sensor.water_level),
-                fillOpacity: 0.7
-              }}
-            >
-              <Popup>
-                <div>
-                  <strong>Sensor ID:</strong> {sensor.sensor_id} <br />
-                  <strong>Water Level:</strong> {sensor.water_level != null ? sensor.water_level.toFixed(2) + ' m' : 'N/A'} <br />
-                  <strong>Rainfall:</strong> {sensor.rainfall != null ? sensor.rainfall.toFixed(1) + ' mm' : 'N/A'} <br />
-                  <strong>Timestamp:</strong> {new Date(sensor.timestamp).toLocaleString()}
-                </div>
-              </Popup>
-            </CircleMarker>
-          )
-        ))}
+        <RiskClusterLayer refreshKey={sensorUpdateFromWebSocket} />
       </MapContainer>
     </div>
   );
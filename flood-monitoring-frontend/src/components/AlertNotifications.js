@@ -27,18 +27,25 @@ export default function AlertNotifications({ newAlertFromWebSocket }) {
 
   useEffect(() => {
     if (newAlertFromWebSocket) {
-      // newAlertFromWebSocket can be { type: 'new_alert', data: {...} } or { type: 'resolved', data: {...} }
+      // newAlertFromWebSocket is { type: 'new_alert', data: [...], resolved?: [...] } or { type: 'resolved', data: {...} }
       const alertPayload = newAlertFromWebSocket.data; // The actual alert object
 
       if (newAlertFromWebSocket.type === 'resolved') {
         setAlerts(prevAlerts => prevAlerts.filter(a => a.id !== alertPayload.id));
-      } else { // 'new_alert'
+      } else { // 'new_alert': data is an array of new or updated alerts
+        const newAlerts = Array.isArray(alertPayload) ? alertPayload : [alertPayload];
+        // alerts_resolved frames arrive here with only a resolved list
+        const resolvedIds = (newAlertFromWebSocket.resolved || []).map(a => a.id);
         setAlerts(prevAlerts => {
-          const isExisting = prevAlerts.find(a => a.id === alertPayload.id);
-          if (isExisting) { // If somehow already present, update it (or ignore)
-            return prevAlerts.map(a => a.id === alertPayload.id ? alertPayload : a);
-          }
-          const updatedAlerts = [alertPayload, ...prevAlerts];
+          let updatedAlerts = prevAlerts.filter(a => !resolvedIds.includes(a.id));
+          newAlerts.forEach(alert => {
+            const isExisting = updatedAlerts.find(a => a.id === alert.id);
+            if (isExisting) { // If somehow already present, update it (or ignore)
+              updatedAlerts = updatedAlerts.map(a => a.id === alert.id ? alert : a);
+            } else {
+              updatedAlerts = [alert, ...updatedAlerts];
+            }
+          });
           return updatedAlerts.slice(0, 2); // Keep only top 2-3
         });
       }
@@ -0,0 +1,101 @@
+// frontend/src/components/RiskClusterLayer.js
+import React, { useCallback, useEffect, useRef, useState } from 'react';
+import { CircleMarker, Popup, useMap, useMapEvents } from 'react-leaflet';
+import { fetchRiskClusters } from '../services/mapService';
+
+const RISK_COLOR = {
+  low: 'green',
+  medium: 'orange',
+  high: 'red',
+  unknown: 'grey'
+};
+
+const REFRESH_INTERVAL_MS = 2000; // Live updates refetch the viewport at most this often
+
+const wrapLon = lon => ((lon + 180) % 360 + 360) % 360 - 180;
+const clampLat = lat => Math.max(-90, Math.min(90, lat));
+
+// Leaflet bounds run past +/-180 once the map is panned around the globe; the API wants
+// wrapped longitudes, with minLon > maxLon for a viewport crossing the antimeridian
+export const viewportBounds = (map) => {
+  const bounds = map.getBounds();
+  const wholeWorld = bounds.getEast() - bounds.getWest() >= 360;
+  return {
+    minLat: clampLat(bounds.getSouth()),
+    maxLat: clampLat(bounds.getNorth()),
+    minLon: wholeWorld ? -180 : wrapLon(bounds.getWest()),
+    maxLon: wholeWorld ? 180 : wrapLon(bounds.getEast()),
+  };
+};
+
+// Server-side clustered risk markers for the visible area; must be rendered inside a MapContainer.
+// Change refreshKey (e.g. to the latest WebSocket update) to reload the current viewport.
+export default function RiskClusterLayer({ refreshKey }) {
+  const map = useMap();
+  const [clusters, setClusters] = useState([]);
+  const latestRequest = useRef(0);
+  const lastLoad = useRef(0);
+  const pendingRefresh = useRef(null);
+
+  const loadClusters = useCallback(() => {
+    const request = ++latestRequest.current;
+    lastLoad.current = Date.now();
+    fetchRiskClusters(map.getZoom(), viewportBounds(map))
+      .then(res => {
+        if (request !== latestRequest.current) return; // The map moved again meanwhile
+        if (!Array.isArray(res.data)) {
+          throw new Error("Cluster data is not an array");
+        }
+        setClusters(res.data);
+      })
+      .catch(err => console.error("RiskClusterLayer: Failed to load clusters:", err));
+  }, [map]);
+
+  useMapEvents({ moveend: loadClusters }); // Also fires after a zoom
+
+  useEffect(() => {
+    loadClusters();
+  }, [loadClusters]);
+
+  useEffect(() => {
+    if (refreshKey == null || pendingRefresh.current) return;
+    const wait = Math.max(0, lastLoad.current + REFRESH_INTERVAL_MS - Date.now());
+    pendingRefresh.current = setTimeout(() => {
+      pendingRefresh.current = null;
+      loadClusters();
+    }, wait);
+  }, [refreshKey, loadClusters]);
+
+  useEffect(() => () => clearTimeout(pendingRefresh.current), []);
+
+  return clusters.map(cluster => {
+    const color = RISK_COLOR[String(cluster.risk_level).toLowerCase()] || RISK_COLOR.unknown;
+    return (
+      <CircleMarker
+        key={cluster.sensor_id || `cluster-${cluster.latitude}-${cluster.longitude}`}
+        center={[cluster.latitude, cluster.longitude]}
+        radius={cluster.count > 1 ? Math.min(30, 8 + 4 * Math.log2(cluster.count)) : 8}
+        pathOptions={{ color, fillColor: color, fillOpacity: 0.6 }}
+      >
+        <Popup>
+          {cluster.count > 1 ? (
+            <div>
+              <strong>{cluster.count} sensors</strong><br />
+              <strong>Worst Risk:</strong> {String(cluster.risk_level).toUpperCase()} <br />
+              {Object.entries(cluster.risk_counts || {}).map(([level, n]) => (
+                n > 0 && <span key={level}>{level}: {n}<br /></span>
+              ))}
+            </div>
+          ) : (
+            <div>
+              <strong>Sensor ID:</strong> {cluster.sensor_id || "N/A"}<br />
+              <strong>Risk:</strong> {String(cluster.risk_level).toUpperCase()} <br />
+              {cluster.water_level != null && <><strong>Water Level:</strong> {cluster.water_level.toFixed(2)} m <br /></>}
+              <small>Last Updated: {cluster.last_updated ? new Date(cluster.last_updated).toLocaleString() : 'N/A'}</small>
+            </div>
+          )}
+        </Popup>
+      </CircleMarker>
+    );
+  });
+}
@@ -35,9 +35,18 @@ export default function Dashboard() {
         } else if (message.type === "sensor_update") {
           // console.log("Sensor update via WebSocket:", message.data);
           setSensorUpdateFromWebSocket(message.data);
+        } else if (message.type === "sensor_batch_update") {
+          // One frame per ingested batch: data is an array of readings
+          setSensorUpdateFromWebSocket(message.data);
+        } else if (message.type === "alert_updated") {
+          // Open alerts are updated in place; the list component matches them by id
+          setNewAlertMessage({ type: 'new_alert', data: message.data });
         } else if (message.type === "alert_resolved") {
           console.log("Alert resolved via WebSocket:", message.data);
           setNewAlertMessage({ type: 'resolved', data: message.data }); // Pass full message structure
+        } else if (message.type === "alerts_resolved") {
+          // Bulk resolve or alert engine: data is an array of resolved alerts
+          setNewAlertMessage({ type: 'new_alert', data: [], resolved: message.data });
         }
       } catch (e) {
         console.error("Error processing WebSocket message:", e, "Data:", event.data);
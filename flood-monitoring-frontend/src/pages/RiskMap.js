@@ -5,6 +5,7 @@ import { HeatmapLayer } from 'react-leaflet-heatmap-layer-v3';
 import L from 'leaflet';
 import 'leaflet/dist/leaflet.css';
 import { fetchRiskMapData, fetchSensorsInRadius } from '../services/mapService';
+import RiskClusterLayer from '../components/RiskClusterLayer';
 
 // Leaflet marker icon fix
 delete L.Icon.Default.prototype._getIconUrl;
@@ -14,13 +15,6 @@ L.Icon.Default.mergeOptions({
   shadowUrl: 'https://unpkg.com/leaflet@1.9.3/dist/images/marker-shadow.png',
 });
 
-const RISK_COLOR = {
-  low: 'green',
-  medium: 'orange',
-  high: 'red',
-  unknown: 'grey'
-};
-
 const heatmapConfig = {
   radius: 25,
   maxOpacity: 0.8,
@@ -156,30 +150,9 @@ export default function RiskMap() {
               url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
             />
             <LayersControl position="topright">
-              <LayersControl.Overlay checked name="Risk Points">
+              <LayersControl.Overlay checked name="Risk Clusters">
                 <FeatureGroup>
-                  {riskPoints.map((point) => (
-                    (point.latitude != null && point.longitude != null) &&
-                    <CircleMarker
-                      key={`risk-${point.sensor_id || Math.random()}`} // Use sensor_id if available
-                      center={[point.latitude, point.longitude]}
-                      radius={8}
-                      pathOptions={{
-                        color: RISK_COLOR[String(point.risk_level).toLowerCase()] || RISK_COLOR.unknown,
-                        fillColor: RISK_COLOR[String(point.risk_level).toLowerCase()] || RISK_COLOR.unknown,
-                        fillOpacity: 0.6
-                      }}
-                    >
-                      <Popup>
-                        <div>
-                          <strong>Sensor ID:</strong> {point.sensor_id || "N/A"}<br />
-                          <strong>Risk:</strong> {String(point.risk_level).toUpperCase() || "UNKNOWN"} <br />
-                          {point.water_level !== null && <><strong>Water Level:</strong> {point.water_level.toFixed(2)} m <br /></>}
-                          <small>Last Updated: {point.last_updated ? new Date(point.last_updated).toLocaleString() : 'N/A'}</small>
-                        </div>
-                      </Popup>
-                    </CircleMarker>
-                  ))}
+                  <RiskClusterLayer />
                 </FeatureGroup>
               </LayersControl.Overlay>
 
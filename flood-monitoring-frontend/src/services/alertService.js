@@ -12,9 +12,9 @@ export const fetchLatestUnresolvedAlerts = async () => {
   return axios.get(`${API_URL}/latest-unresolved`, { headers: getAuthHeaders() });
 };
 
-// Fetches all alerts (paginated) - can be used for a full alert history page
-export const fetchAllAlerts = async (skip = 0, limit = 20) => {
-  return axios.get(`${API_URL}/?skip=${skip}&limit=${limit}`, { headers: getAuthHeaders() });
+// Open alert counts: { total_open, by_level, by_sensor }
+export const fetchAlertSummary = async () => {
+  return axios.get(`${API_URL}/summary`, { headers: getAuthHeaders() });
 };
 
 export const createAlert = async (alertData) => {
@@ -25,6 +25,11 @@ export const resolveAlert = async (alertId) => {
   return axios.put(`${API_URL}/${alertId}/resolve`, {}, { headers: getAuthHeaders() });
 };
 
+// Resolves many alerts at once: criteria is { ids, sensor_id, level, older_than }
+export const resolveAlerts = async (criteria) => {
+  return axios.post(`${API_URL}/resolve`, criteria, { headers: getAuthHeaders() });
+};
+
 /*
 import axios from "axios";
 
@@ -27,5 +27,20 @@ export const fetchSensorsInRadius = async (latitude, longitude, radius_km, min_w
   });
 };
 
-// Note: LiveMap.js fetches initial sensor data from /sensor-data (defined in sensor_router.py without a prefix, or in main.py)
-// This is separate from risk map data or spatial queries.
\ No newline at end of file
+// Fetches pre-aggregated sensor clusters for the visible map area (server-side clustering)
+// bounds: { minLat, minLon, maxLat, maxLon }, e.g. from Leaflet's map.getBounds()
+export const fetchRiskClusters = async (zoom, bounds) => {
+  return axios.get(`${API_URL}/spatial/clusters`, {
+    headers: getAuthHeaders(),
+    params: {
+      zoom,
+      min_lat: bounds.minLat,
+      min_lon: bounds.minLon,
+      max_lat: bounds.maxLat,
+      max_lon: bounds.maxLon,
+    },
+  });
+};
+
+// Note: RiskMap.js and LiveMap.js draw their markers from fetchRiskClusters (see components/RiskClusterLayer.js);
+// the full /spatial/risk-map-data list still feeds the RiskMap heatmap.
\ No newline at end of file